@@ -12,11 +12,13 @@ from yaerp.accounting.account3 import AccountSide
 from yaerp.accounting.account3 import AccountRecord
 from yaerp.accounting.listener import Listener
 from yaerp.accounting.marker import Assets, BalanceSheet, Clearing, Equity, Expenses, IncomeStatement, Liabilities, Revenues
+from yaerp.accounting.snapshot import read_snapshot, write_snapshot
 from yaerp.accounting.reports.t_account import T_account, render_journal_entries, render_journal_entries2, render_journal_entry, render_journal_entry2, render_layout
 from yaerp.accounting.tree3 import AccountTree
 from yaerp.model.money import Money
 from yaerp.model.currency import Currency
 from yaerp.report.typesetting.columns import simultaneous_column_generator as typeset
+from yaerp.tools.secure_token import secure_token
 from yaerp.tools.sid import SID
 
 class AccountingSystem:
@@ -35,6 +37,10 @@ class AccountingSystem:
     def activate_listener(self, listener: Listener):
         self.listener = listener
 
+    def save_snapshot(self, file_name: str, meta: dict = None):
+        ''' Write the whole state, with the last secure token, to the binary snapshot file '''
+        write_snapshot(file_name, self, {**(meta or {}), 'token': secure_token().token()})
+
     def add_currency(self, code: str, currency_id: str, subunits_in_one_unit: int,
                      international_name: str, national_unit_symbol: str, national_subunit_symbol: str):
         new_currency = Currency(code, currency_id, subunits_in_one_unit,
@@ -73,12 +79,10 @@ class AccountingSystem:
 
         # check journal fields
         for j in self.journals.values():
-            je_fields = j.initialize_fields()
-            for k, value in je_fields.items():
-                if isinstance(value, AccountRecord):
-                    if value.account == account:
-                        # the account is crucial element of journal fields
-                        return False
+            for k, field_account in zip(j.layout.names, j.layout.accounts):
+                if field_account == account:
+                    # the account is crucial element of journal fields
+                    return False
 
         # check journal entries
         if account.has_entries():
@@ -92,11 +96,9 @@ class AccountingSystem:
         if not account:
             raise ValueError(f"Account '{tag}' not found")
         for j in self.journals.values():
-            je_fields = j.initialize_fields()
-            for k, value in je_fields.items():
-                if isinstance(value, AccountRecord):
-                    if value.account == account:
-                        raise ValueError(f"Account '{tag}' is specified as field: '{k}' in journal '{j.tag}'")
+            for k, field_account in zip(j.layout.names, j.layout.accounts):
+                if field_account == account:
+                    raise ValueError(f"Account '{tag}' is specified as field: '{k}' in journal '{j.tag}'")
         self.listener.account_delete_beg(tag)
         del self.accounts[tag]
         self.listener.account_delete_end(tag)
@@ -136,7 +138,9 @@ class AccountingSystem:
             chart_of_accs = self.charts_of_accounts[coa_name]
 
         if parent_account_tag:
-            parent_node = self.chart_of_accs.get_node(account_tag=parent_account_tag)
+            parent_node = chart_of_accs.get_node(tag=parent_account_tag)
+            if not parent_node:
+                raise ValueError(f'parent account {parent_account_tag} not found')
         else:
             parent_node = chart_of_accs
         acc = self.get_account(account_tag)
@@ -145,7 +149,6 @@ class AccountingSystem:
         self.listener.atree_create_beg(account_tag)
         self.listener.account_update_beg(parent_node)       
         acc_leaf = AccountTree(acc, parent_node)
-        parent_node.append_child(acc_leaf)
         self.listener.account_update_end(parent_node)
         self.listener.atree_create_end(acc_leaf)
 
@@ -171,14 +174,14 @@ class AccountingSystem:
             new_parent_node = chart_of_accs.get_node(new_parent_account_tag)
             if not new_parent_node:
                 raise ValueError(f'parent account {new_parent_account_tag} not found')
-            if acn in new_parent_node.get_node_path():
+            if new_parent_node.is_descendant_of(acn):
                 raise ValueError('attemt to move node in the same node path')
         else:
             new_parent_node = chart_of_accs
         if acn.parent:
             self.listener.atree_update_beg(acn)
             self.listener.atree_update_beg(acn.parent)
-            acn.parent.children.remove(acn)
+            acn.parent.remove_child(acn)
             self.listener.atree_update_end(acn.parent)
             acn.parent = new_parent_node
             self.listener.atree_update_beg(acn.parent)
@@ -207,7 +210,7 @@ class AccountingSystem:
             raise ValueError('Cannot delete root node. Use "delete chart-of-accounts" command to do so.')
         self.listener.atree_delete_beg(node_to_del)
         self.listener.atree_update_beg(node_to_del.parent)
-        node_to_del.parent.children.remove(node_to_del)
+        node_to_del.parent.remove_child(node_to_del)
         self.listener.atree_update_end(node_to_del.parent)
         self.listener.atree_delete_end(node_to_del)
 
@@ -254,7 +257,7 @@ class AccountingSystem:
     def add_journal_entry(self, new_journal_entry):
         journal = new_journal_entry.journal
         self.listener.journal_update_beg(journal)
-        journal.journal_entries.insert_right(new_journal_entry)
+        new_journal_entry.put_into_journal()
         self.listener.journal_update_end(journal)
 
     def get_journal_entry(self, journal_tag: str = None, *, sid: str = None, guid: str = None):
@@ -275,17 +278,7 @@ class AccountingSystem:
         raise ValueError(f'Journal entry not found ({journal_tag=}, {sid=}, {guid=})')
 
     def find_journal_entry(self, sid: str = None, guid: str = None):
-        if sid:
-            for journal in self.general_ledger.journals:
-                result = journal.get_by_sid(sid, not_rise_exception=True)
-                if result:
-                    break
-        elif guid:
-            for journal in self.general_ledger.journals.values():
-                result = journal.get_by_guid(guid, not_rise_exception=True)
-                if result:
-                    break
-        return result
+        return self.general_ledger.get_journal_entry(sid=sid, guid=guid)
 
     def match_journal_entries_gen(self, date: str, desc: str, ref: str, journal_tag: str, sids: list, state: str, reading_order: str, limit: int = 1000):
 
@@ -417,7 +410,7 @@ class AccountingSystem:
         result = []
         for je_to_cancel in journal_entries:
             if not je_to_cancel.post:
-                je_to_cancel.journal.journal_entries.remove(je_to_cancel)
+                je_to_cancel.del_from_journal()
             else:
                 cancel_entry = copy(je_to_cancel)
                 old_je_ref = f'Canceled by j/e {SID.print_form(cancel_entry.sid)}'
@@ -434,9 +427,21 @@ class AccountingSystem:
                         for index, record in enumerate(value):
                             c = cancel_account_record(record, method)
                             cancel_entry.fields[name][index] = c
+                cancel_entry.refresh_totals()
                 cancel_entry.post_this()
             result.append(cancel_entry.sid)
 
+def load_accounting_system(file_name: str) -> tuple[AccountingSystem, dict]:
+    '''
+    Accounting system read from the snapshot file (see save_snapshot) and the snapshot's meta data.
+    The secure token chain is not restored: the script commands stored before the snapshot
+    must be replayed (see secure_token().replay()).
+    '''
+    accsys = AccountingSystem()
+    meta = read_snapshot(file_name, accsys)
+    meta.pop('token')
+    return accsys, meta
+
 def setup_tiny_accounting_system() -> AccountingSystem:
     accsys = AccountingSystem()
     accsys.general_ledger = GeneralLedger()
@@ -0,0 +1,65 @@
+'''
+SQLite repository: writing postings, balances summed by SQLite and loading.
+
+    python benchmarks/bench_database.py [-n 100000]
+
+The entries are posted with the database attached to the ledger, so they are
+written by one executemany() batch; "load 2023" reads the structure, the
+drafts and only the entries of the last year (the older ones count as
+opening totals); "turnover of 2022" loads the year 2022 on demand.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from acc_sys import AccountingSystem
+from bench_posting import make_ledger
+from bench_posting_log import object_totals
+from yaerp.accounting.database import BooksDatabase
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'  {label:<24} {time.perf_counter() - start:9.3f} s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=100000, help='number of journal entries')
+    args = parser.parse_args()
+    print(f'{args.n} journal entries')
+    ledger, entries = make_ledger(args.n)
+    timed('post_batch', lambda: ledger.post_batch(entries))
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'books.db')
+        ledger, entries = make_ledger(args.n)
+        accsys = AccountingSystem()
+        accsys.general_ledger = ledger
+        accsys.accounts = {account.tag: account for account in ledger.accounts}
+        with BooksDatabase(file_name) as db:
+            db.save(accsys)
+            timed('post_batch with database', lambda: ledger.post_batch(entries))
+            print(f'  {os.path.getsize(file_name) / args.n:.0f} B/entry')
+            from_database = timed('balances from database', db.balances)
+            from_objects = timed('totals from objects', lambda: object_totals(ledger))
+            assert from_database == from_objects
+            timed('balances of 2023', lambda: db.balances('2023-01-01', '2023-12-31'))
+        with BooksDatabase(file_name) as db:
+            timed('load all', lambda: db.load(AccountingSystem()))
+        with BooksDatabase(file_name) as db:
+            recent = AccountingSystem()
+            timed('load 2023', lambda: db.load(recent, date_beg='2023-01-01'))
+            account = recent.general_ledger.accounts[0]
+            assert account.get_debit() == from_objects[account.tag][0]
+            timed('turnover of 2022', lambda: account.turnover_between('2022-01-01', '2022-12-31'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+'''
+Memory footprint of posted records: __slots__ layout against the former __dict__ layout.
+
+    python benchmarks/bench_memory.py [-n 50000]
+
+Each journal entry has two account records (Dr/Cr), so the figures are
+bytes per account record.  "entries" measures journal entries with their
+records only, "ledger" measures whole posting to the ledger (with journals,
+per-account indexes and running sums).
+'''
+import argparse
+import random
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yaerp.accounting.account3 import Account, AccountRecord, AccountSide
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.model.currency import Currency
+
+
+@dataclass(frozen=True)
+class DictAccountRecord:
+    ''' The former AccountRecord layout (instance __dict__). '''
+    account: Any
+    raw_amount: int
+    side: AccountSide
+    journal_entry: Any
+    post: int
+
+
+class DictJournalEntry:
+    ''' The former JournalEntry layout (instance __dict__, not interned strings). '''
+
+    def __init__(self, date, sid):
+        self.date = date
+        self.time = '00:00:00'
+        self.sid = sid
+        self.guid = uuid4().hex
+        self.journal = None
+        self.description = None
+        self.reference = None
+        self.post = None
+        self.fields = {'Account': []}
+
+
+def make_dates(count, seed=1):
+    rnd = random.Random(seed)
+    # formatted one by one, as dates read from a file: equal strings are separate objects
+    return [f'{rnd.randrange(2014, 2024)}-{rnd.randrange(1, 13):02}-{rnd.randrange(1, 29):02}'
+            for _ in range(count)]
+
+
+def measure(label, count, build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    per_record = (after - before) / (2 * count)
+    print(f'  {label:<24} {per_record:8.1f} B/record')
+    del kept
+    return per_record
+
+
+def build_dict_entries(dates, account):
+    entries = []
+    for sid, date in enumerate(dates, 1):
+        je = DictJournalEntry(date, sid)
+        je.fields['Account'].append(DictAccountRecord(account, sid, AccountSide.Dr, je, 1))
+        je.fields['Account'].append(DictAccountRecord(account, sid, AccountSide.Cr, je, 1))
+        entries.append(je)
+    return entries
+
+
+def build_slots_entries(dates, account):
+    journal = Journal('GJ', 'General Journal', None)
+    entries = []
+    for sid, date in enumerate(dates, 1):
+        je = JournalEntry(journal)
+        je.date = date
+        je.fields['Account'].append(AccountRecord(account, sid, AccountSide.Dr, je, 1))
+        je.fields['Account'].append(AccountRecord(account, sid, AccountSide.Cr, je, 1))
+        je.intern_strings()
+        entries.append(je)
+    return entries
+
+
+def build_ledger(dates):
+    currency = Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr')
+    ledger = Ledger('GL', 'General Ledger')
+    journal = Journal('GJ', 'General Journal', ledger)
+    accounts = [Account(f'{tag}', ledger, currency, f'Account {tag}') for tag in range(100, 110)]
+    entries = []
+    for number, date in enumerate(dates):
+        je = JournalEntry(journal)
+        je.date = date
+        je.debit('Account', number + 1, accounts[number % 10])
+        je.credit('Account', number + 1, accounts[(number + 1) % 10])
+        entries.append(je)
+    journal.post_these(entries)
+    return ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=50000, help='number of journal entries')
+    args = parser.parse_args()
+    ledger = Ledger('GL', 'General Ledger')
+    account = Account('100', ledger, Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr'), 'Cash')
+    print(f'{args.n} journal entries, {2 * args.n} account records')
+    print('entries')
+    before = measure('__dict__ (former)', args.n, lambda: build_dict_entries(make_dates(args.n), account))
+    after = measure('__slots__', args.n, lambda: build_slots_entries(make_dates(args.n), account))
+    print(f'  saved {before - after:.1f} B/record ({100 * (before - after) / before:.0f}%)')
+    print('ledger')
+    measure('__slots__', args.n, lambda: build_ledger(make_dates(args.n)))
+
+
+if __name__ == '__main__':
+    main()
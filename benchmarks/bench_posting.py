@@ -0,0 +1,65 @@
+'''
+Posting throughput: Ledger.post_batch against posting entries one by one.
+
+    python benchmarks/bench_posting.py [-n 100000]
+
+Entries have two account records over 50 accounts, dates backdated at random.
+'''
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yaerp.accounting.account3 import Account
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.model.currency import Currency
+
+
+def make_ledger(count, seed=1):
+    rnd = random.Random(seed)
+    currency = Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr')
+    ledger = Ledger('GL', 'General Ledger')
+    journal = Journal('GJ', 'General Journal', ledger)
+    accounts = [Account(f'{tag}', ledger, currency, f'Account {tag}') for tag in range(100, 150)]
+    entries = []
+    for _ in range(count):
+        je = JournalEntry(journal)
+        je.date = f'{rnd.randrange(2014, 2024)}-{rnd.randrange(1, 13):02}-{rnd.randrange(1, 29):02}'
+        amount = rnd.randrange(1, 100000)
+        dr_account, cr_account = rnd.sample(accounts, 2)
+        je.debit('Account', amount, dr_account)
+        je.credit('Account', amount, cr_account)
+        entries.append(je)
+    return ledger, entries
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'  {label:<14} {elapsed:9.3f} s  {count / elapsed:10.0f} entries/s')
+    return elapsed
+
+
+def post_one_by_one(entries):
+    for je in entries:
+        je.post_this()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=100000, help='number of journal entries')
+    args = parser.parse_args()
+    print(f'{args.n} journal entries')
+    ledger, entries = make_ledger(args.n)
+    timed('post_batch', args.n, lambda: ledger.post_batch(entries))
+    ledger, entries = make_ledger(args.n)
+    timed('post_this', args.n, lambda: post_one_by_one(entries))
+
+
+if __name__ == '__main__':
+    main()
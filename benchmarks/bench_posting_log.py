@@ -0,0 +1,56 @@
+'''
+Posting log: cost of logging the postings and scanning the mapped file.
+
+    python benchmarks/bench_posting_log.py [-n 200000]
+
+"totals" sums the posted records by account: from the posting log (NumPy
+over mmap) and from the AccountRecord objects of the ledger.
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_posting import make_ledger
+from yaerp.accounting.posting_log import PostingLog
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'  {label:<24} {time.perf_counter() - start:9.3f} s')
+    return result
+
+
+def object_totals(ledger):
+    result = {}
+    for account, records in ledger.posted_account_records.items():
+        sums = result.setdefault(account.tag, [0, 0])
+        for record in records:
+            sums[record.side - 1] += record.raw_amount
+    return {tag: tuple(sums) for tag, sums in result.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=200000, help='number of journal entries')
+    args = parser.parse_args()
+    print(f'{args.n} journal entries')
+    ledger, entries = make_ledger(args.n)
+    timed('post_batch', lambda: ledger.post_batch(entries))
+    with tempfile.TemporaryDirectory() as directory:
+        ledger, entries = make_ledger(args.n)
+        ledger.posting_log = PostingLog(os.path.join(directory, 'books.log'))
+        timed('post_batch with log', lambda: ledger.post_batch(entries))
+        from_log = timed('totals from log', ledger.posting_log.totals)
+        from_objects = timed('totals from objects', lambda: object_totals(ledger))
+        assert from_log == from_objects
+        ledger.posting_log.close()
+
+
+if __name__ == '__main__':
+    main()
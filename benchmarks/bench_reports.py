@@ -0,0 +1,75 @@
+'''
+Ledger reports in worker processes against the calling process only.
+
+    python benchmarks/bench_reports.py [-n 200000] [-w 4]
+
+Entries have two account records over 500 accounts in three journals.
+The speedup depends on the number of cores (-w is the number of workers).
+'''
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yaerp.accounting.account3 import Account
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.accounting.reports.parallel import ReportExecutor
+from yaerp.model.currency import Currency
+
+
+def make_ledger(count, seed=1):
+    rnd = random.Random(seed)
+    currency = Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr')
+    ledger = Ledger('GL', 'General Ledger')
+    journals = [Journal(tag, f'{tag} Journal', ledger) for tag in ('GJ', 'SJ', 'PJ')]
+    accounts = [Account(f'{tag}', ledger, currency, f'Account {tag}') for tag in range(1000, 1500)]
+    entries = []
+    for number in range(count):
+        je = JournalEntry(journals[number % 3])
+        je.date = f'{rnd.randrange(2014, 2024)}-{rnd.randrange(1, 13):02}-{rnd.randrange(1, 29):02}'
+        amount = rnd.randrange(1, 100000)
+        dr_account, cr_account = rnd.sample(accounts, 2)
+        je.debit('Account', amount, dr_account)
+        je.credit('Account', amount, cr_account)
+        entries.append(je)
+    ledger.post_batch(entries[:count * 3 // 4])
+    for je in entries[count * 3 // 4:]:
+        je.put_into_journal()
+    return ledger
+
+
+def run(executor):
+    executor.trial_balance(date_end='2020-12-31')
+    executor.turnover('2018-01-01', '2018-12-31')
+    executor.entry_counts()
+
+
+def timed(label, ledger, workers):
+    with ReportExecutor(ledger, max_workers=workers) as executor:
+        executor.columns    # loaded once, not part of the report time
+        run(executor)       # workers started
+        start = time.perf_counter()
+        run(executor)
+        elapsed = time.perf_counter() - start
+    print(f'  {label:<16} {elapsed:9.3f} s')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=200000, help='number of journal entries')
+    parser.add_argument('-w', type=int, default=4, help='number of worker processes')
+    args = parser.parse_args()
+    print(f'{args.n} journal entries, trial balance + turnover + entry counts')
+    ledger = make_ledger(args.n)
+    single = timed('1 process', ledger, 1)
+    parallel = timed(f'{args.w} workers', ledger, args.w)
+    print(f'  speedup {single / parallel:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
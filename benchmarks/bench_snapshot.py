@@ -0,0 +1,75 @@
+'''
+Opening books from a binary snapshot against building them entry by entry.
+
+    python benchmarks/bench_snapshot.py [-n 200000]
+
+Entries of the General Journal have two account records over 50 accounts,
+three quarters of them are posted. "build" creates and posts the entries
+through the journal API (what replaying a script has to do at least).
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from acc_sys import AccountingSystem, load_accounting_system
+from yaerp.accounting.account3 import Account
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.model.currency import Currency
+
+
+def build(count, seed=1):
+    rnd = random.Random(seed)
+    accsys = AccountingSystem()
+    accsys.general_ledger = Ledger('GL', 'General Ledger')
+    accsys.currencies = {'PLN': Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr')}
+    accsys.accounts = {f'{tag}': Account(f'{tag}', accsys.general_ledger, accsys.currencies['PLN'], f'Account {tag}')
+                       for tag in range(100, 150)}
+    journal = Journal('GJ', 'General Journal', accsys.general_ledger)
+    accsys.journals = {'GJ': journal}
+    accounts = list(accsys.accounts.values())
+    entries = []
+    for number in range(count):
+        je = JournalEntry(journal)
+        je.date = f'{rnd.randrange(2014, 2024)}-{rnd.randrange(1, 13):02}-{rnd.randrange(1, 29):02}'
+        je.description = f'entry {number}'
+        amount = rnd.randrange(1, 100000)
+        dr_account, cr_account = rnd.sample(accounts, 2)
+        je.debit('Account', amount, dr_account)
+        je.credit('Account', amount, cr_account)
+        entries.append(je)
+    accsys.general_ledger.post_batch(entries[:count * 3 // 4])
+    for je in entries[count * 3 // 4:]:
+        je.put_into_journal()
+    return accsys
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f'  {label:<8} {elapsed:9.3f} s  {count / elapsed:10.0f} entries/s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('-n', type=int, default=200000, help='number of journal entries')
+    args = parser.parse_args()
+    print(f'{args.n} journal entries')
+    accsys = timed('build', args.n, lambda: build(args.n))
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'books.snap')
+        timed('write', args.n, lambda: accsys.save_snapshot(file_name))
+        print(f'  {"size":<8} {os.path.getsize(file_name) / args.n:9.1f} B/entry')
+        timed('read', args.n, lambda: load_accounting_system(file_name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+'''
+Benchmark of SortedCollection (chunked storage) against the former flat list storage.
+
+    python benchmarks/bench_sorted_collection.py [-n 200000]
+
+Keys imitate journal entries: (date, time, sid) with dates backdated at random.
+'''
+import argparse
+import random
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from yaerp.tools.sorted_collection import SortedCollection
+
+
+class FlatSortedCollection:
+    ''' The former SortedCollection storage: two flat lists of keys and items. '''
+
+    def __init__(self, key):
+        self._keys = []
+        self._items = []
+        self._key = key
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, i):
+        return self._items[i]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def index(self, item):
+        k = self._key(item)
+        i = bisect_left(self._keys, k)
+        j = bisect_right(self._keys, k)
+        return self._items[i:j].index(item) + i
+
+    def insert_right(self, item):
+        k = self._key(item)
+        i = bisect_right(self._keys, k)
+        self._keys.insert(i, k)
+        self._items.insert(i, item)
+
+    def remove(self, item):
+        i = self.index(item)
+        del self._keys[i]
+        del self._items[i]
+
+    def find_le(self, k):
+        i = bisect_right(self._keys, k)
+        if i:
+            return self._items[i-1]
+        raise ValueError('No item found with key at or below: %r' % (k,))
+
+
+def make_items(count, seed=1):
+    rnd = random.Random(seed)
+    items = []
+    for sid in range(1, count + 1):
+        date = f'{rnd.randrange(2014, 2024)}-{rnd.randrange(1, 13):02}-{rnd.randrange(1, 29):02}'
+        items.append((date, '00:00:00', sid))
+    return items
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f'  {label:<14} {elapsed:9.3f} s')
+    return elapsed
+
+
+def run(factory, items, probes, removals):
+    collection = factory()
+
+    def insert():
+        for item in items:
+            collection.insert_right(item)
+
+    def find():
+        for probe in probes:
+            collection.find_le(probe)
+
+    def index():
+        for item in removals:
+            collection.index(item)
+
+    def iterate():
+        for _ in collection:
+            pass
+
+    def remove():
+        for item in removals:
+            collection.remove(item)
+
+    total = 0
+    for label, func in [('insert_right', insert), ('find_le', find), ('index', index),
+                        ('iterate', iterate), ('remove', remove)]:
+        total += timed(label, func)
+    print(f'  {"total":<14} {total:9.3f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', type=int, default=100_000, help='number of items')
+    args = parser.parse_args()
+    items = make_items(args.n)
+    rnd = random.Random(2)
+    probes = [(item[0], '24:00:00') for item in rnd.sample(items, min(len(items), 10_000))]
+    removals = rnd.sample(items, len(items) // 2)
+    key = itemgetter(0, 1, 2)
+    for name, factory in [('flat lists (former)', lambda: FlatSortedCollection(key)),
+                          ('sorted chunks', lambda: SortedCollection(key=key))]:
+        print(f'{name}, n={args.n}:')
+        run(factory, items, probes, removals)
+
+
+if __name__ == '__main__':
+    main()
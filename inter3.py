@@ -1,4 +1,6 @@
 import argparse
+import os
+import tempfile
 from datetime import datetime
 from hashlib import blake2s
 from dateutil.tz import *
@@ -6,12 +8,14 @@ from dateutil.relativedelta import *
 from itertools import repeat
 import cmd2
 from cmd2 import CommandSet, CompletionMode, with_argparser, with_category, with_default_category, ansi
-from acc_sys import empty_accounting_system, setup_tiny_accounting_system
+from acc_sys import empty_accounting_system, load_accounting_system, setup_tiny_accounting_system
 from yaerp.accounting.account3 import AccountRecord, AccountSide
 from yaerp.accounting.journal3 import Journal, JournalEntry
 from yaerp.accounting.listener import Listener
 from yaerp.accounting.marker import Marker
+from yaerp.accounting.reports.status import entry_counts
 from yaerp.accounting.reports.t_account import render_journal_entries2, render_layout
+from yaerp.accounting.snapshot import read_snapshot_meta
 from yaerp.accounting.tree3 import AccountTree
 from yaerp.tools.dt import datetime_str
 from yaerp.tools.file import append_file
@@ -55,6 +59,31 @@ def store_command(cmd, command_args, token_from_file, output_info):
         if secure_token().token() != token_from_file:
             cmd.poutput(f"token mismatch; stored in file:{token_from_file}, calculated from data in file:{secure_token().token()}")
 
+def open_session(session_name, startup_script):
+    '''
+    Accounting system of the session and the script to run at startup.
+
+    If the session snapshot was saved after the beginning of the startup
+    script (the script is not changed there), the state is read from the
+    snapshot and only the commands stored after it are run (temporary script).
+    The secure token chain is rebuilt from the commands before the snapshot.
+    '''
+    snapshot_file = f'{session_name}.snap'
+    if os.path.exists(snapshot_file) and os.path.exists(startup_script):
+        meta = read_snapshot_meta(snapshot_file)
+        offset = int(meta['script_offset'])
+        with open(startup_script, 'rb') as file:
+            head = file.read(offset)
+            tail = file.read()
+        if len(head) == offset and head.rstrip().endswith(meta['token'].encode()):
+            # the token chain continues from the sealed commands before the snapshot
+            secure_token().replay(head.decode('utf-8').splitlines())
+            accsys, _ = load_accounting_system(snapshot_file)
+            with tempfile.NamedTemporaryFile('wb', suffix='.ac', delete=False) as file:
+                file.write(tail)
+            return accsys, file.name
+    return empty_accounting_system(), startup_script
+
 def interactive_print(cmd, text):
     if not cmd.in_script() and not cmd.in_pyscript():
         cmd.poutput(text)
@@ -323,7 +352,7 @@ class LoadableAccounts(CommandSet):
                 raise ValueError(f'Account "{ns.new_parent}" specified as new parent not found')
             if ac_tree_parent == ac_tree:
                 raise ValueError(f"Account and parent account are the same")
-            if ac_tree_parent in ac_tree.get_internals_gen():
+            if ac_tree_parent.is_descendant_of(ac_tree):
                 raise ValueError(f'The account "{ns.new_parent}" planned to be a parent is currently descendant of account "{ac_tree.account.tag}" ')
         else:
             ac_tree_parent = accounting_system.coa.get_root_node()
@@ -332,7 +361,9 @@ class LoadableAccounts(CommandSet):
         interactive_print(self._cmd, ac_tree.full_str())
         interactive_print(self._cmd, "\n")
         if ns.new_name:
+            old_name = ac.name
             ac.name = ns.new_name
+            ac_tree.refresh_node_name(old_name)
 
         mark_list = []
         if ns.markers:
@@ -445,7 +476,7 @@ class LoadableAccounts(CommandSet):
         del accounting_system.accounts[ac_node.account.tag]
 
         # delete from the Chart of Accounts
-        ac_node.parent.children.remove(ac_node)
+        ac_node.parent.remove_child(ac_node)
         
         # store command
         command_args = []
@@ -797,7 +828,7 @@ help=
         #     raise ValueError(f'Journal Entry sid={ns.sequence_identifier} not found in journal "{journal_symbol}" ({journal.tag})')
         if je.post:
             raise ValueError(f'Journal Entry {ns.sequence_identifier} is posted in the ledger. Delete is not possible. Use "cancel entry" command to post correction into the ledger.')
-        journal.journal_entries.remove(je)
+        je.del_from_journal()
         head = f'------ Delete {journal_symbol} ({je.journal.tag}) entry {ns.sequence_identifier} ------'
         self._cmd.poutput(head)
         self.puts_journal_entry(je)
@@ -922,27 +953,66 @@ class LoadablePeriod(CommandSet):
     #     self._cmd.poutput('Accounting command..')
 
     period_parser = cmd2.Cmd2ArgumentParser()
-    period_parser.add_argument('style', choices=['YYYY', 'MM'])
+    period_parser.add_argument('name', help='Period: a year "RRRR" or a month "RRRR-MM", i.e: "2024" or "2024-03"')
+    period_parser.add_argument('-token', '--token', default=None, help='Secure token to seal commands stored in script. ')
+
+    close_period_parser = cmd2.Cmd2ArgumentParser()
+    close_period_parser.add_argument('name', help='Period: a year "RRRR" or a month "RRRR-MM", i.e: "2024" or "2024-03"')
+    close_period_parser.add_argument('-j', '--journal-symbol', required=False, help='Journal of the opening entry (default: selected journal)')
+    close_period_parser.add_argument('-token', '--token', default=None, help='Secure token to seal commands stored in script. ')
 
     @cmd2.as_subcommand_to('create', 'period', period_parser)
-    def create_period(self, _: argparse.Namespace):
-        self._cmd.poutput('create period ....')
+    def create_period(self, ns: argparse.Namespace):
+        period = accounting_system.general_ledger.create_period(ns.name)
+        store_command(self._cmd, ["create", "period", ns.name], ns.token,
+                      f'Period {period.name}: {period.date_beg} .. {period.date_end}')
 
     @cmd2.as_subcommand_to('read', 'period', period_parser)
-    def read_period(self, _: argparse.Namespace):
-        self._cmd.poutput('read period ....')
+    def read_period(self, ns: argparse.Namespace):
+        period = accounting_system.general_ledger.get_period(ns.name)
+        txt = []
+        txt.append(f'Period {period.name}: {period.date_beg} .. {period.date_end} {"(closed)" if period.closed else "(open)"}')
+        for account, balance in sorted(period.closing_balances.items(), key=lambda item: item[0].tag):
+            txt.append(f'  {account.tag:<8} {account.name:<26} {account.currency.raw2amount(balance):>14}')
+        self._cmd.poutput('\n'.join(txt))
 
     @cmd2.as_subcommand_to('delete', 'period', period_parser)
-    def delete_period(self, _: argparse.Namespace):
-        self._cmd.poutput('delete period ....')
+    def delete_period(self, ns: argparse.Namespace):
+        accounting_system.general_ledger.delete_period(ns.name)
+        store_command(self._cmd, ["delete", "period", ns.name], ns.token, "DELETED")
 
-    @cmd2.as_subcommand_to('close', 'period', period_parser)
-    def close_period(self, _: argparse.Namespace):
-        self._cmd.poutput('close period ....')
+    @cmd2.as_subcommand_to('close', 'period', close_period_parser)
+    def close_period(self, ns: argparse.Namespace):
+        if ns.journal_symbol:
+            journal_symbol = ns.journal_symbol
+        else:
+            journal_symbol = accounting_system.selected["journal"]
+        journal: Journal = accounting_system.journals.get(journal_symbol, None)
+        if not journal:
+            raise ValueError(f'Unknown Journal tag "{journal_symbol}"')
+        period = accounting_system.general_ledger.close_period(ns.name, journal)
+        command_args = []
+        command_args.extend(["close", "period", ns.name])
+        command_args.extend(["--journal-symbol", journal.tag])
+        output = f'Period {period.name} closed'
+        if period.opening_sid:
+            output += f', opening entry {period.opening_sid} in journal {journal.tag}'
+        store_command(self._cmd, command_args, ns.token, output)
 
     @cmd2.as_subcommand_to('select', 'period', period_parser)
-    def select_period(self, _: argparse.Namespace):
-        self._cmd.poutput('select period ....')
+    def select_period(self, ns: argparse.Namespace):
+        accounting_system.general_ledger.get_period(ns.name)
+        accounting_system.selected["period"] = ns.name
+        set_prompt_part_1(ns.name)
+
+    period_list_parser = cmd2.Cmd2ArgumentParser()
+
+    @cmd2.as_subcommand_to('list', 'periods', period_list_parser)
+    def list_periods(self, _: argparse.Namespace):
+        txt = []
+        for period in accounting_system.general_ledger.periods:
+            txt.append(f'{period.name:<8} {period.date_beg} .. {period.date_end} {"closed" if period.closed else "open"}')
+        self._cmd.poutput('\n'.join(txt))
 
 class ExampleApp(cmd2.Cmd):
     """
@@ -960,7 +1030,7 @@ class ExampleApp(cmd2.Cmd):
         self._period = LoadablePeriod()
 
     load_parser = cmd2.Cmd2ArgumentParser()
-    load_parser.add_argument('cmds', choices=['chart-of-accounts', 'journals', 'accounts', 'entries', 'accounting'])
+    load_parser.add_argument('cmds', choices=['chart-of-accounts', 'journals', 'accounts', 'entries', 'accounting', 'period'])
 
     @with_argparser(load_parser)
     @with_category('Command Loading')
@@ -1148,29 +1218,40 @@ class ExampleApp(cmd2.Cmd):
             self.poutput('This command does nothing without sub-parsers registered')
             self.do_help('cancel')
 
+    def do_snapshot(self, args):
+        """Save the session state; the next start runs only the commands stored after it"""
+        if self.in_script() or self.in_pyscript():
+            self.poutput('snapshot cannot be saved by a script')
+            return
+        script_file = f"{globals()['session_name']}.ac"
+        offset = os.path.getsize(script_file) if os.path.exists(script_file) else 0
+        accounting_system.save_snapshot(f"{globals()['session_name']}.snap", {'script_offset': offset})
+        self.poutput(f'snapshot saved (after {offset} bytes of {script_file})')
+
     def do_status(self, args):
-        self.poutput('+---------------------------------------------+')
-        self.poutput('|  Period | Ledger |   GJ   |   SJ   |   PJ   |')
-        self.poutput('|---------------------------------------------|')
-        self.poutput('| 2023-BB |     1  |        |  ----  |  ----  |')
-        self.poutput('| 2023-01 |    16  |    66  |     5  |     8  |')
-        self.poutput('| 2023-02 |    55  |*    3 *|     3  |     2  |')
-        self.poutput('| 2023 03 |    23  |     2  |     5  |     3  |') 
-        self.poutput('| 2023 04 |    85  |     6  |     5  |     8  |')
-        self.poutput('| 2023 05 |    95  |     1  |     3  |     2  |')
-        self.poutput('| 2023 06 |    72  |     2  |     5  |     3  |')
-        self.poutput('| 2023 07 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('| 2023 08 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('| 2023 09 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('| 2023 10 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('| 2023 11 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('| 2023 12 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('| 2023 13 |  ----  |  ----  |  ----  |  ----  |') 
-        self.poutput('+---------------------------------------------+')
-
-        # self.poutput('         [BB]  [01]  [02]  [03]  [04]  [05]  [06]  [07]  [08]  [09]  [10]  [11]  [12]  [13]')
-        # self.poutput('            -     -     -     -     -     -     3     2     6     7     -     -     -     -')       
-        # self.poutput('           27    28    19    17    17    29    37    13     -     -     -     -     -     -')
+        ledger = accounting_system.general_ledger
+        counts = entry_counts(ledger)
+        journals = list(ledger.journals)
+        border = '+' + '-' * (9 + 9 * (len(journals) + 1)) + '+'
+        self.poutput(border)
+        self.poutput('|  Period | Ledger |' + ''.join(f'{journal.tag:^8}|' for journal in journals))
+        self.poutput('|' + border[1:-1] + '|')
+        years = sorted({period[:4] for period in counts})
+        for year in range(int(years[0]), int(years[-1]) + 1) if years else []:
+            for month in range(1, 13):
+                period = f'{year:04}-{month:02}'
+                posts, by_journal = counts.get(period, (0, {}))
+                cells = [f'{posts:>6}  ' if posts else '  ----  ']
+                for journal in journals:
+                    entries, unposted = by_journal.get(journal, (0, 0))
+                    if not entries:
+                        cells.append('  ----  ')
+                    elif unposted:
+                        cells.append(f'*{entries:>5} *')   # period with unposted entries
+                    else:
+                        cells.append(f'{entries:>6}  ')
+                self.poutput(f'| {period} |' + '|'.join(cells) + '|')
+        self.poutput(border)
 
 if __name__ == '__main__':
     import sys
@@ -1185,22 +1266,25 @@ if __name__ == '__main__':
         raise ValueError('Expecting empty or one argument (startup text file)')
 
     secure_token(open_number=True)
+    session_name = startup_script.removesuffix('.ac')
+    accounting_system, script_to_run = open_session(session_name, startup_script)
     app = ExampleApp(include_py=True, include_ipy=True, 
-                    startup_script=startup_script,
+                    startup_script=script_to_run,
                     persistent_history_file='history.dat',
                     allow_cli_args=False)
     app.self_in_py = True  # Enable access to "self" within the py command
     app.debug = True  # Show traceback if/when an exception occurs
-    accounting_system = empty_accounting_system()
     # load_state(accounting_system)
 
     # set_prompt_part_1(accounting_system.selected["period"])
     # set_prompt_part_2(accounting_system.selected["journal"])
     # app.prompt = prompt
-    globals()['session_name'] = startup_script.removesuffix('.ac')
+    globals()['session_name'] = session_name
     app.prompt = globals()['session_name'] + '> '
 
     app.cmdloop(f"Accounting Commander")
+    if script_to_run != startup_script:
+        os.remove(script_to_run)
 
     
 
@@ -4,9 +4,11 @@ from dataclasses import dataclass
 import operator
 from typing import Any
 from uuid import uuid4
+from weakref import WeakSet
 
 from yaerp.model.money import Money
-from yaerp.tools.sorted_collection import SortedCollection
+from yaerp.tools.prefix_sum import PrefixSums
+from yaerp.tools.sorted_collection import KEY_MAX, SortedCollection
 from yaerp.tools.text import shortify
 
 class AccountSide(IntEnum):
@@ -25,6 +27,9 @@ class AccountSide(IntEnum):
             return "Cr"
 
 class Account:
+    __slots__ = ('tag', 'ledger', 'currency', 'name', 'guid', 'posted_records',
+                 'posted_totals', 'posted_sums', 'tree_nodes')
+
     def __init__(self, tag: str, ledger, currency, name = None) -> None:
         if not tag:
             raise ValueError("'tag' parameter must be non empty string")
@@ -43,6 +48,9 @@ class Account:
             [], 
             key=operator.attrgetter('journal_entry.date', 'journal_entry.time', 'journal_entry.sid')
         ) # only Ledger should modify this list
+        self.posted_totals = {AccountSide.Dr: 0, AccountSide.Cr: 0} # only Ledger should modify this dict
+        self.posted_sums = {AccountSide.Dr: PrefixSums(), AccountSide.Cr: PrefixSums()} # amounts by posted_records key
+        self.tree_nodes = WeakSet() # AccountTree nodes caching sums of this account
 
     def append_record(self, account_record):
         ''' A Ledger invoke this function when Account Record is in the process of posting. '''
@@ -51,19 +59,29 @@ class Account:
         if account_record in self.posted_records:
             raise ValueError('post is already added')
         self.posted_records.insert_right(account_record)
+        self.posted_totals[account_record.side] += account_record.raw_amount
+        self.posted_sums[account_record.side].add(self.posted_records.key(account_record), account_record.raw_amount)
+        for node in self.tree_nodes:
+            node.invalidate_sums()
 
     def get_debit(self, predicate=None):
         ''' Amount (raw integer) of debit posts. '''
+        if not predicate:
+            return self.posted_totals[AccountSide.Dr]
         return sum(post.raw_amount for post in self.post_iter(
             dt_posts=True, predicate=predicate))
 
     def get_credit(self, predicate=None):
         ''' Amount (raw integer) of credit posts. '''
+        if not predicate:
+            return self.posted_totals[AccountSide.Cr]
         return sum(post.raw_amount for post in self.post_iter(
             ct_posts=True, predicate=predicate))
 
     def get_balance(self, predicate=None):
         ''' Amount (raw integer) of credit posts. '''
+        if not predicate:
+            return self.posted_totals[AccountSide.Dr] - self.posted_totals[AccountSide.Cr]
         balance = 0
         for record in self.post_iter(dt_posts=True, ct_posts=True, predicate=predicate):
             if record.side == AccountSide.Dr:
@@ -72,6 +90,19 @@ class Account:
                 balance -= record.raw_amount
         return balance
 
+    def balance_at(self, date: str):
+        ''' Balance (raw integer) of posts dated up to 'date' (inclusive). '''
+        key_end = (date, KEY_MAX)
+        return self.posted_sums[AccountSide.Dr].sum_lt(key_end) - self.posted_sums[AccountSide.Cr].sum_lt(key_end)
+
+    def turnover_between(self, date_beg: str, date_end: str):
+        ''' Debit and credit amounts (raw integers) of posts dated from 'date_beg' to 'date_end' (inclusive). '''
+        key_beg, key_end = (date_beg,), (date_end, KEY_MAX)
+        return (
+            self.posted_sums[AccountSide.Dr].sum_lt(key_end) - self.posted_sums[AccountSide.Dr].sum_lt(key_beg),
+            self.posted_sums[AccountSide.Cr].sum_lt(key_end) - self.posted_sums[AccountSide.Cr].sum_lt(key_beg)
+        )
+
     def post_iter(self, dt_posts=False, ct_posts=False, predicate=None):
         ''' Create post iterator. '''
         if dt_posts and ct_posts:
@@ -167,14 +198,12 @@ f'''  SID    <Tag> Name                                Dr                Cr
 f'''-------  ---------------------------------  ----------------  ----------------'''
 )
 
-    def __hash__(self):
-        return hash(id(self))
-    
-    def __eq__(self, other):
-        return self is other
+    # identity semantics (the builtin slots are faster than Python methods)
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
 
 
-@dataclass(frozen=True)
+@dataclass(init=False, slots=True, eq=False)
 class AccountRecord:
     """ 
     Account Record (a.k.a Account Entry) - an essential part of Ledgers and Journal Entries.
@@ -190,6 +219,21 @@ class AccountRecord:
     journal_entry: Any
     post: Any
 
+    def __init__(self, account, raw_amount: int, side: AccountSide, journal_entry, post: Any):
+        setattr_ = object.__setattr__
+        setattr_(self, 'account', account)
+        setattr_(self, 'raw_amount', raw_amount)
+        setattr_(self, 'side', side)
+        setattr_(self, 'journal_entry', journal_entry)
+        setattr_(self, 'post', post)
+
+    def __setattr__(self, name, value):
+        # the post is the only state changed after creation (set by the Ledger);
+        # the other fields are indexed (account totals, sorted records, tree sums)
+        if name != 'post':
+            raise AttributeError(f"AccountRecord field '{name}' cannot be changed")
+        object.__setattr__(self, name, value)
+
     # def __copy__(self):
     #     raise RuntimeError("explicit copying is not possible - parent journal entry manage copy() operation")
 
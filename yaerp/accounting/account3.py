@@ -4,12 +4,17 @@ from dataclasses import dataclass
 import operator
 from typing import Any
 from uuid import uuid4
+from weakref import WeakSet
 
 from yaerp.model.money import Money
+from yaerp.tools.prefix_sum import PrefixSums
 from yaerp.tools.sid import SID
-from yaerp.tools.sorted_collection import SortedCollection
+from yaerp.tools.sorted_collection import KEY_MAX, SortedCollection
 from yaerp.tools.text import shortify
 
+record_key = operator.attrgetter('journal_entry.date', 'journal_entry.time', 'journal_entry.sid')
+OPENING_KEY = ('',)     # sums key of the opening totals (before any record)
+
 def restrict(txt):
     if txt in ['root', 'tag', 'name', 'mark', 'journal', 'ledger']:
         raise ValueError('illegal text')
@@ -30,6 +35,9 @@ class AccountSide(IntEnum):
             return "Cr"
 
 class Account:
+    __slots__ = ('tag', 'ledger', 'currency', 'name', 'guid', 'posted_totals', 'unposted_totals',
+                 'posted_sums', 'unposted_sums', 'opening_totals', 'tree_nodes')
+
     def __init__(self, tag: str, ledger, currency, name = None) -> None:
         if not tag:
             raise ValueError("'tag' parameter must be non empty string")
@@ -42,6 +50,12 @@ class Account:
         self.currency = currency
         self.name = name
         self.guid = uuid4().hex
+        self.posted_totals = {AccountSide.Dr: 0, AccountSide.Cr: 0}    # maintained by the Ledger
+        self.unposted_totals = {AccountSide.Dr: 0, AccountSide.Cr: 0}  # maintained by the Ledger
+        self.posted_sums = {AccountSide.Dr: PrefixSums(), AccountSide.Cr: PrefixSums()}    # amounts by (date, time, sid)
+        self.unposted_sums = {AccountSide.Dr: PrefixSums(), AccountSide.Cr: PrefixSums()}  # amounts by (date, time, sid)
+        self.opening_totals = {AccountSide.Dr: 0, AccountSide.Cr: 0}   # posted records not in memory (see set_opening_totals)
+        self.tree_nodes = WeakSet()  # AccountTree nodes caching sums of this account
         if self.ledger:
             ledger.register_account(self)
 
@@ -52,22 +66,108 @@ class Account:
                                                       account=self)
         return acc_entries
 
+    @property
+    def posted_records(self):
+        ''' Posted Account Records in date order (served from the ledger's index) '''
+        return self.ledger.posted_account_records.get(self, SortedCollection())
+
     def has_entries(self):
-        for _ in self.records_gen():
-            return True
-        return False
+        return self.ledger.has_account_records(self)
+
+    def update_totals(self, account_record, posted: bool, sign: int = 1):
+        ''' A Ledger invoke this function when Account Record enters (sign=1) or leaves (sign=-1) the ledger's index. '''
+        if account_record.account != self:
+            raise ValueError('account record is assigned to an another account')
+        totals = self.posted_totals if posted else self.unposted_totals
+        totals[account_record.side] += sign * account_record.raw_amount
+        sums = self.posted_sums if posted else self.unposted_sums
+        je = account_record.journal_entry
+        if sign > 0:
+            sums[account_record.side].add((je.date, je.time, je.sid), account_record.raw_amount)
+        else:
+            sums[account_record.side].remove((je.date, je.time, je.sid), account_record.raw_amount)
+        for node in self.tree_nodes:
+            node.invalidate_sums()
+
+    def update_totals_many(self, account_records, posted: bool):
+        ''' Batch form of update_totals() for Account Records entering the ledger's index. '''
+        if any(account_record.account is not self for account_record in account_records):
+            raise ValueError('account record is assigned to an another account')
+        totals = self.posted_totals if posted else self.unposted_totals
+        sums = self.posted_sums if posted else self.unposted_sums
+        for side in (AccountSide.Dr, AccountSide.Cr):
+            pairs = [(record_key(record), record.raw_amount)
+                     for record in account_records if record.side == side]
+            if pairs:
+                totals[side] += sum(value for _, value in pairs)
+                sums[side].update(pairs)
+        for node in self.tree_nodes:
+            node.invalidate_sums()
+
+    def set_opening_totals(self, debit: int, credit: int):
+        '''
+        Totals of the posted records kept outside of the ledger's index (see Ledger.loaded_from).
+        They are a part of posted_totals and of the sums before any record.
+        '''
+        for side, amount in ((AccountSide.Dr, debit), (AccountSide.Cr, credit)):
+            previous = self.opening_totals[side]
+            if amount == previous:
+                continue
+            if previous:
+                self.posted_sums[side].remove(OPENING_KEY, previous)
+            if amount:
+                self.posted_sums[side].add(OPENING_KEY, amount)
+            self.posted_totals[side] += amount - previous
+            self.opening_totals[side] = amount
+        for node in self.tree_nodes:
+            node.invalidate_sums()
 
     def get_debit(self, predicate=None):
-        dr_entries = self.records_gen(side=AccountSide.Dr)
-        return sum(entry.raw_amount for entry in dr_entries)
+        if predicate:
+            dr_entries = filter(predicate, self.records_gen(side=AccountSide.Dr))
+            return sum(entry.raw_amount for entry in dr_entries)
+        opening_date = self.ledger.opening_date()
+        if opening_date:
+            return self.turnover_between(opening_date, None)[0]
+        return self.posted_totals[AccountSide.Dr] + self.unposted_totals[AccountSide.Dr]
 
     def get_credit(self, predicate=None):
-        cr_entries = self.records_gen(side=AccountSide.Cr)
-        return sum(entry.raw_amount for entry in cr_entries)
+        if predicate:
+            cr_entries = filter(predicate, self.records_gen(side=AccountSide.Cr))
+            return sum(entry.raw_amount for entry in cr_entries)
+        opening_date = self.ledger.opening_date()
+        if opening_date:
+            return self.turnover_between(opening_date, None)[1]
+        return self.posted_totals[AccountSide.Cr] + self.unposted_totals[AccountSide.Cr]
 
     def get_balance(self, predicate=None):
         return self.get_debit(predicate) - self.get_credit(predicate)
 
+    def balance_at(self, date: str, posted=True, unposted=True):
+        '''
+        Balance (raw integer) of records dated up to 'date' (inclusive), starting from
+        the opening entry of the period opened by the last closing (see Ledger.close_period).
+        '''
+        debit, credit = self.turnover_between(self.ledger.opening_date(date), date, posted, unposted)
+        return debit - credit
+
+    def turnover_between(self, date_beg: str, date_end: str, posted=True, unposted=True):
+        ''' Debit and credit amounts (raw integers) of records dated from 'date_beg' to 'date_end' (inclusive). '''
+        if posted and (date_beg or date_end):
+            # the opening totals cover only the records before the loaded ones
+            self.ledger.require_entries(date_beg or date_end)
+        result = []
+        for side in (AccountSide.Dr, AccountSide.Cr):
+            amount = 0
+            for sums, selected in ((self.posted_sums, posted), (self.unposted_sums, unposted)):
+                if not selected:
+                    continue
+                amount += sums[side].sum_lt((date_end, KEY_MAX)) if date_end else sums[side].total()
+                if date_beg:
+                    amount -= sums[side].sum_lt((date_beg,))
+            result.append(amount)
+        return tuple(result)
+
     def full_str(self):
         txt = []
         ac_caption = f'"{self.name}"'
@@ -101,14 +201,12 @@ class Account:
     def __str__(self):
         return self.short_str()
 
-    def __hash__(self):
-        return hash(id(self))
-    
-    def __eq__(self, other):
-        return self is other
+    # identity semantics (the builtin slots are faster than Python methods)
+    __hash__ = object.__hash__
+    __eq__ = object.__eq__
 
 
-@dataclass(frozen=True)
+@dataclass(init=False, slots=True, eq=False)
 class AccountRecord:
     """ 
     Account Record (a.k.a Account Entry) - an essential part of Ledgers and Journal Entries.
@@ -124,6 +222,21 @@ class AccountRecord:
     journal_entry: Any
     post: int
 
+    def __init__(self, account, raw_amount: int, side: AccountSide, journal_entry, post: int):
+        setattr_ = object.__setattr__
+        setattr_(self, 'account', account)
+        setattr_(self, 'raw_amount', raw_amount)
+        setattr_(self, 'side', side)
+        setattr_(self, 'journal_entry', journal_entry)
+        setattr_(self, 'post', post)
+
+    def __setattr__(self, name, value):
+        # the post is the only state changed after creation (set by the Ledger);
+        # the other fields are indexed (account totals, sorted records, tree sums)
+        if name != 'post':
+            raise AttributeError(f"AccountRecord field '{name}' cannot be changed")
+        object.__setattr__(self, name, value)
+
     # def __copy__(self):
     #     raise RuntimeError("explicit copying is not possible - parent journal entry manage copy() operation")
 
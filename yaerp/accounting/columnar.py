@@ -0,0 +1,142 @@
+'''
+Columnar store of posted Account Records and the vectorized trial balance.
+
+Posted records are kept in NumPy columns (account index, side, raw amount,
+date ordinal, journal index), so debit/credit/balance of all accounts are
+computed at once instead of iterating AccountRecord objects.
+NumPy is an optional dependency required only by this module.
+'''
+
+import numpy as np
+
+from yaerp.accounting.account3 import AccountSide
+from yaerp.tools.day import date_ordinal
+
+
+class PostingColumns:
+    '''
+    Posted Account Records of a Ledger in NumPy columns.
+
+    Records are stored sorted by (account, side) so the totals of every
+    account are differences of one cumulative sum (exact int64 arithmetic).
+    Dates are compared by day: date_beg/date_end select whole days.
+    '''
+    columns = (('account', np.int32), ('side', np.int8), ('raw_amount', np.int64),
+               ('date', np.int32), ('journal', np.int32))
+
+    def __init__(self, accounts, journals):
+        self.accounts = list(accounts)
+        self.journals = list(journals)
+        self.account_index = {account: idx for idx, account in enumerate(self.accounts)}
+        self.journal_index = {journal: idx for idx, journal in enumerate(self.journals)}
+        self._length = 0
+        self._data = {name: np.empty(0, dtype) for name, dtype in self.columns}
+        self._sorted = True
+
+    @classmethod
+    def from_ledger(cls, ledger):
+        ''' Load all posted records of the Ledger (ledger3) '''
+        ledger.require_entries()
+        store = cls(ledger.accounts, ledger.journals)
+        for records in ledger.posted_account_records.values():
+            store.add_records(records)
+        return store
+
+    def __len__(self):
+        return self._length
+
+    def __getattr__(self, name):
+        # columns: account, side, raw_amount, date, journal (views of the used part)
+        data = self.__dict__.get('_data')
+        if data is None or name not in data:
+            raise AttributeError(name)
+        self._sort()
+        return data[name][:self._length]
+
+    def add_records(self, records):
+        ''' Append posted Account Records '''
+        rows = [(self.account_index[record.account],
+                 record.side,
+                 record.raw_amount,
+                 date_ordinal(record.journal_entry.date),
+                 self.journal_index[record.journal_entry.journal])
+                for record in records if record.post]
+        if not rows:
+            return
+        self._reserve(self._length + len(rows))
+        for (name, dtype), values in zip(self.columns, zip(*rows)):
+            self._data[name][self._length:self._length + len(rows)] = np.fromiter(values, dtype, len(rows))
+        self._length += len(rows)
+        self._sorted = False
+
+    def add_journal_entry(self, journal_entry):
+        ''' Append the records of a posted Journal Entry '''
+        self.add_records(journal_entry.account_records_gen())
+
+    def _reserve(self, capacity):
+        current = len(self._data['account'])
+        if capacity <= current:
+            return
+        capacity = max(capacity, 2 * current)
+        for name, dtype in self.columns:
+            column = np.empty(capacity, dtype)
+            column[:self._length] = self._data[name][:self._length]
+            self._data[name] = column
+
+    def _sort(self):
+        if self._sorted:
+            return
+        used = {name: column[:self._length] for name, column in self._data.items()}
+        order = np.lexsort((used['side'], used['account']))
+        for name in self._data:
+            self._data[name][:self._length] = used[name][order]
+        self._sorted = True
+
+    def mask(self, date_beg: str = None, date_end: str = None, journals=None):
+        ''' Boolean mask of records dated from date_beg to date_end (inclusive) of the journals '''
+        result = np.ones(self._length, dtype=bool)
+        if date_beg:
+            result &= self.date >= date_ordinal(date_beg)
+        if date_end:
+            result &= self.date <= date_ordinal(date_end)
+        if journals is not None:
+            selected = [self.journal_index[journal] for journal in journals if journal in self.journal_index]
+            result &= np.isin(self.journal, selected)
+        return result
+
+    def totals(self, date_beg: str = None, date_end: str = None, journals=None):
+        ''' Debit and credit amounts (int64 arrays, one item per account) '''
+        amounts = np.where(self.mask(date_beg, date_end, journals), self.raw_amount, 0)
+        cumulative = np.concatenate(([0], np.cumsum(amounts, dtype=np.int64)))
+        # segments of (account, side) in the sorted columns
+        keys = self.account.astype(np.int64) * 2 + (self.side == AccountSide.Cr)
+        bounds = np.searchsorted(keys, np.arange(2 * len(self.accounts) + 1))
+        sums = cumulative[bounds[1:]] - cumulative[bounds[:-1]]
+        return sums[0::2], sums[1::2]
+
+    def trial_balance(self, date_beg: str = None, date_end: str = None, journals=None):
+        ''' {account: (debit, credit, balance)} as raw integers '''
+        debit, credit = self.totals(date_beg, date_end, journals)
+        return {account: (int(dr), int(cr), int(dr - cr))
+                for account, dr, cr in zip(self.accounts, debit, credit)}
+
+    def tree_totals(self, tree, date_beg: str = None, date_end: str = None, journals=None):
+        ''' {AccountTree node: (debit, credit, balance)} rolled up through the subtrees '''
+        debit, credit = self.totals(date_beg, date_end, journals)
+        nodes = tree.flatten()
+        node_accounts = np.fromiter(
+            (self.account_index.get(node.account, -1) for node in nodes), np.int64, len(nodes))
+        known = node_accounts >= 0
+        result = {}
+        node_sums = []
+        for amounts in (debit, credit):
+            values = np.zeros(len(nodes), dtype=np.int64)
+            values[known] = amounts[node_accounts[known]]
+            node_sums.append(np.concatenate(([0], np.cumsum(values))))
+        enter = np.fromiter((node._enter for node in nodes), np.int64, len(nodes))
+        leave = np.fromiter((node._exit for node in nodes), np.int64, len(nodes))
+        dr_sums = node_sums[0][leave] - node_sums[0][enter]
+        cr_sums = node_sums[1][leave] - node_sums[1][enter]
+        for node, dr, cr in zip(nodes, dr_sums, cr_sums):
+            result[node] = (int(dr), int(cr), int(dr - cr))
+        return result
@@ -0,0 +1,523 @@
+'''
+SQLite repository of the books.
+
+The database keeps currencies, accounts, journals (with their fields
+definition), charts of accounts, journal entries with account records,
+posts and accounting periods with their closing balances. Account records
+are indexed by (account, date) and journal entries by (journal, date), sid
+and guid, so balances are summed by SQLite and only the entries in use have
+to be kept in memory: the objects are a cache over the database. The history
+does not have to be loaded: posted entries dated before the date given to
+load() count in the accounts as opening totals until a query reaches into
+them, then their periods are loaded.
+
+    db = BooksDatabase('books.db')
+    db.save(accounting_system)          # the whole state, the ledger is attached
+    je.post_this()                      # new drafts and posts are written as they happen
+    db.balances(date_end='2023-12-31')  # {account tag: (debit, credit)} summed by SQLite
+    db.load(AccountingSystem(), date_beg='2023-01-01')  # the structure, drafts and posted entries from the date
+'''
+import json
+import sqlite3
+
+from yaerp.accounting.account3 import Account, AccountRecord, AccountSide
+from yaerp.accounting.journal3 import FieldKind, JournalEntry
+from yaerp.accounting.ledger3 import Ledger, Period
+from yaerp.accounting.marker import Marker
+from yaerp.accounting.snapshot import LoadedJournal, mark_from_str, marks_str
+from yaerp.accounting.tree3 import AccountTree
+from yaerp.model.currency import Currency
+from yaerp.tools.sid import SID, SIDCounter
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS setting (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS currency (
+    id INTEGER PRIMARY KEY, key TEXT, code TEXT, numeric_code TEXT, name TEXT, unit TEXT, subunit TEXT,
+    fraction_char TEXT, group_separator TEXT, separator_positions TEXT, subunits INTEGER, always_separated INTEGER);
+CREATE TABLE IF NOT EXISTS account (
+    id INTEGER PRIMARY KEY, tag TEXT NOT NULL, key TEXT, name TEXT, currency INTEGER, guid TEXT);
+CREATE TABLE IF NOT EXISTS journal (id INTEGER PRIMARY KEY, tag TEXT NOT NULL, key TEXT, name TEXT);
+CREATE TABLE IF NOT EXISTS field (
+    journal INTEGER, position INTEGER, name TEXT, kind INTEGER, account INTEGER, side INTEGER, default_value TEXT,
+    PRIMARY KEY (journal, position));
+CREATE TABLE IF NOT EXISTS chart (id INTEGER PRIMARY KEY, name TEXT, main INTEGER);
+CREATE TABLE IF NOT EXISTS node (
+    chart INTEGER, position INTEGER, account INTEGER, parent INTEGER, marks TEXT, PRIMARY KEY (chart, position));
+CREATE TABLE IF NOT EXISTS entry (
+    sid INTEGER PRIMARY KEY, guid TEXT NOT NULL, journal INTEGER, date TEXT, time TEXT,
+    description TEXT, reference TEXT, post INTEGER, info TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS entry_guid ON entry (guid);
+CREATE INDEX IF NOT EXISTS entry_journal_date ON entry (journal, date, time, sid);
+CREATE TABLE IF NOT EXISTS record (
+    sid INTEGER, position INTEGER, field INTEGER, account INTEGER, side INTEGER, raw_amount INTEGER,
+    post INTEGER, date TEXT, PRIMARY KEY (sid, position)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS record_account_date ON record (account, date, side, raw_amount, post);
+CREATE TABLE IF NOT EXISTS post (post INTEGER, position INTEGER, sid INTEGER, PRIMARY KEY (post, position));
+CREATE TABLE IF NOT EXISTS period (
+    name TEXT PRIMARY KEY, date_beg TEXT, date_end TEXT, closed INTEGER, opening_sid INTEGER);
+CREATE TABLE IF NOT EXISTS closing (period TEXT, account INTEGER, balance INTEGER, PRIMARY KEY (period, account));
+'''
+
+TABLES = ('setting', 'currency', 'account', 'journal', 'field', 'chart', 'node', 'entry', 'record', 'post',
+          'period', 'closing')
+
+ENTRY_COLUMNS = 'entry.sid, entry.guid, entry.journal, entry.date, entry.time, entry.description, ' \
+                'entry.reference, entry.post, entry.info'
+
+
+def period_beg(date: str) -> str:
+    ''' The first day of the year of the date (the entries out of the ledger's periods are loaded by years) '''
+    return f'{date[:4]}-01-01'
+
+
+def _info(values: list) -> str:
+    if not values:
+        return '[]'
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (str, int, type(None))):
+            raise ValueError(f'value {value!r} ({type(value)}) cannot be stored in the database')
+    return json.dumps(values)
+
+
+class BooksDatabase:
+    '''
+    Books stored in a SQLite file (WAL mode).
+
+    The ledger with 'database' set to this object writes new drafts and posts
+    as they happen: post_these() and Ledger.post_batch() write the whole batch
+    with executemany() in one transaction. Entries modified in memory later on
+    are written by write_entries().
+    '''
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA cache_size=-65536')
+        self.connection.executescript(SCHEMA)
+        self.ledger = None
+        self._currency_ids = {}     # currency -> id
+        self._account_ids = {}      # account -> id
+        self._journal_ids = {}      # journal -> id
+        self._accounts = {}         # id -> account
+        self._journals = {}         # id -> journal
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # writing
+
+    def save(self, accounting_system):
+        '''
+        Replace the stored books with the state of the accounting system (acc_sys.AccountingSystem)
+        and attach its ledger to the database.
+        '''
+        ledger = accounting_system.general_ledger
+        ledger.require_entries()
+        self._currency_ids, self._account_ids, self._journal_ids = {}, {}, {}
+        self._accounts, self._journals = {}, {}
+        with self.connection as db:
+            for table in TABLES:
+                db.execute(f'DELETE FROM {table}')
+            settings = [('ledger_tag', ledger.tag), ('ledger_name', ledger.name)]
+            settings.extend((f'selected.{key}', str(value)) for key, value in accounting_system.selected.items())
+            db.executemany('INSERT INTO setting VALUES (?, ?)', settings)
+            for key, currency in accounting_system.currencies.items():
+                self._currency_id(db, currency, key)
+            account_keys = {account: key for key, account in accounting_system.accounts.items()}
+            for account in ledger.accounts:
+                self._account_id(db, account, account_keys.get(account))
+            journal_keys = {journal: key for key, journal in accounting_system.journals.items()}
+            for journal in dict.fromkeys([*ledger.journals, *accounting_system.journals.values()]):
+                self._journal_id(db, journal, journal_keys.get(journal))
+            charts = list(accounting_system.charts_of_accounts.items())
+            if not any(chart is accounting_system.coa for _, chart in charts):
+                charts.append((None, accounting_system.coa))
+            for chart_id, (name, root) in enumerate(charts, 1):
+                db.execute('INSERT INTO chart VALUES (?, ?, ?)', (chart_id, name, root is accounting_system.coa))
+                nodes = [root, *root.get_internals_gen()]
+                positions = {id(node): position for position, node in enumerate(nodes)}
+                db.executemany('INSERT INTO node VALUES (?, ?, ?, ?, ?)',
+                               [(chart_id, positions[id(node)],
+                                 self._account_id(db, node.account) if node.account else None,
+                                 positions[id(node.parent)] if node.parent else None, marks_str(node.marker))
+                                for node in nodes])
+            entries = [je for journal in ledger.journals for je in journal.journal_entries]
+            self._write_entries(db, entries)
+            self._write_posts(db, ledger, ledger.posts)
+            self._write_periods(db, ledger)
+        self.ledger = ledger
+        ledger.database = self
+
+    def write_entries(self, journal_entries):
+        ''' Write (insert or replace) the journal entries and their posts in one transaction '''
+        entries = list(journal_entries)
+        if not entries:
+            return
+        with self.connection as db:
+            self._write_entries(db, entries)
+            self._write_posts(db, entries[0].journal.ledger, dict.fromkeys(je.post for je in entries if je.post))
+
+    def write_periods(self, ledger):
+        ''' Write (replace) the periods of the ledger with the closing balances '''
+        with self.connection as db:
+            self._write_periods(db, ledger)
+
+    def delete_entries(self, journal_entries):
+        ''' Delete the (unposted) journal entries '''
+        sids = [(je.sid,) for je in journal_entries]
+        with self.connection as db:
+            db.executemany('DELETE FROM record WHERE sid = ?', sids)
+            db.executemany('DELETE FROM entry WHERE sid = ?', sids)
+
+    def _currency_id(self, db, currency, key: str = None) -> int:
+        currency_id = self._currency_ids.get(currency)
+        if currency_id is None:
+            currency_id = self._currency_ids[currency] = len(self._currency_ids) + 1
+            db.execute('INSERT INTO currency VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (currency_id, key, currency.symbol, currency.numeric_code, currency.name,
+                        currency.national_unit_symbol, currency.national_subunit_symbol, currency.fraction_char,
+                        currency.group_separator_char, ','.join(map(str, currency.separator_positions or ())),
+                        currency.ratio_of_subunits_to_unit,
+                        # only the two predicates of Currency are stored: the default one or 'always'
+                        bool(currency.separator_predicate(0))))
+        return currency_id
+
+    def _account_id(self, db, account, key: str = None) -> int:
+        account_id = self._account_ids.get(account)
+        if account_id is None:
+            account_id = self._account_ids[account] = len(self._account_ids) + 1
+            self._accounts[account_id] = account
+            db.execute('INSERT INTO account VALUES (?, ?, ?, ?, ?, ?)',
+                       (account_id, account.tag, key, account.name, self._currency_id(db, account.currency),
+                        account.guid))
+        return account_id
+
+    def _journal_id(self, db, journal, key: str = None) -> int:
+        journal_id = self._journal_ids.get(journal)
+        if journal_id is None:
+            journal_id = self._journal_ids[journal] = len(self._journal_ids) + 1
+            self._journals[journal_id] = journal
+            db.execute('INSERT INTO journal VALUES (?, ?, ?, ?)', (journal_id, journal.tag, key, journal.name))
+            layout = journal.layout
+            db.executemany('INSERT INTO field VALUES (?, ?, ?, ?, ?, ?, ?)',
+                           [(journal_id, position, name, kind,
+                             self._account_id(db, account) if account else None, side,
+                             json.dumps(default) if kind == FieldKind.Info else default)
+                            for position, (name, kind, account, side, default)
+                            in enumerate(zip(layout.names, layout.kinds, layout.accounts, layout.sides,
+                                             layout.defaults))])
+        return journal_id
+
+    def _write_entries(self, db, entries):
+        entry_rows, record_rows = [], []
+        for je in entries:
+            if je.layout is not je.journal.layout:
+                raise ValueError(f'j/e {SID.print_form(je.sid)} has its own fields definition')
+            info, position = [], 0
+            for field, (kind, value) in enumerate(zip(je.layout.kinds, je.values)):
+                if kind == FieldKind.Info:
+                    info.append(value)
+                    continue
+                for record in value if kind == FieldKind.Records else [value] if value else []:
+                    record_rows.append((je.sid, position, field,
+                                        self._account_id(db, record.account) if record.account else None,
+                                        record.side, record.raw_amount, record.post, je.date))
+                    position += 1
+            entry_rows.append((je.sid, je.guid, self._journal_id(db, je.journal), je.date, je.time,
+                               je.description, je.reference, je.post, _info(info)))
+        db.executemany('DELETE FROM record WHERE sid = ?', [(row[0],) for row in entry_rows])
+        db.executemany('INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', entry_rows)
+        db.executemany('INSERT INTO record VALUES (?, ?, ?, ?, ?, ?, ?, ?)', record_rows)
+        db.execute("INSERT OR REPLACE INTO setting VALUES ('sid', ?)", (SIDCounter._sid,))
+
+    def _write_posts(self, db, ledger, posts):
+        posts = [(post,) for post in posts]
+        db.executemany('DELETE FROM post WHERE post = ?', posts)
+        db.executemany('INSERT INTO post VALUES (?, ?, ?)',
+                       [(post, position, je.sid)
+                        for post, in posts for position, je in enumerate(ledger.entries_by_post.get(post, ()))])
+
+    def _write_periods(self, db, ledger):
+        db.execute('DELETE FROM period')
+        db.execute('DELETE FROM closing')
+        db.executemany('INSERT INTO period VALUES (?, ?, ?, ?, ?)',
+                       [(period.name, period.date_beg, period.date_end, period.closed, period.opening_sid)
+                        for period in ledger.periods])
+        db.executemany('INSERT INTO closing VALUES (?, ?, ?)',
+                       [(period.name, self._account_id(db, account), balance)
+                        for period in ledger.periods for account, balance in period.closing_balances.items()])
+
+    # reading
+
+    def balances(self, date_beg: str = None, date_end: str = None, posted=True, unposted=True) -> dict:
+        '''
+        {account tag: (debit, credit)} of the stored records dated from date_beg to date_end (inclusive),
+        summed by SQLite (the entries do not have to be in memory)
+        '''
+        conditions, parameters = ['1'], []
+        if date_beg:
+            conditions.append('record.date >= ?')
+            parameters.append(date_beg)
+        if date_end:
+            conditions.append('record.date <= ?')
+            parameters.append(date_end)
+        if not posted:
+            conditions.append('record.post IS NULL')
+        if not unposted:
+            conditions.append('record.post IS NOT NULL')
+        tags = dict(self.connection.execute('SELECT id, tag FROM account'))
+        return {tags[account_id]: totals for account_id, totals in self._sums(conditions, parameters).items()}
+
+    def _sums(self, conditions, parameters) -> dict:
+        result = {}
+        for account_id, side, amount in self.connection.execute(
+                'SELECT record.account, record.side, SUM(record.raw_amount) FROM record '
+                f'WHERE record.raw_amount <> 0 AND {" AND ".join(conditions)} '
+                'GROUP BY record.account, record.side', parameters):
+            debit, credit = result.get(account_id, (0, 0))
+            result[account_id] = (debit + amount, credit) if side == AccountSide.Dr else (debit, credit + amount)
+        return result
+
+    def load(self, accounting_system, date_beg: str = None):
+        '''
+        Read the stored books into a new accounting system (acc_sys.AccountingSystem) with a new ledger:
+        the structure, all unposted entries and the posted ones dated from date_beg (all if None).
+        The older posted entries count in the accounts as opening totals and are loaded when
+        they are needed (see Ledger.require_entries). The ledger is attached to the database.
+        '''
+        db = self.connection
+        settings = dict(db.execute('SELECT key, value FROM setting'))
+        ledger = Ledger(settings.get('ledger_tag', 'GL'), settings.get('ledger_name'))
+        accounting_system.general_ledger = ledger
+        self._currency_ids, self._account_ids, self._journal_ids = {}, {}, {}
+        self._accounts, self._journals = {}, {}
+
+        accounting_system.currencies = {}
+        currencies = {}
+        for (currency_id, key, code, numeric_code, name, unit, subunit, fraction_char, group_separator,
+             positions, subunits, always) in db.execute('SELECT * FROM currency ORDER BY id'):
+            positions = tuple(int(position) for position in positions.split(',') if position)
+            options = {} if not always else {'separator_predicate': None}
+            currency = currencies[currency_id] = Currency(
+                code, numeric_code, subunits, name, unit, subunit, fraction_char=fraction_char,
+                group_separator_char=group_separator, separator_positions=positions, **options)
+            self._currency_ids[currency] = currency_id
+            if key is not None:
+                accounting_system.currencies[key] = currency
+
+        accounting_system.accounts = {}
+        for account_id, tag, key, name, currency, guid in db.execute('SELECT * FROM account ORDER BY id'):
+            account = Account(tag, ledger, currencies[currency], name)
+            account.guid = guid
+            self._accounts[account_id] = account
+            self._account_ids[account] = account_id
+            if key is not None:
+                accounting_system.accounts[key] = account
+
+        fields = {}
+        for journal_id, _, name, kind, account, side, default in db.execute(
+                'SELECT * FROM field ORDER BY journal, position'):
+            definition = fields.setdefault(journal_id, {})
+            if kind == FieldKind.Record:
+                definition[name] = AccountRecord(self._accounts.get(account), int(default or 0),
+                                                 AccountSide(side) if side else None, None, None)
+            elif kind == FieldKind.Records:
+                definition[name] = []
+            else:
+                definition[name] = json.loads(default)
+        accounting_system.journals = {}
+        for journal_id, tag, key, name in db.execute('SELECT * FROM journal ORDER BY id'):
+            journal = LoadedJournal(tag, name, ledger, fields.get(journal_id, {}))
+            self._journals[journal_id] = journal
+            self._journal_ids[journal] = journal_id
+            if key is not None:
+                accounting_system.journals[key] = journal
+
+        accounting_system.charts_of_accounts = {}
+        for chart_id, name, main in db.execute('SELECT * FROM chart ORDER BY id').fetchall():
+            nodes = []
+            for account, parent, marks in db.execute(
+                    'SELECT account, parent, marks FROM node WHERE chart = ? ORDER BY position', (chart_id,)):
+                node = AccountTree(self._accounts.get(account), nodes[parent] if parent is not None else None)
+                if marks:
+                    node.marker = Marker(*map(mark_from_str, marks.split(',')))
+                nodes.append(node)
+            if name is not None:
+                accounting_system.charts_of_accounts[name] = nodes[0]
+            if main:
+                accounting_system.coa = nodes[0]
+
+        accounting_system.selected = {key[len('selected.'):]: value for key, value in settings.items()
+                                      if key.startswith('selected.')}
+        ledger.posts.bulk_insert([post for post, in db.execute('SELECT DISTINCT post FROM post ORDER BY post')])
+        for post in ledger.posts:
+            ledger.entries_by_post[post] = []
+        self.ledger = ledger
+        self._load_entries(*self._conditions(None, None, False, True))
+        self._load_entries(*self._conditions(date_beg, None, True, False))
+        if date_beg:
+            self._set_opening_totals(date_beg)
+            ledger.loaded_from = date_beg
+        ledger.database = self
+        # zero balances are not stored: a closed period without rows has none
+        closing = {}
+        for period, account, balance in db.execute('SELECT * FROM closing'):
+            closing.setdefault(period, {})[self._accounts[account]] = balance
+        ledger.restore_periods([Period(name, beg, end, bool(closed), opening_sid, closing.get(name, {}))
+                                for name, beg, end, closed, opening_sid in db.execute('SELECT * FROM period')],
+                               balances_read=True)
+        SID()   # the first SID() resets the counter
+        stored = [int(settings.get('sid', 0)), *db.execute('SELECT max(sid) FROM entry').fetchone(),
+                  *db.execute('SELECT max(post) FROM post').fetchone()]
+        SIDCounter._sid = max(SIDCounter._sid, *(sid for sid in stored if sid))
+
+    def load_entries(self, date_beg: str = None) -> int:
+        '''
+        Load the posted entries of the attached ledger kept only in the database, from the period
+        of date_beg (all if None); the rest stays as the opening totals of the accounts.
+        Returns the number of loaded entries.
+        '''
+        ledger = self.ledger
+        loaded_from = ledger.loaded_from
+        if not loaded_from or date_beg and date_beg >= loaded_from:
+            return 0
+        if date_beg:
+            period = ledger.period_of(date_beg)
+            date_beg = period.date_beg if period else period_beg(date_beg)
+        conditions, parameters = self._conditions(date_beg, None, True, False)
+        conditions.append('entry.date < ?')
+        parameters.append(loaded_from)
+        count = self._load_entries(conditions, parameters)
+        self._set_opening_totals(date_beg)
+        ledger.loaded_from = date_beg
+        return count
+
+    def _load_entries(self, conditions, parameters) -> int:
+        ledger = self.ledger
+        batches = {}
+        for je in self._entries_gen(conditions, parameters, skip_cached=True):
+            batches.setdefault(je.journal, []).append(je)
+        # the loaded entries are not written back
+        database, ledger.database = ledger.database, None
+        try:
+            for journal, batch in batches.items():
+                journal._insert_entries(batch)
+        finally:
+            ledger.database = database
+        cached = ledger.journal_entries_by_sid
+        sources = {}
+        for post, sid in self.connection.execute(
+                'SELECT post.post, post.sid FROM post WHERE post.post IN '
+                f'(SELECT entry.post FROM entry WHERE {" AND ".join(conditions)}) ORDER BY post.post, post.position',
+                parameters):
+            if sid in cached:
+                sources.setdefault(post, []).append(cached[sid])
+        ledger.entries_by_post.update(sources)
+        return sum(map(len, batches.values()))
+
+    def _set_opening_totals(self, date: str = None):
+        # the posted records dated before the date, summed by SQLite
+        sums = self._sums(['record.post IS NOT NULL', 'record.date < ?'], [date]) if date else {}
+        for account_id, account in self._accounts.items():
+            account.set_opening_totals(*sums.get(account_id, (0, 0)))
+
+    def entries_gen(self, date_beg: str = None, date_end: str = None, posted=True, unposted=True, journal=None):
+        '''
+        Stored journal entries dated from date_beg to date_end (inclusive) in (date, time, sid) order.
+        Entries in memory are yielded as they are, the others are read without being kept.
+        '''
+        conditions, parameters = self._conditions(date_beg, date_end, posted, unposted)
+        if journal is not None:
+            conditions.append('entry.journal = ?')
+            parameters.append(self._journal_ids[journal])
+        yield from self._entries_gen(conditions, parameters, skip_cached=False)
+
+    def get_journal_entry(self, sid: int = None, guid: str = None):
+        ''' Journal entry by SID or GUID, from memory or from the database, None if not found '''
+        if self.ledger is not None:
+            je = self.ledger.get_journal_entry(sid, guid)
+            if je is not None:
+                return je
+        if sid:
+            conditions, parameters = ['entry.sid = ?'], [int(sid)]
+        elif guid:
+            conditions, parameters = ['entry.guid = ?'], [(f'{guid:032x}' if isinstance(guid, int) else guid).lower()]
+        else:
+            return None
+        return next(self._entries_gen(conditions, parameters, skip_cached=False), None)
+
+    @staticmethod
+    def _conditions(date_beg, date_end, posted, unposted) -> tuple[list, list]:
+        conditions, parameters = ['1'], []
+        if date_beg:
+            conditions.append('entry.date >= ?')
+            parameters.append(date_beg)
+        if date_end:
+            conditions.append('entry.date <= ?')
+            parameters.append(date_end)
+        if not posted:
+            conditions.append('entry.post IS NULL')
+        if not unposted:
+            conditions.append('entry.post IS NOT NULL')
+        return conditions, parameters
+
+    def _entries_gen(self, conditions, parameters, skip_cached):
+        where = ' AND '.join(conditions)
+        order = 'ORDER BY entry.date, entry.time, entry.sid'
+        entries = self.connection.execute(f'SELECT {ENTRY_COLUMNS} FROM entry WHERE {where} {order}', parameters)
+        # the records of the same entries in the same order, read side by side with the entries
+        records = self.connection.execute(
+            'SELECT record.sid, record.field, record.account, record.side, record.raw_amount, record.post '
+            f'FROM record JOIN entry ON entry.sid = record.sid WHERE {where} {order}, record.position', parameters)
+        record = next(records, None)
+        cached = self.ledger.journal_entries_by_sid if self.ledger is not None else {}
+        for row in entries:
+            sid = row[0]
+            entry_records = []
+            while record is not None and record[0] == sid:
+                entry_records.append(record)
+                record = next(records, None)
+            je = cached.get(sid)
+            if je is not None:
+                if not skip_cached:
+                    yield je
+                continue
+            yield self._new_entry(row, entry_records)
+
+    def _new_entry(self, row, records):
+        sid, guid, journal, date, time, description, reference, post, info = row
+        journal = self._journals[journal]
+        je = JournalEntry.__new__(JournalEntry)
+        je.sid, je.guid, je.date, je.time = sid, guid, date, time
+        je._description, je._reference, je.post = description, reference, post
+        je.journal = journal
+        je.layout = journal.layout
+        info = iter(json.loads(info))
+        by_field = {}
+        debit = credit = 0
+        for _, field, account, side, raw_amount, record_post in records:
+            account = self._accounts.get(account)
+            by_field.setdefault(field, []).append(
+                AccountRecord(account, raw_amount, AccountSide(side) if side else None, je, record_post))
+            # the totals as counted by JournalEntry._count()
+            if account and side == AccountSide.Dr:
+                debit += raw_amount
+            elif account and side == AccountSide.Cr:
+                credit += raw_amount
+        je.values = values = []
+        for field, kind in enumerate(je.layout.kinds):
+            if kind == FieldKind.Info:
+                values.append(next(info))
+            elif kind == FieldKind.Records:
+                values.append(by_field.get(field, []))
+            else:
+                values.append(by_field[field][0] if field in by_field else None)
+        je._debit, je._credit = debit, credit
+        return je
@@ -1,5 +1,6 @@
 import copy
 import operator
+import sys
 from uuid import uuid4
 from yaerp.accounting.account import AccountRecord, AccountSide
 from yaerp.tools.sid import SID
@@ -38,6 +39,8 @@ class Journal:
         if ledger:
             ledger.register_journal(self)       
         self.journal_entries = SortedCollection([], key=operator.attrgetter('date', 'time', 'sid'))
+        self.entries_by_sid = {}    # sid -> journal entry
+        self.entries_by_guid = {}   # guid -> journal entry
 
     def post_aggregated(self, journal_entries, summary_date, summary_description,
                         summary_reference=None, **summary_info_fields):
@@ -107,6 +110,7 @@ class Journal:
         post = self.ledger.post_summary_entry(self, summary_journal_entry)
         for journal_entry in journal_entries:
             journal_entry._set_posted(post)
+        self.ledger.register_post_entries(post, dict.fromkeys(journal_entries))
 
     def gen_new(self):
         for je in self.journal_entries:
@@ -119,35 +123,34 @@ class Journal:
                 yield je
 
     def gen_by_sid(self, *, entry_sid: int = None, entry_sids: list[int] = None):
-        for je in self.journal_entries:
-            if entry_sid and entry_sid == je.sid:
-                yield je
-            if entry_sids and je.sid in entry_sids:
-                yield je
+        found = []
+        if entry_sid:
+            found.append(self.entries_by_sid.get(entry_sid))
+        if entry_sids:
+            found.extend(self.entries_by_sid.get(sid) for sid in dict.fromkeys(entry_sids))
+        yield from sorted((je for je in found if je), key=self.journal_entries.key)
 
     def get_by_sid(self, entry_sid: int | str):
         if isinstance(entry_sid, str):
             entry_sid = int(entry_sid)
-        for je in self.journal_entries:
-            if je.sid == entry_sid:
-                return je
+        je = self.entries_by_sid.get(entry_sid)
+        if je:
+            return je
         raise ValueError(f'Not found Journal Entry "{self.tag}:{entry_sid}"')
     
     def get_by_guid(self, entry_guid: int | str):
-        if isinstance(entry_guid, str):
-            entry_guid = int(entry_guid)
-        for je in self.journal_entries:
-            if je.guid == entry_guid:
-                return je
+        if isinstance(entry_guid, int):
+            entry_guid = f'{entry_guid:032x}'
+        je = self.entries_by_guid.get(entry_guid.lower())
+        if je:
+            return je
         raise ValueError(f'Not found Journal Entry "{self.tag}:GUID={entry_guid}"')
 
     def gen_by_post(self, post):
         ''' Source entry(ies) for specified post '''
-        for je in self.gen_posted_entries():
-            if je.post == post:
+        for je in self.ledger.entries_for_post(post):
+            if je.journal is self:
                 yield je
-                if not post.summary_entry:
-                    return
 
     def initialize_fields(self, journal_entry):
         '''
@@ -211,6 +214,7 @@ class JournalEntry:
      - adjustment,
      - depreciation.
     '''
+    __slots__ = ('date', 'time', 'sid', 'guid', 'journal', 'description', 'reference', 'post', 'fields')
 
     def __init__(self, journal: Journal):
         # unique identifier: date+time+sid
@@ -262,6 +266,13 @@ class JournalEntry:
     def __deepcopy__(self, memo):
         return copy.copy(self)
 
+    def intern_strings(self):
+        ''' Share equal date/time strings between journal entries '''
+        if self.date:
+            self.date = sys.intern(self.date)
+        if self.time:
+            self.time = sys.intern(self.time)
+
     def is_balanced(self):
         return self.get_debit() == self.get_credit()
     
@@ -384,7 +395,10 @@ class JournalEntry:
             raise ValueError('journal entry has no parent journal')
         if self in self.journal.journal_entries:
             raise ValueError('this journal entry is alraedy added to the journal')
+        self.intern_strings()
         self.journal.journal_entries.insert_right(self)
+        self.journal.entries_by_sid[self.sid] = self
+        self.journal.entries_by_guid[self.guid] = self
 
     def can_post_this(self, use_exceptions=True):
         ''' Check possibility to post this journal entry to the ledger. '''
@@ -419,26 +433,14 @@ class JournalEntry:
     def _set_posted(self, post):
         if not post:
             raise ValueError('post is None')
-        for name, value in self.fields.items():
+        for value in self.fields.values():
             if isinstance(value, AccountRecord):
                 if value.raw_amount and value.account:
-                        self.fields[name] = AccountRecord(
-                            value.account,
-                            value.raw_amount,
-                            value.side,
-                            value.journal_entry,
-                            post
-                            )
+                    value.post = post
             elif isinstance(value, list):
-                for idx, account_entry in enumerate(value):
+                for account_entry in value:
                     if account_entry.raw_amount and account_entry.account:
-                        value[idx] = AccountRecord(
-                            account_entry.account,
-                            account_entry.raw_amount,
-                            account_entry.side,
-                            account_entry.journal_entry,
-                            post
-                            )
+                        account_entry.post = post
         self.post = post
 
     def str_header():
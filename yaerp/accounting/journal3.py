@@ -1,12 +1,113 @@
+from collections.abc import MutableMapping
 import copy
+from enum import IntEnum
 import operator
+import sys
 from uuid import uuid4
 from yaerp.accounting.account3 import AccountRecord, AccountSide
 from yaerp.tools.sid import SID
-from yaerp.tools.sorted_collection import SortedCollection
+from yaerp.tools.sorted_collection import KEY_MAX, SortedCollection
 from yaerp.tools.text import shortify
 
 
+class FieldKind(IntEnum):
+    Info = 0        # any value
+    Record = 1      # single account record
+    Records = 2     # list of account records
+
+
+class JournalLayout:
+    '''
+    Journal Entry structure compiled once from a fields definition (see Journal.initialize_fields).
+
+    Journal Entries keep only a list of field values, in the order of 'names':
+    an Info field keeps its value, a Records field a list of account records
+    and a Record field its account record, or None until the record is added
+    (the default account and side are kept here).
+    '''
+    __slots__ = ('names', 'positions', 'kinds', 'accounts', 'sides', 'defaults')
+
+    def __init__(self, definition: dict):
+        self.names = tuple(definition)
+        self.positions = {name: position for position, name in enumerate(self.names)}
+        kinds, accounts, sides, defaults = [], [], [], []
+        for value in definition.values():
+            if isinstance(value, AccountRecord):
+                kinds.append(FieldKind.Record)
+                accounts.append(value.account)
+                sides.append(value.side)
+                defaults.append(value.raw_amount)
+            elif isinstance(value, list):
+                kinds.append(FieldKind.Records)
+                accounts.append(None)
+                sides.append(None)
+                defaults.append(None)
+            else:
+                kinds.append(FieldKind.Info)
+                accounts.append(None)
+                sides.append(None)
+                defaults.append(value)
+        self.kinds = tuple(kinds)
+        self.accounts = tuple(accounts)
+        self.sides = tuple(sides)
+        self.defaults = tuple(defaults)
+
+    def new_values(self, journal_entry):
+        ''' Field values of a new Journal Entry '''
+        values = []
+        for kind, account, side, default in zip(self.kinds, self.accounts, self.sides, self.defaults):
+            if kind == FieldKind.Records:
+                values.append([])
+            elif kind == FieldKind.Record and default:
+                values.append(AccountRecord(account, default, side, journal_entry, None))
+            elif kind == FieldKind.Record:
+                values.append(None)
+            else:
+                values.append(default)
+        return values
+
+    def placeholder(self, journal_entry, position):
+        ''' Empty account record of the Record field (not stored in the entry) '''
+        return AccountRecord(self.accounts[position], 0, self.sides[position], journal_entry, None)
+
+
+class EntryFields(MutableMapping):
+    '''
+    Dictionary view of the Journal Entry fields: field name -> value.
+    An empty Record field reads as a zero amount record of the default account and side.
+    '''
+    __slots__ = ('_journal_entry',)
+
+    def __init__(self, journal_entry):
+        self._journal_entry = journal_entry
+
+    def __getitem__(self, name):
+        je = self._journal_entry
+        position = je.layout.positions[name]
+        value = je.values[position]
+        if value is None and je.layout.kinds[position] == FieldKind.Record:
+            return je.layout.placeholder(je, position)
+        return value
+
+    def __setitem__(self, name, value):
+        je = self._journal_entry
+        if name not in je.layout.positions:
+            raise RuntimeError(f'usage of unexpected (unknown?) field \'{name}\'')
+        je.values[je.layout.positions[name]] = value
+
+    def __delitem__(self, name):
+        raise RuntimeError('Journal Entry fields are defined by the journal')
+
+    def __iter__(self):
+        return iter(self._journal_entry.layout.names)
+
+    def __len__(self):
+        return len(self._journal_entry.layout.names)
+
+
+EMPTY_LAYOUT = JournalLayout({})
+
+
 class Journal:
     '''
     * Journal
@@ -38,6 +139,9 @@ class Journal:
         if ledger:
             ledger.register_journal(self)
         self.journal_entries = SortedCollection([], key=operator.attrgetter('date', 'time', 'sid'))
+        self.entries_by_sid = {}    # sid -> journal entry
+        self.entries_by_guid = {}   # guid -> journal entry
+        self._layout = None         # compiled initialize_fields() definition
 
     def post_these(self, draft_journal_entries):
         ''' 
@@ -50,48 +154,60 @@ class Journal:
         je_list = list(dict.fromkeys(draft_journal_entries))
 
         for je in je_list:
-            if not je.can_post_this(self):
-                raise ValueError(f"cannot post j/e {je.sid}")
-            
-        bulk_post_id = SID().new()
-        self.ledger.register_post(bulk_post_id)
-        for je in je_list:
-            self.ledger.post_journal_entry(self, je, define_post_id=bulk_post_id)
-            if je not in self.journal_entries:
-                self.journal_entries.insert_right(je)
+            if je.journal is not self:
+                raise ValueError(f'journal entry {je.sid} is binded to another journal')
+        self.ledger.post_batch(je_list, single_post=True)
+
+    def _insert_entry(self, journal_entry):
+        ''' Insert the entry into the journal and the ledger's account index '''
+        journal_entry.intern_strings()
+        self.journal_entries.insert_right(journal_entry)
+        self._register_ids(journal_entry)
+        if self.ledger:
+            self.ledger.index_journal_entry(journal_entry)
+            # posted entries are written by the ledger
+            if self.ledger.database is not None and not journal_entry.post:
+                self.ledger.database.write_entries([journal_entry])
+
+    def _insert_entries(self, journal_entries):
+        ''' Insert many entries at once, sorting the batch only once '''
+        for journal_entry in journal_entries:
+            journal_entry.intern_strings()
+        self.journal_entries.bulk_insert(journal_entries)
+        for journal_entry in journal_entries:
+            self._register_ids(journal_entry)
+        if self.ledger:
+            self.ledger.index_journal_entries(journal_entries)
+            if self.ledger.database is not None:
+                self.ledger.database.write_entries([je for je in journal_entries if not je.post])
+
+    def _remove_entry(self, journal_entry):
+        ''' Remove the entry from the journal and the ledger's account index '''
+        self.journal_entries.remove(journal_entry)
+        del self.entries_by_sid[journal_entry.sid]
+        del self.entries_by_guid[journal_entry.guid]
+        if self.ledger:
+            self.ledger.unregister_journal_entry(journal_entry)
+            self.ledger.unindex_journal_entry(journal_entry)
+            if self.ledger.database is not None:
+                self.ledger.database.delete_entries([journal_entry])
+
+    def _register_ids(self, journal_entry):
+        self.entries_by_sid[journal_entry.sid] = journal_entry
+        self.entries_by_guid[journal_entry.guid] = journal_entry
+        if self.ledger:
+            self.ledger.register_journal_entry(journal_entry)
 
     def journal_entries_gen(self, posted: bool=True, not_posted: bool=True, date_beg: str=None, date_end: str=None, reverse=False):
-        if posted and not_posted:
-            for je in self.journal_entries:
-                if date_beg and je.date < date_beg:
-                    continue
-                if date_end and je.date > date_end:
-                    continue
-                yield je
-        elif posted and not not_posted:
-            for je in self.journal_entries:
-                if je.post:
-                    if date_beg and je.date < date_beg:
-                        continue
-                    if date_end and je.date > date_end:
-                        continue
-                    yield je
-        elif not posted and not_posted:
-            for je in self.journal_entries:
-                if not je.post:
-                    if date_beg and je.date < date_beg:
-                        continue
-                    if date_end and je.date > date_end:
-                        continue
-                    yield je
+        yield from self.entries_gen(posted, not_posted, date_beg, date_end, reverse)
 
     def entries_gen(self, posted: bool=True, unposted: bool=True, date_beg: str=None, date_end: str=None, reverse=False):
-        if not reverse:
-            entries_iterator = iter(self.journal_entries)
-        else:
-            entries_iterator = reversed(self.journal_entries)
-        
-        for je in entries_iterator:
+        if posted and self.ledger:
+            self.ledger.require_entries(date_beg)
+        # only the date range is visited: entries are sorted by (date, time, sid)
+        min_key = (date_beg,) if date_beg else None
+        max_key = (date_end, KEY_MAX) if date_end else None
+        for je in self.journal_entries.irange(min_key, max_key, reverse=reverse):
             # posted/unposted
             if je.post:
                 if not posted:
@@ -99,13 +215,6 @@ class Journal:
             else:
                 if not unposted:
                     continue
-            # date_beg
-            if date_beg and je.date < date_beg:
-                continue
-            # date_end
-            if date_end and je.date > date_end:
-                continue
-            
             yield je
 
     def gen_new(self):
@@ -114,44 +223,52 @@ class Journal:
                 yield je
 
     def gen_posted(self):
+        if self.ledger:
+            self.ledger.require_entries()
         for je in self.journal_entries:
             if je.post:
                 yield je
 
     def gen_by_sid(self, *, entry_sid: int = None, entry_sids: list[int] = None):
-        for je in self.journal_entries:
-            if entry_sid and entry_sid == je.sid:
-                yield je
-            if entry_sids and je.sid in entry_sids:
-                yield je
+        found = []
+        if entry_sid:
+            found.append(self.entries_by_sid.get(entry_sid))
+        if entry_sids:
+            found.extend(self.entries_by_sid.get(sid) for sid in dict.fromkeys(entry_sids))
+        yield from sorted((je for je in found if je), key=self.journal_entries.key)
 
     def get_by_sid(self, entry_sid: int | str, not_rise_exception=False):
         if isinstance(entry_sid, str):
             entry_sid = int(entry_sid)
-        for je in self.journal_entries:
-            if je.sid == entry_sid:
-                return je
+        je = self.entries_by_sid.get(entry_sid)
+        if je:
+            return je
         if not_rise_exception:
             return None
         raise ValueError(f'Not found Journal Entry "{self.tag}:{entry_sid}"')
     
     def get_by_guid(self, entry_guid: int | str, not_rise_exception=False):
-        if isinstance(entry_guid, str):
-            entry_guid = int(entry_guid)
-        for je in self.journal_entries:
-            if je.guid == entry_guid:
-                return je
+        if isinstance(entry_guid, int):
+            entry_guid = f'{entry_guid:032x}'
+        je = self.entries_by_guid.get(entry_guid.lower())
+        if je:
+            return je
         if not_rise_exception:
             return None
         raise ValueError(f'Not found Journal Entry "{self.tag}:GUID={entry_guid}"')
 
     def gen_by_post(self, post):
         ''' Source entry(ies) for specified post '''
-        for je in self.gen_posted_entries():
-            if je.post == post:
+        for je in self.ledger.entries_for_post(post):
+            if je.journal is self:
                 yield je
-                if not post.summary_entry:
-                    return
+
+    @property
+    def layout(self) -> JournalLayout:
+        ''' Journal Entry structure compiled (once) from initialize_fields() '''
+        if self._layout is None:
+            self._layout = JournalLayout(self.initialize_fields(None))
+        return self._layout
 
     def initialize_fields(self, journal_entry):
         '''
@@ -177,6 +294,8 @@ class Journal:
             Note that 3 fields names: "data", "description" and "reference" are not needed to define here.
             The variables with these names are part of JournalEntry class.
 
+         The definition is compiled once into the Journal's 'layout' (journal_entry is None then),
+         so it should not depend on the journal entry.
         '''
         return {
             'Account':      []      # debit/credit account records
@@ -189,7 +308,7 @@ class Journal:
         #     raise ValueError('the specified entry already exist in the journal')
         if not journal_entry.date:
             raise ValueError(f'journal entry {journal_entry.sid} has empty date')
-        for field in journal_entry.fields.values():
+        for field in journal_entry.values:
             if isinstance(field, AccountRecord):
                 if not field.journal_entry:
                     raise ValueError('account record has no journal entry')
@@ -214,7 +333,16 @@ class JournalEntry:
      - purchase,
      - adjustment,
      - depreciation.
+
+    Debit and credit totals are kept up to date by add_record() and add_info();
+    call refresh_totals() after modifying 'fields' directly. Set 'check_totals'
+    to cross-check the totals against a full recomputation (debugging).
+    An entry in its journal is written again to the ledger's database (if any)
+    by these methods and by setting 'description' or 'reference'.
     '''
+    __slots__ = ('date', 'time', 'sid', 'guid', 'journal', '_description', '_reference', 'post',
+                 'layout', 'values', '_debit', '_credit')
+    check_totals = False
 
     def __init__(self, journal: Journal):
         # unique identifier: date+time+sid
@@ -226,10 +354,45 @@ class JournalEntry:
         self.description = None
         self.reference = None
         self.post = None
-        if self.journal:
-            self.fields = self.journal.initialize_fields(self)
-        else:
-            self.fields = {}
+        self.layout = self.journal.layout if self.journal else EMPTY_LAYOUT
+        self.values = self.layout.new_values(self)  # field values (see JournalLayout)
+        self.refresh_totals()
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @description.setter
+    def description(self, value: str):
+        self._description = value
+        self._write_through()
+
+    @property
+    def reference(self) -> str:
+        return self._reference
+
+    @reference.setter
+    def reference(self, value: str):
+        self._reference = value
+        self._write_through()
+
+    def _write_through(self):
+        ''' Write the changed entry to the database of the ledger (if the entry is in its journal) '''
+        ledger = self.journal.ledger if self.journal is not None else None
+        if ledger is not None and ledger.database is not None and self.is_in_journal():
+            ledger.database.write_entries([self])
+
+    @property
+    def fields(self) -> EntryFields:
+        ''' Field name -> value view of the entry '''
+        return EntryFields(self)
+
+    @fields.setter
+    def fields(self, definition: dict):
+        ''' Replace the journal's structure with an ad hoc one (field name -> value) '''
+        self.layout = JournalLayout(definition)
+        self.values = list(definition.values())
+        self.refresh_totals()
 
     def __hash__(self):
         return hash((self.date, self.time, self.sid))
@@ -255,31 +418,32 @@ class JournalEntry:
         je_copy.description = self.description
         je_copy.reference = None    # empty reference
         je_copy.post = None         # empty post
-        je_copy.fields = {}         # create journal field copies
-        for name, value in self.fields.items():
+        je_copy.layout = self.layout
+        je_copy.values = []         # create journal field copies
+        for value in self.values:
             if isinstance(value, AccountRecord):
-                ac = self.fields[name].account
-                si = self.fields[name].side
-                am = self.fields[name].raw_amount
-                ar_copy = AccountRecord(ac, am, si, je_copy, None)
-                je_copy.fields[name] = ar_copy
+                ar_copy = AccountRecord(value.account, value.raw_amount, value.side, je_copy, None)
+                je_copy.values.append(ar_copy)
             elif isinstance(value, list):
-                je_copy.fields[name] = list()
-                for record in value:
-                    ac = record.account
-                    si = record.side
-                    am = record.raw_amount
-                    ar_copy = AccountRecord(ac, am, si, je_copy, None)
-                    je_copy.fields[name].append(ar_copy)
+                je_copy.values.append([AccountRecord(record.account, record.raw_amount, record.side, je_copy, None)
+                                       for record in value])
             else:
-                je_copy.fields[name] = copy.copy(value)
+                je_copy.values.append(copy.copy(value))
+        je_copy.refresh_totals()
         return je_copy
 
     def __deepcopy__(self, memo):
         return copy.copy(self)
 
+    def intern_strings(self):
+        ''' Share equal date/time strings between journal entries '''
+        if self.date:
+            self.date = sys.intern(self.date)
+        if self.time:
+            self.time = sys.intern(self.time)
+
     def account_records_gen(self, side=None, account=None):
-        for value in self.fields.values():
+        for value in self.values:
             if isinstance(value, AccountRecord):
                 if value.side and value.account:
                     if side and value.side != side:
@@ -317,9 +481,18 @@ class JournalEntry:
 
     def add_info(self, field_tag: str, value):
         ''' Fill the Journal's Entry "info field" with the new value '''
-        if field_tag not in self.fields.keys():
+        position = self.layout.positions.get(field_tag)
+        if position is None:
             raise RuntimeError(f'usage of unexpected (unknown?) field \'{field_tag}\'')
-        self.fields[field_tag] = value
+        indexed = self.is_in_journal()
+        if indexed and self.journal.ledger:
+            self.journal.ledger.unindex_journal_entry(self)
+        self._count(self.values[position], -1)
+        self.values[position] = value
+        self._count(value)
+        if indexed and self.journal.ledger:
+            self.journal.ledger.index_journal_entry(self)
+            self._write_through()
 
     def debit(self, field_tag: str, raw_amount: int, account):
         ''' Add a Debit Record '''
@@ -338,15 +511,19 @@ class JournalEntry:
         If no 'account' or no 'side' argument provided the method tries get these 
         values from the field definition.
         '''
-        if field_tag not in self.fields.keys():
-            raise RuntimeError(f'unknown field "{field_tag}"; use one of these {list(self.fields.keys())}')
-
-        if isinstance(self.fields[field_tag], AccountRecord):
-            if self.fields[field_tag].account and not account:
-                account = self.fields[field_tag].account
-            if self.fields[field_tag].side and not side:
-                side = self.fields[field_tag].side
-        elif isinstance(self.fields[field_tag], list):
+        position = self.layout.positions.get(field_tag)
+        if position is None:
+            raise RuntimeError(f'unknown field "{field_tag}"; use one of these {list(self.layout.names)}')
+
+        current = self.values[position]
+        if current is None and self.layout.kinds[position] == FieldKind.Record:
+            current = self.layout.placeholder(self, position)
+        if isinstance(current, AccountRecord):
+            if current.account and not account:
+                account = current.account
+            if current.side and not side:
+                side = current.side
+        elif isinstance(current, list):
             if not account or not side:
                 raise ValueError(f'field "{field_tag}" intended for a list of account records expects both \'account\' and \'side\' arguments provided')
         else:
@@ -357,16 +534,54 @@ class JournalEntry:
         if not side:
             raise ValueError(f'the Account Side cannot be determined (no \'side\' argument provided and no side defined for the field "{field_tag}")')
 
-        if isinstance(self.fields[field_tag], AccountRecord):
-            self.fields[field_tag] = AccountRecord(account, raw_amount, side, self, None)
-        elif isinstance(self.fields[field_tag], list):
-            self.fields[field_tag].append(AccountRecord(account, raw_amount, side, self, None))
+        indexed = self.is_in_journal()
+        if indexed and self.journal.ledger:
+            self.journal.ledger.unindex_journal_entry(self)
+        record = AccountRecord(account, raw_amount, side, self, None)
+        if isinstance(current, AccountRecord):
+            self._count(self.values[position], -1)
+            self.values[position] = record
+        else:
+            current.append(record)
+        self._count(record)
+        if indexed and self.journal.ledger:
+            self.journal.ledger.index_journal_entry(self)
+            self._write_through()
 
     def get_debit(self):
-        return self._get_side_sum(AccountSide.Dr)
+        if self.check_totals:
+            self._check_totals()
+        return self._debit
 
     def get_credit(self):
-        return self._get_side_sum(AccountSide.Cr)
+        if self.check_totals:
+            self._check_totals()
+        return self._credit
+
+    def refresh_totals(self):
+        ''' Recompute the debit/credit totals from the fields '''
+        self._debit = self._get_side_sum(AccountSide.Dr)
+        self._credit = self._get_side_sum(AccountSide.Cr)
+        self._write_through()
+
+    def _count(self, value, sign=1):
+        ''' Add (sign=1) or subtract (sign=-1) account records of the field value to the totals '''
+        if isinstance(value, AccountRecord):
+            records = (value,)
+        elif isinstance(value, list):
+            records = value
+        else:
+            return
+        for record in records:
+            if record.account and record.side == AccountSide.Dr:
+                self._debit += sign * record.raw_amount
+            elif record.account and record.side == AccountSide.Cr:
+                self._credit += sign * record.raw_amount
+
+    def _check_totals(self):
+        expected = (self._get_side_sum(AccountSide.Dr), self._get_side_sum(AccountSide.Cr))
+        if (self._debit, self._credit) != expected:
+            raise RuntimeError(f'j/e {self.sid} totals {(self._debit, self._credit)} differ from records {expected}')
 
     def _get_side_sum(self, side):
         sum = 0
@@ -402,6 +617,10 @@ class JournalEntry:
                     return account_entry.account.currency
         raise RuntimeError("currency not found")
 
+    def is_in_journal(self):
+        ''' Check if this entry is already inserted to its journal '''
+        return self.journal is not None and self.journal.entries_by_sid.get(self.sid) is self
+
     def put_into_journal(self):
         ''' Insert this entry to the journal '''
         if self.journal is None:
@@ -410,7 +629,9 @@ class JournalEntry:
             raise ValueError('journal entry is already in the journal')
         if self.post:
             raise ValueError('calling this function for posted j/e make no sense')
-        self.journal.journal_entries.insert_right(self)
+        if self.journal.ledger:
+            self.journal.ledger.check_open(self.date)
+        self.journal._insert_entry(self)
 
     def del_from_journal(self):
         ''' Delete this entry from the journal '''
@@ -420,7 +641,9 @@ class JournalEntry:
             raise ValueError('journal entry not found in the journal')
         if self.post:
             raise ValueError('cannot delete posted journal entry')
-        self.journal.journal_entries.remove(self)
+        if self.journal.ledger:
+            self.journal.ledger.check_open(self.date)
+        self.journal._remove_entry(self)
 
     def can_post_this(self, use_exceptions=True):
         ''' Check possibility to post this journal entry to the ledger. '''
@@ -452,31 +675,19 @@ class JournalEntry:
         if self.can_post_this(self):
             self.journal.ledger.post_journal_entry(self.journal, self)
             if self not in self.journal.journal_entries:
-                self.journal.journal_entries.insert_right(self)
+                self.journal._insert_entry(self)
 
     def _set_posted(self, post_identifier):
         if not post_identifier or post_identifier <= 0:
             raise ValueError(f'incorrent post identifier {post_identifier}')
-        for name, value in self.fields.items():
+        for value in self.values:
             if isinstance(value, AccountRecord):
                 if value.raw_amount and value.account:
-                        self.fields[name] = AccountRecord(
-                            value.account,
-                            value.raw_amount,
-                            value.side,
-                            value.journal_entry,
-                            post_identifier
-                            )
+                    value.post = post_identifier
             elif isinstance(value, list):
-                for idx, account_entry in enumerate(value):
+                for account_entry in value:
                     if account_entry.raw_amount and account_entry.account:
-                        value[idx] = AccountRecord(
-                            account_entry.account,
-                            account_entry.raw_amount,
-                            account_entry.side,
-                            account_entry.journal_entry,
-                            post_identifier
-                            )
+                        account_entry.post = post_identifier
         self.post = post_identifier
 
     def str_header():
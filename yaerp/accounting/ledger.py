@@ -19,6 +19,7 @@ class Ledger:
         ) # ledger's main container
         self.accounts = {} # associated accounts
         self.journals = {} # associated journals
+        self.entries_by_post = {} # post identifier -> source journal entries
 
     def post_journal_entry(self, journal, journal_entry, use_guid=False):
         self.__validate_journal_entry(journal, journal_entry)
@@ -29,29 +30,21 @@ class Ledger:
         else:
             new_post_id = SID().new()
         post = Post(new_post_id, False)
-        for name, field in journal_entry.fields.items():
+        for field in journal_entry.fields.values():
+            # the records are posted in place (no new AccountRecord instances)
             if isinstance(field, AccountRecord) and field.raw_amount:
-                posted_record = AccountRecord(field.account, 
-                                                    field.raw_amount, 
-                                                    field.side, 
-                                                    field.journal_entry, 
-                                                    post)
-                self.__append_account_record(posted_record)
-                journal_entry.fields[name] = posted_record
+                field.post = post
+                self.__append_account_record(field)
             elif isinstance(field, list):
-                for idx, element in enumerate(field):
-                    posted_record = AccountRecord(element.account, 
-                                                        element.raw_amount, 
-                                                        element.side, 
-                                                        element.journal_entry, 
-                                                        post)
-                    self.__append_account_record(posted_record)
-                    field[idx] = posted_record 
+                for element in field:
+                    element.post = post
+                    self.__append_account_record(element)
 
         ## czy to jest konieczne? kontener moze przechowywac zarowno nowe jak i zaksiegowane
         # journal.journal_entries.insert_right(journal_entry)
 
         journal_entry.post = post
+        self.register_post_entries(post, [journal_entry])
         
     def post_summary_entry(self, journal, summary_journal_entry, use_guid=False):
         self.__validate_journal_entry(journal, summary_journal_entry)
@@ -64,16 +57,23 @@ class Ledger:
             if isinstance(field, AccountRecord):
                 raise RuntimeError(f'not expected field "{name}"')
             elif isinstance(field, list):
-                for idx, element in enumerate(field):
-                    posted_record = AccountRecord(element.account, 
-                                                        element.raw_amount, 
-                                                        element.side, 
-                                                        element.journal_entry, 
-                                                        summary_post)
-                    self.__append_account_record(posted_record)
-                    field[idx] = posted_record           
+                for element in field:
+                    element.post = summary_post
+                    self.__append_account_record(element)
         return summary_post
 
+    def register_post_entries(self, post, journal_entries):
+        ''' Bind source journal entries to the post (see entries_for_post) '''
+        self.entries_by_post.setdefault(post.identifier, []).extend(journal_entries)
+
+    def entries_for_post(self, post):
+        ''' Source journal entries of the post (Post or its identifier) '''
+        if isinstance(post, Post):
+            post = post.identifier
+        if post not in self.entries_by_post:
+            raise ValueError(f'Post {post} not found in the ledger')
+        return list(self.entries_by_post[post])
+
     def __validate_journal_entry(self, journal, journal_entry):
         if not journal_entry.is_balanced():
             raise RuntimeError('journal entry not balanced')
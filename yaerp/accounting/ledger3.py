@@ -1,8 +1,57 @@
+from bisect import bisect_right
+import calendar
+from dataclasses import dataclass, field
+from datetime import date, timedelta
 import heapq
 import operator
-from yaerp.accounting.account3 import AccountRecord
+import re
+from yaerp.accounting.account3 import AccountRecord, AccountSide
+from yaerp.accounting.journal3 import FieldKind, JournalEntry
 from yaerp.tools.sid import SID
-from yaerp.tools.sorted_collection import SortedCollection
+from yaerp.tools.sorted_collection import KEY_MAX, SortedCollection
+
+
+record_sorting_key = operator.attrgetter('journal_entry.date', 'journal_entry.time', 'journal_entry.sid')
+entry_sorting_key = operator.attrgetter('date', 'time', 'sid')
+
+
+def period_dates(name: str) -> tuple[str, str]:
+    ''' The first and the last day of the period: a year ('RRRR') or a month ('RRRR-MM') '''
+    if re.fullmatch(r'\d{4}', name):
+        return f'{name}-01-01', f'{name}-12-31'
+    if re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])', name):
+        year, month = map(int, name.split('-'))
+        return f'{name}-01', f'{name}-{calendar.monthrange(year, month)[1]:02}'
+    raise ValueError(f"period '{name}' is not a year (RRRR) or a month (RRRR-MM)")
+
+
+def end_of_day(date_str: str) -> str:
+    ''' Upper bound of the dates of the day (with or without time) '''
+    return f'{date_str[:10]}\uffff'
+
+
+def next_day(date_str: str) -> str:
+    return (date.fromisoformat(date_str[:10]) + timedelta(days=1)).isoformat()
+
+
+@dataclass(eq=False)
+class Period:
+    '''
+    Accounting period of the Ledger. Closing balances (debit minus credit, raw integers)
+    are stored when the period is closed.
+    '''
+    name: str
+    date_beg: str
+    date_end: str
+    closed: bool = False
+    opening_sid: int = None     # the entry opening the next period
+    closing_balances: dict = field(default_factory=dict)    # account -> balance at date_end
+    node_balances: dict = field(default_factory=dict)       # AccountTree node -> balance at date_end
+
+    def next_name(self) -> str:
+        ''' Name of the following period of the same length '''
+        beg = next_day(self.date_end)
+        return beg[:4] if len(self.name) == 4 else beg[:7]
 
 
 class Ledger:
@@ -15,6 +64,17 @@ class Ledger:
         self.posts = SortedCollection([], key=None) # post register
         self.accounts = SortedCollection([], key=operator.attrgetter('tag')) # associated accounts
         self.journals = SortedCollection([], key=operator.attrgetter('tag')) # associated journals
+        self.posted_account_records = {}    # account -> posted records (date order)
+        self.unposted_account_records = {}  # account -> unposted records (date order)
+        self.journal_entries_by_sid = {}    # sid -> journal entry (of any journal)
+        self.journal_entries_by_guid = {}   # guid -> journal entry (of any journal)
+        self.entries_by_post = {}           # post id -> source journal entries
+        self.posting_log = None             # PostingLog the posted records are appended to (optional)
+        self.database = None                # BooksDatabase the entries are written to (optional)
+        self.loaded_from = None             # posted entries dated before are only in the database (see require_entries)
+        self.periods = SortedCollection([], key=operator.attrgetter('date_beg'))  # accounting periods
+        self.closed_until = None            # the end of the last closed period (the entries up to it are frozen)
+        self.opening_dates = []             # the first days of the periods opened by closing the previous ones
 
     def journal_entries_gen(self, posted=True, unposted=True, date_beg=None, date_end=None, only_journal=None, reverse=False):
         sources_of_journal_entries = []
@@ -25,9 +85,108 @@ class Ledger:
         return heapq.merge(*sources_of_journal_entries, reverse=reverse)
 
     def account_records_gen(self, posted=True, unposted=True, date_beg=None, date_end=None, side=None, account=None, reverse=False):
+        if account is not None:
+            yield from self.__indexed_account_records_gen(posted, unposted, date_beg, date_end, side, account, reverse)
+            return
         for je in self.journal_entries_gen(posted, unposted, date_beg, date_end, reverse=reverse):
             yield from je.account_records_gen(side, account)
 
+    def __indexed_account_records_gen(self, posted, unposted, date_beg, date_end, side, account, reverse):
+        min_key = (date_beg,) if date_beg else None
+        max_key = (date_end, KEY_MAX) if date_end else None
+        sources_of_records = []
+        if posted:
+            self.require_entries(date_beg)
+        if posted and account in self.posted_account_records:
+            sources_of_records.append(self.posted_account_records[account].irange(min_key, max_key, reverse=reverse))
+        if unposted and account in self.unposted_account_records:
+            sources_of_records.append(self.unposted_account_records[account].irange(min_key, max_key, reverse=reverse))
+        for record in heapq.merge(*sources_of_records, key=record_sorting_key, reverse=reverse):
+            if side and record.side != side:
+                continue
+            yield record
+
+    def has_account_records(self, account, posted=True, unposted=True):
+        if posted and self.posted_account_records.get(account):
+            return True
+        if posted and any(account.opening_totals.values()):
+            return True
+        if unposted and self.unposted_account_records.get(account):
+            return True
+        return False
+
+    def require_entries(self, date_beg: str = None):
+        '''
+        Load the posted entries dated from date_beg (all if None) that are only in the database.
+        Until then they count in the accounts as opening totals (see BooksDatabase.load).
+        '''
+        if self.loaded_from and (not date_beg or date_beg < self.loaded_from):
+            self.database.load_entries(date_beg)
+
+    def index_journal_entry(self, journal_entry):
+        ''' Add account records of the journal entry to the per-account index. '''
+        if journal_entry.post:
+            index = self.posted_account_records
+        else:
+            index = self.unposted_account_records
+        for record in journal_entry.account_records_gen():
+            records = index.get(record.account)
+            if records is None:
+                records = index[record.account] = SortedCollection([], key=record_sorting_key)
+            records.insert_right(record)
+            record.account.update_totals(record, bool(journal_entry.post))
+
+    def index_journal_entries(self, journal_entries):
+        ''' Add account records of many journal entries to the per-account index at once. '''
+        batches = {}
+        for journal_entry in journal_entries:
+            if journal_entry.post:
+                index = self.posted_account_records
+            else:
+                index = self.unposted_account_records
+            for record in journal_entry.account_records_gen():
+                batch = batches.get((id(index), record.account))
+                if batch is None:
+                    batch = batches[id(index), record.account] = (index, [])
+                batch[1].append(record)
+        for (_, account), (index, batch) in batches.items():
+            records = index.get(account)
+            if records is None:
+                records = index[account] = SortedCollection([], key=record_sorting_key)
+            records.bulk_insert(batch)
+            account.update_totals_many(batch, index is self.posted_account_records)
+
+    def unindex_journal_entry(self, journal_entry):
+        ''' Remove account records of the journal entry from the per-account index. '''
+        if journal_entry.post:
+            index = self.posted_account_records
+        else:
+            index = self.unposted_account_records
+        for record in journal_entry.account_records_gen():
+            records = index[record.account]
+            records.remove(record)
+            if not records:
+                del index[record.account]
+            record.account.update_totals(record, bool(journal_entry.post), sign=-1)
+
+    def register_journal_entry(self, journal_entry):
+        self.journal_entries_by_sid[journal_entry.sid] = journal_entry
+        self.journal_entries_by_guid[journal_entry.guid] = journal_entry
+
+    def unregister_journal_entry(self, journal_entry):
+        del self.journal_entries_by_sid[journal_entry.sid]
+        del self.journal_entries_by_guid[journal_entry.guid]
+
+    def get_journal_entry(self, sid: int | str = None, guid: int | str = None):
+        ''' Journal entry of any journal by SID or GUID, None if not found '''
+        if sid:
+            return self.journal_entries_by_sid.get(int(sid))
+        if guid:
+            if isinstance(guid, int):
+                guid = f'{guid:032x}'
+            return self.journal_entries_by_guid.get(guid.lower())
+        return None
+
     def get_account(self, account_tag):
         return self.accounts.find(account_tag)
 
@@ -42,31 +201,115 @@ class Ledger:
             new_post_id = define_post_id
         else:
             new_post_id = SID().new()
-        for name, field in journal_entry.fields.items():
-            # create new AccountRecord instances to overwrite the older ones
-            if isinstance(field, AccountRecord) and field.raw_amount:
-                posted_record = AccountRecord(field.account, 
-                                                    field.raw_amount, 
-                                                    field.side, 
-                                                    field.journal_entry, 
-                                                    new_post_id)
-                journal_entry.fields[name] = posted_record
-            elif isinstance(field, list):
-                for idx, element in enumerate(field):
-                    posted_record = AccountRecord(element.account, 
-                                                        element.raw_amount, 
-                                                        element.side, 
-                                                        element.journal_entry, 
-                                                        new_post_id)
-                    field[idx] = posted_record 
+        indexed = journal_entry.is_in_journal()
+        if indexed:
+            self.unindex_journal_entry(journal_entry)
         if not define_post_id:
             self.register_post(new_post_id)
-        journal_entry.post = new_post_id
+        self.__set_post(journal_entry, new_post_id)
+        self.entries_by_post[new_post_id].append(journal_entry)
+        if indexed:
+            self.index_journal_entry(journal_entry)
+        if self.posting_log is not None:
+            self.posting_log.append_entries([journal_entry])
+        if self.database is not None:
+            self.database.write_entries([journal_entry])
+
+    def __set_post(self, journal_entry, post_id):
+        for field in journal_entry.values:
+            # the records are posted in place (no new AccountRecord instances)
+            if isinstance(field, AccountRecord) and field.raw_amount:
+                field.post = post_id
+            elif isinstance(field, list):
+                for element in field:
+                    element.post = post_id
+        journal_entry.post = post_id
+
+    def post_batch(self, journal_entries, single_post=False):
+        '''
+        Post many journal entries at once (all or nothing).
+
+        Every entry is validated exactly once and the ledger is not modified
+        until the whole batch is valid, so the first failure leaves all the
+        entries as they were. Each entry gets its own post identifier from
+        a reserved block, or one post is shared if 'single_post' is set.
+        Returns the list of post identifiers.
+        '''
+        entries = list(dict.fromkeys(journal_entries))
+        for journal_entry in entries:
+            self.__validate_batch_entry(journal_entry)
+        if not entries:
+            return []
+        post_ids = SID().reserve(1 if single_post else len(entries))
+        for post_id in post_ids:
+            if post_id in self.entries_by_post:
+                raise ValueError(f'Posting identifier {SID.print_form(post_id)} already exist in the ledger.')
+        self.posts.bulk_insert(post_ids)
+        for post_id in post_ids:
+            self.entries_by_post[post_id] = []
+        # sorted once, so the journals and indexes below merge presorted batches
+        ordered = sorted(entries, key=entry_sorting_key)
+        indexed, new_entries = [], {}
+        for journal_entry in ordered:
+            if journal_entry.is_in_journal():
+                self.unindex_journal_entry(journal_entry)
+                indexed.append(journal_entry)
+            else:
+                new_entries.setdefault(journal_entry.journal, []).append(journal_entry)
+        for number, journal_entry in enumerate(entries):
+            post_id = post_ids[0 if single_post else number]
+            self.__set_post(journal_entry, post_id)
+            self.entries_by_post[post_id].append(journal_entry)
+        self.index_journal_entries(indexed)
+        for journal, batch in new_entries.items():
+            journal._insert_entries(batch)
+        if self.posting_log is not None:
+            self.posting_log.append_entries(entries)
+        if self.database is not None:
+            self.database.write_entries(entries)
+        return list(post_ids)
+
+    def __validate_batch_entry(self, journal_entry):
+        ''' Single pass validation of the entry posted by post_batch() '''
+        journal = journal_entry.journal
+        if journal is None:
+            raise ValueError(f'journal entry has no parent journal {journal_entry.sid}')
+        self.check_open(journal_entry.date)
+        if journal not in self.journals:
+            raise ValueError(f'journal of j/e {journal_entry.sid} is associated with an another ledger')
+        if journal_entry.post:
+            raise ValueError(f'j/e {journal_entry.sid} is already posted')
+        journal.validate_new_journal_entry(journal_entry)
+        debit = credit = 0
+        accounts = self.accounts
+        for field in journal_entry.values:
+            if isinstance(field, list):
+                records = field
+            elif isinstance(field, AccountRecord):
+                records = (field,)
+            else:
+                continue
+            for record in records:
+                if not record.account:
+                    if record.raw_amount:
+                        raise ValueError('account entry has no parent account')
+                    continue
+                if record.account not in accounts:
+                    raise ValueError(f'account entry has parent account associated with an another ledger. [j/e {journal_entry.sid}]')
+                if record.side == AccountSide.Dr:
+                    debit += record.raw_amount
+                elif record.side == AccountSide.Cr:
+                    credit += record.raw_amount
+        if debit != credit:
+            raise RuntimeError(f'not balanced journal entry {journal_entry.sid}')
+        if not debit and not credit:
+            raise ValueError("posted entry must contain non-zero amounts")
 
     def __validate_journal_entry(self, journal, journal_entry):
         if not journal_entry.is_balanced():
             raise RuntimeError('journal entry not balanced')
-        for field in journal_entry.fields.values():
+        self.check_open(journal_entry.date)
+        for field in journal_entry.values:
             if isinstance(field, AccountRecord):
                 self.__validate_account_record(journal, field)
             elif isinstance(field, list):
@@ -82,17 +325,157 @@ class Ledger:
             if account_record.post in self.posts:
                 raise ValueError(f'Posting identifier {SID.print_form(account_record.post)} already exist in the ledger. [j/e {SID.print_form(account_record.journal_entry.sid)}]')
 
+    def create_period(self, name: str) -> Period:
+        ''' New accounting period: a year ('RRRR') or a month ('RRRR-MM') not overlapping the others '''
+        date_beg, date_end = period_dates(name)
+        if self.closed_until and date_beg <= self.closed_until:
+            raise ValueError(f'period {name} begins before the end of the closed periods ({self.closed_until})')
+        for period in self.periods:
+            if period.date_beg <= date_end and date_beg <= period.date_end:
+                raise ValueError(f'period {name} overlaps period {period.name}')
+        period = Period(name, date_beg, date_end)
+        self.periods.insert(period)
+        if self.database is not None:
+            self.database.write_periods(self)
+        return period
+
+    def get_period(self, name: str) -> Period:
+        for period in self.periods:
+            if period.name == name:
+                return period
+        raise ValueError(f'Period {name} not exist in the Ledger')
+
+    def delete_period(self, name: str):
+        ''' Remove an open period (its entries stay in the Ledger) '''
+        period = self.get_period(name)
+        if period.closed:
+            raise ValueError(f'period {name} is closed')
+        self.periods.remove(period)
+        if self.database is not None:
+            self.database.write_periods(self)
+
+    def period_of(self, date: str) -> Period | None:
+        ''' The period of the date, None if the date is out of the periods '''
+        for period in self.periods.irange(None, date[:10], reverse=True):
+            return period if date[:10] <= period.date_end else None
+        return None
+
+    def check_open(self, date: str):
+        ''' Raise ValueError if the date is in a closed period (its entries are frozen) '''
+        if self.closed_until and date and date[:10] <= self.closed_until:
+            raise ValueError(f'date {date} is in a closed period (the books are closed until {self.closed_until})')
+
+    def opening_date(self, date: str = None) -> str | None:
+        '''
+        The first day of the period opened by the last closing up to the date (or now).
+        The balances start from the opening entry posted that day, None if no period is closed before.
+        '''
+        index = bisect_right(self.opening_dates, date) if date else len(self.opening_dates)
+        return self.opening_dates[index - 1] if index else None
+
+    def close_period(self, name: str, journal) -> Period:
+        '''
+        Close the period (the earlier periods must be closed already).
+
+        The entries dated up to the end of the period are frozen, the closing balances
+        of the accounts and of their AccountTree nodes are stored in the period, and
+        the balances are posted as the opening entry of the next period (created if it
+        does not exist) into a Records field of the journal.
+        '''
+        period = self.get_period(name)
+        if period.closed:
+            raise ValueError(f'period {name} is already closed')
+        for earlier in self.periods.irange(None, period.date_beg, inclusive=(True, False)):
+            if not earlier.closed:
+                raise ValueError(f'period {earlier.name} is not closed')
+        if journal not in self.journals:
+            raise ValueError(f'journal {journal.tag} is associated with an another ledger')
+        if FieldKind.Records not in journal.layout.kinds:
+            raise ValueError(f'journal {journal.tag} has no field for the opening records')
+        for je in self.journal_entries_gen(posted=False, date_end=end_of_day(period.date_end)):
+            raise ValueError(f'unposted j/e {SID.print_form(je.sid)} dated {je.date} in the period {name}')
+        field_name = journal.layout.names[journal.layout.kinds.index(FieldKind.Records)]
+        self._store_closing_balances(period)
+        try:
+            following = self.get_period(period.next_name())
+        except ValueError:
+            following = self.create_period(period.next_name())
+        opening = JournalEntry(journal)
+        opening.date = following.date_beg
+        opening.description = f'Opening balances {following.name}'
+        for account, balance in period.closing_balances.items():
+            opening.add_record(field_name, abs(balance), account, AccountSide.Dr if balance > 0 else AccountSide.Cr)
+        if period.closing_balances:
+            opening.post_this()
+            period.opening_sid = opening.sid
+        period.closed = True
+        self.closed_until = period.date_end
+        self.opening_dates.append(following.date_beg)
+        self.__invalidate_balances()
+        if self.database is not None:
+            self.database.write_periods(self)
+        return period
+
+    def restore_periods(self, periods, balances_read: bool = False):
+        '''
+        Periods read from storage. The entries of the closed ones are frozen again and their
+        closing balances are computed again, unless they are read too (balances_read).
+        '''
+        for period in sorted(periods, key=self.periods.key):
+            self.periods.insert(period)
+            if period.closed:
+                self.closed_until = period.date_end
+                self.opening_dates.append(next_day(period.date_end))
+        for period in self.periods:
+            if period.closed and not balances_read:
+                self._store_closing_balances(period)
+            elif period.closed:
+                period.node_balances = self.__node_balances(period.closing_balances)
+        self.__invalidate_balances()
+
+    def _store_closing_balances(self, period):
+        balances = ((account, account.balance_at(end_of_day(period.date_end), unposted=False))
+                    for account in self.accounts)
+        period.closing_balances = {account: balance for account, balance in balances if balance}
+        period.node_balances = self.__node_balances(period.closing_balances)
+
+    @staticmethod
+    def __node_balances(account_balances):
+        result = {}
+        for account, balance in account_balances.items():
+            for node in account.tree_nodes:
+                # the balance counts in the node of the account and in all the nodes above
+                while node is not None:
+                    result[node] = result.get(node, 0) + balance
+                    node = node.parent
+        return result
+
+    def __invalidate_balances(self):
+        # the balances of all accounts start from the new opening date
+        for account in self.accounts:
+            for node in account.tree_nodes:
+                node.invalidate_sums()
+
     def register_post(self, new_post_identifier):
         if new_post_identifier in self.posts:
             raise ValueError("Post already exist in register")
         self.posts.insert(new_post_identifier)
+        self.entries_by_post[new_post_identifier] = []
+
+    def entries_for_post(self, post_id: int | str):
+        ''' Source journal entries of the post (in posting order) '''
+        if isinstance(post_id, str):
+            post_id = int(post_id)
+        if post_id not in self.entries_by_post:
+            raise ValueError(f'Post {post_id} not exist in register')
+        return list(self.entries_by_post[post_id])
 
     def register_account(self, account):
         if not account:
             raise ValueError('account is None')  
         if account.ledger and account.ledger != self:
             raise ValueError('account already associated with an another Ledger')  
-        if account in self.accounts._items:
+        if account in self.accounts:
             # if already exist - reinsert account (tag change was possible)
             self.accounts.remove(account)      
         self.accounts.insert(account)
@@ -109,6 +492,8 @@ class Ledger:
             self.accounts.remove(account)   
             account.tag =  new_tag
             self.accounts.insert(account)
+            if self.posting_log is not None:
+                self.posting_log.rename_account(account)
 
     def register_journal(self, journal):
         if not journal:
@@ -127,9 +512,8 @@ class Ledger:
             raise ValueError('account already associated with an another Ledger')  
         if account not in self.accounts:
             raise ValueError('account tag not exist in the Ledger')       
-        for je in self.journal_entries_gen():
-            for _ in je.account_records_gen(account=account):
-                raise ValueError('Journal Entry/ies associated with this Account exist in the Ledger') 
+        if self.has_account_records(account):
+            raise ValueError('Journal Entry/ies associated with this Account exist in the Ledger') 
         self.accounts.remove(account)
         account.ledger = None
  
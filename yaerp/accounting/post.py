@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class Post:
     ''' Flag object binding journal entries with ledger records '''
     identifier: int
@@ -0,0 +1,163 @@
+'''
+Append-only file of posted Account Records.
+
+Posted records never change, so every one is stored once as a fixed width
+binary record (see RECORD) and the file is read through mmap without
+creating Python objects: as a memoryview, unpacked tuples or NumPy columns.
+Accounts (by guid) and journals (by tag) are stored as indexes; the text
+file '<log>.tags' maps them to the tags shown, a renamed account gets a new
+line with the same guid.
+
+    log = PostingLog('books.log')
+    ledger.posting_log = log        # postings of the ledger are appended
+    log.totals()                    # {account tag: (debit, credit)}
+'''
+import mmap
+import os
+import struct
+
+from yaerp.accounting.account3 import AccountSide
+from yaerp.tools.day import date_ordinal
+
+MAGIC = b'YAERPLOG'
+VERSION = 1
+
+HEADER = struct.Struct('<8sII')         # magic, version, record size
+RECORD = struct.Struct('<qqqIIiB3x')    # sid, raw amount, post, journal, account, date ordinal, side
+
+# NumPy dtype of RECORD (the same offsets)
+RECORD_FIELDS = {'names': ['sid', 'raw_amount', 'post', 'journal', 'account', 'date', 'side'],
+                 'formats': ['<i8', '<i8', '<i8', '<u4', '<u4', '<i4', 'u1'],
+                 'offsets': [0, 8, 16, 24, 28, 32, 36],
+                 'itemsize': RECORD.size}
+
+
+class PostingLog:
+    '''
+    Posting log file: header followed by RECORD items in posting order.
+    '''
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.accounts = []      # account index -> account tag
+        self.journals = []      # journal index -> journal tag
+        self._account_index = {}    # account guid -> account index
+        self._journal_index = {}    # journal tag -> journal index
+        self._map = None
+        if not os.path.exists(file_name) or not os.path.getsize(file_name):
+            with open(file_name, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        with open(file_name, 'rb') as file:
+            magic, version, record_size = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f'{file_name} is not a posting log file')
+        if version != VERSION:
+            raise ValueError(f'{file_name}: unsupported posting log version {version}')
+        size = os.path.getsize(file_name) - HEADER.size
+        if size % RECORD.size:
+            raise ValueError(f'{file_name}: incomplete record at the end of the posting log')
+        if os.path.exists(self.tags_file_name):
+            with open(self.tags_file_name, encoding='utf-8') as file:
+                for line in file:
+                    kind, key, tag = line.rstrip('\n').split('\t', 2)
+                    self._set_tag(kind, key, tag)
+        self._file = open(file_name, 'ab')
+        self._tags_file = open(self.tags_file_name, 'a', encoding='utf-8')
+
+    @property
+    def tags_file_name(self) -> str:
+        return f'{self.file_name}.tags'
+
+    def close(self):
+        self._map = None
+        self._file.close()
+        self._tags_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return (self._file.tell() - HEADER.size) // RECORD.size
+
+    def _set_tag(self, kind: str, key: str, tag: str) -> int:
+        tags, index = (self.accounts, self._account_index) if kind == 'account' else (self.journals, self._journal_index)
+        if key in index:
+            tags[index[key]] = tag
+        else:
+            index[key] = len(tags)
+            tags.append(tag)
+        return index[key]
+
+    def _index(self, kind: str, key: str, tag: str) -> int:
+        index = (self._account_index if kind == 'account' else self._journal_index).get(key)
+        if index is None:
+            index = self._set_tag(kind, key, tag)
+            self._tags_file.write(f'{kind}\t{key}\t{tag}\n')
+        return index
+
+    def rename_account(self, account):
+        ''' Show the records of the account under its new tag '''
+        index = self._account_index.get(account.guid)
+        if index is not None and self.accounts[index] != account.tag:
+            self._set_tag('account', account.guid, account.tag)
+            self._tags_file.write(f'account\t{account.guid}\t{account.tag}\n')
+            self._tags_file.flush()
+
+    def append_entries(self, journal_entries):
+        ''' Append posted records of the journal entries '''
+        chunks = []
+        pack = RECORD.pack
+        accounts = self._account_index
+        days = {}
+        for je in journal_entries:
+            journal = self._index('journal', je.journal.tag, je.journal.tag)
+            day = days.get(je.date)
+            if day is None:
+                day = days[je.date] = date_ordinal(je.date)
+            for record in je.account_records_gen():
+                if record.post:
+                    account = accounts.get(record.account.guid)
+                    if account is None:
+                        account = self._index('account', record.account.guid, record.account.tag)
+                    chunks.append(pack(je.sid, record.raw_amount, record.post, journal, account, day, record.side))
+        self._tags_file.flush()
+        self._file.write(b''.join(chunks))
+        self._file.flush()
+
+    def view(self) -> memoryview:
+        ''' Records of the log (read only, without copying the file) '''
+        self._file.flush()
+        size = self._file.tell()
+        if self._map is None or len(self._map) != size:
+            with open(self.file_name, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[HEADER.size:size]
+
+    def records_gen(self):
+        ''' (sid, raw_amount, post, journal, account, date, side) tuples in posting order '''
+        yield from RECORD.iter_unpack(self.view())
+
+    def columns(self):
+        ''' NumPy structured array over the mapped file (fields of RECORD_FIELDS), NumPy is required '''
+        import numpy as np
+        return np.frombuffer(self.view(), dtype=np.dtype(RECORD_FIELDS))
+
+    def totals(self, date_beg: str = None, date_end: str = None) -> dict:
+        ''' {account tag: (debit, credit)} of the records dated from date_beg to date_end (inclusive) '''
+        import numpy as np
+        records = self.columns()
+        selected = np.ones(len(records), dtype=bool)
+        if date_beg:
+            selected &= records['date'] >= date_ordinal(date_beg)
+        if date_end:
+            selected &= records['date'] <= date_ordinal(date_end)
+        # exact int64 sums of the (account, side) segments of the records sorted by account and side
+        keys = records['account'][selected].astype(np.int64) * 2 + (records['side'][selected] == AccountSide.Cr)
+        amounts = records['raw_amount'][selected][np.argsort(keys, kind='stable')]
+        cumulative = np.concatenate(([0], np.cumsum(amounts, dtype=np.int64)))
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=2 * len(self.accounts)))))
+        sums = (cumulative[bounds[1:]] - cumulative[bounds[:-1]]).reshape(-1, 2)
+        return {self.accounts[index]: (int(sums[index, 0]), int(sums[index, 1]))
+                for index in np.flatnonzero(sums.any(axis=1))}
@@ -0,0 +1,166 @@
+'''
+Ledger reports computed in worker processes.
+
+The work is partitioned by account (trial balance, turnover) or by journal
+(entry counts by period). Workers get compact NumPy column slices instead
+of pickled JournalEntry graphs and return partial aggregates, which are
+merged here. NumPy is an optional dependency required only by this module.
+'''
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from yaerp.accounting.account3 import AccountSide
+from yaerp.accounting.columnar import PostingColumns
+from yaerp.tools.day import date_ordinal
+
+
+def entry_columns(journal):
+    ''' Period (RRRR * 100 + MM) and post identifier (0 if not posted) of the journal entries '''
+    entries = journal.journal_entries
+    period = np.fromiter((int(je.date[:4]) * 100 + int(je.date[5:7]) for je in entries), np.int32, len(entries))
+    post = np.fromiter((je.post or 0 for je in entries), np.int64, len(entries))
+    return period, post
+
+
+def account_totals(first, count, account, side, raw_amount, date, journal, date_beg, date_end, journals):
+    '''
+    Debit and credit amounts of the accounts first .. first + count - 1.
+    The columns are a slice of PostingColumns (sorted by account and side),
+    date_beg/date_end are day ordinals (or None), journals are indexes (or None).
+    '''
+    amounts = raw_amount
+    if date_beg is not None or date_end is not None or journals is not None:
+        selected = np.ones(len(raw_amount), dtype=bool)
+        if date_beg is not None:
+            selected &= date >= date_beg
+        if date_end is not None:
+            selected &= date <= date_end
+        if journals is not None:
+            selected &= np.isin(journal, journals)
+        amounts = np.where(selected, raw_amount, 0)
+    cumulative = np.concatenate(([0], np.cumsum(amounts, dtype=np.int64)))
+    keys = (account.astype(np.int64) - first) * 2 + (side == AccountSide.Cr)
+    bounds = np.searchsorted(keys, np.arange(2 * count + 1))
+    sums = cumulative[bounds[1:]] - cumulative[bounds[:-1]]
+    return sums[0::2], sums[1::2]
+
+
+def entry_counts(period, post):
+    '''
+    Entries of one journal by period: {period: (entries, unposted entries, post identifiers)}
+    '''
+    result = {}
+    periods, entries = np.unique(period, return_counts=True)
+    unposted = np.bincount(np.searchsorted(periods, period[post == 0]), minlength=len(periods))
+    posted = post != 0
+    # distinct (period, post) pairs, grouped by period
+    pairs = np.unique(np.stack((period[posted].astype(np.int64), post[posted])), axis=1)
+    bounds = np.searchsorted(pairs[0], periods), np.searchsorted(pairs[0], periods, side='right')
+    for number, value in enumerate(periods):
+        posts = pairs[1][bounds[0][number]:bounds[1][number]]
+        result[int(value)] = (int(entries[number]), int(unposted[number]), posts)
+    return result
+
+
+class ReportExecutor:
+    '''
+    Runs ledger reports over partitions of journals or accounts.
+
+    The posted records are loaded into PostingColumns by the first account
+    report (later postings are not seen). Worker processes are started on
+    first use; with max_workers=1 all the work runs in the calling process.
+    '''
+    def __init__(self, ledger, max_workers: int = None):
+        self.ledger = ledger
+        self.max_workers = max_workers
+        self._columns = None
+        self._executor = None
+
+    @property
+    def columns(self) -> PostingColumns:
+        if self._columns is None:
+            self._columns = PostingColumns.from_ledger(self.ledger)
+        return self._columns
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _map(self, function, tasks):
+        if self.max_workers == 1 or len(tasks) < 2:
+            return [function(*task) for task in tasks]
+        if not self._executor:
+            self._executor = ProcessPoolExecutor(self.max_workers)
+        futures = [self._executor.submit(function, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+    def _workers(self):
+        return self.max_workers or os.cpu_count() or 1
+
+    def _account_slices(self):
+        # contiguous account ranges with similar numbers of records, one per worker
+        columns = self.columns
+        account = columns.account
+        count = len(columns.accounts)
+        names = ('account', 'side', 'raw_amount', 'date', 'journal')
+        data = [getattr(columns, name) for name in names]
+        if not len(account):
+            # nothing posted: one part with empty columns (zero totals)
+            yield 0, count, *data
+            return
+        parts = max(1, min(self._workers(), count))
+        rows = np.linspace(0, len(account), parts + 1).astype(np.int64)[1:-1]
+        firsts = np.unique(np.concatenate(([0], account[rows], [count])))
+        bounds = np.searchsorted(account, firsts)
+        for number in range(len(firsts) - 1):
+            beg, end = bounds[number], bounds[number + 1]
+            yield int(firsts[number]), int(firsts[number + 1] - firsts[number]), *(column[beg:end] for column in data)
+
+    def _totals(self, date_beg, date_end, journals):
+        if journals is not None:
+            journal_index = self.columns.journal_index
+            journals = np.array([journal_index[journal] for journal in journals if journal in journal_index], np.int32)
+        date_beg = date_ordinal(date_beg) if date_beg else None
+        date_end = date_ordinal(date_end) if date_end else None
+        tasks = [(*part, date_beg, date_end, journals) for part in self._account_slices()]
+        partial = self._map(account_totals, tasks)
+        if not partial:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        return np.concatenate([dr for dr, _ in partial]), np.concatenate([cr for _, cr in partial])
+
+    def trial_balance(self, date_end: str = None, journals=None):
+        ''' {account: (debit, credit, balance)} of all accounts up to date_end (inclusive) '''
+        debit, credit = self._totals(None, date_end, journals)
+        return {account: (int(dr), int(cr), int(dr - cr))
+                for account, dr, cr in zip(self.columns.accounts, debit, credit)}
+
+    def turnover(self, date_beg: str = None, date_end: str = None, journals=None):
+        ''' {account: (debit, credit)} of the accounts with records from date_beg to date_end (inclusive) '''
+        debit, credit = self._totals(date_beg, date_end, journals)
+        moved = np.flatnonzero((debit != 0) | (credit != 0))
+        return {self.columns.accounts[idx]: (int(debit[idx]), int(credit[idx])) for idx in moved}
+
+    def entry_counts(self):
+        '''
+        Journal entries by period ('RRRR-MM'):
+        {period: (ledger posts, {journal: (entries, unposted entries)})}
+        '''
+        self.ledger.require_entries()
+        journals = [journal for journal in self.ledger.journals if journal.journal_entries]
+        partial = self._map(entry_counts, [entry_columns(journal) for journal in journals])
+        result = {}
+        for period in sorted(set().union(*partial)):
+            posts = [counts[period][2] for counts in partial if period in counts]
+            by_journal = {journal: counts[period][:2]
+                          for journal, counts in zip(journals, partial) if period in counts}
+            result[f'{period // 100:04}-{period % 100:02}'] = (len(np.unique(np.concatenate(posts))), by_journal)
+        return result
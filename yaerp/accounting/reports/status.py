@@ -0,0 +1,21 @@
+'''
+Journal entries of the Ledger by period, counted over the merged stream of
+entries (pure Python, no NumPy: used by the interactive status table).
+'''
+
+
+def entry_counts(ledger) -> dict:
+    '''
+    Journal entries by period ('RRRR-MM'):
+    {period: (ledger posts, {journal: (entries, unposted entries)})}
+    '''
+    result = {}
+    posts = {}
+    for je in ledger.journal_entries_gen():
+        period = je.date[:7]
+        by_journal = result.setdefault(period, {})
+        entries, unposted = by_journal.get(je.journal, (0, 0))
+        by_journal[je.journal] = (entries + 1, unposted + (not je.post))
+        if je.post:
+            posts.setdefault(period, set()).add(je.post)
+    return {period: (len(posts.get(period, ())), by_journal) for period, by_journal in sorted(result.items())}
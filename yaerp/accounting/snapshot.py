@@ -0,0 +1,410 @@
+'''
+Binary snapshot of the whole accounting system state.
+
+The snapshot keeps currencies, accounts, journals (with their fields
+definition), charts of accounts, journal entries with account records,
+posts, the SID counter, the selected items, the accounting periods and any
+extra text ('meta').
+Items are struct-packed fixed size records, texts are indexes into one
+string table, so reading needs neither parsing nor validation of commands.
+
+    write_snapshot(file_name, accounting_system, meta)
+    meta = read_snapshot(file_name, AccountingSystem())
+    meta = read_snapshot_meta(file_name)    # without reading the state
+'''
+from array import array
+from itertools import accumulate
+import struct
+
+from yaerp.accounting.account3 import Account, AccountRecord, AccountSide
+from yaerp.accounting.journal3 import FieldKind, Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger, Period
+from yaerp.accounting.marker import Mark, Marker
+from yaerp.accounting.tree3 import AccountTree
+from yaerp.model.currency import Currency
+from yaerp.tools.sid import SID, SIDCounter
+
+MAGIC = b'YAERPSNP'
+VERSION = 2
+
+HEADER = struct.Struct('<8sH')
+COUNT = struct.Struct('<I')
+LEDGER = struct.Struct('<IIq')              # tag, name, SID counter
+CURRENCY = struct.Struct('<IIIIIIIIIIB')    # key, code, numeric code, name, unit, subunit, fraction char,
+                                            # group separator, separator positions, subunits in unit, predicate
+ACCOUNT = struct.Struct('<III16s')          # tag, name, currency, guid
+JOURNAL = struct.Struct('<III')             # tag, name, number of fields
+FIELD = struct.Struct('<IBIBBq')            # name, kind, account + 1, side, default (value kind, payload)
+KEY = struct.Struct('<II')                  # key, index
+CHART = struct.Struct('<IBI')               # name, main chart, number of nodes
+NODE = struct.Struct('<III')                # account + 1, parent node + 1, marks
+ENTRY = struct.Struct('<qIIIIIq16s')        # sid, journal, date, time, description, reference, post, guid
+VALUE = struct.Struct('<Bq')                # value kind, payload (field value or number of records)
+RECORD = struct.Struct('<IBqq')             # account + 1, side, raw amount, post
+POST = struct.Struct('<qI')                 # post, number of source entries
+PAIR = struct.Struct('<II')                 # text key, text value
+PERIOD = struct.Struct('<IIIBq')            # name, first day, last day, closed, opening entry sid
+
+# value kinds (payload): None, text (string index), integer (value)
+VALUE_NONE, VALUE_TEXT, VALUE_INT = 0, 1, 2
+
+
+class _StringTable:
+    ''' Texts of the snapshot, index 0 is None '''
+
+    def __init__(self):
+        self.indexes = {}
+        self.texts = []
+
+    def __call__(self, text) -> int:
+        if text is None:
+            return 0
+        index = self.indexes.get(text)
+        if index is None:
+            self.texts.append(text)
+            index = self.indexes[text] = len(self.texts)
+        return index
+
+    def to_bytes(self) -> bytes:
+        lengths = array('I', map(len, self.texts))
+        data = ''.join(self.texts).encode('utf-8')
+        return COUNT.pack(len(lengths)) + lengths.tobytes() + COUNT.pack(len(data)) + data
+
+
+class _Reader:
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, layout: struct.Struct):
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def count(self) -> int:
+        return self.unpack(COUNT)[0]
+
+    def items(self, layout: struct.Struct, count: int = None) -> list:
+        if count is None:
+            count = self.count()
+        end = self.offset + count * layout.size
+        result = list(layout.iter_unpack(self.data[self.offset:end]))
+        self.offset = end
+        return result
+
+    def array(self, typecode: str, count: int) -> array:
+        result = array(typecode)
+        end = self.offset + count * result.itemsize
+        result.frombytes(self.data[self.offset:end])
+        self.offset = end
+        return result
+
+    def strings(self) -> list:
+        lengths = self.array('I', self.count())
+        size = self.count()
+        text = bytes(self.data[self.offset:self.offset + size]).decode('utf-8')
+        self.offset += size
+        bounds = list(accumulate(lengths, initial=0))
+        return [None] + [text[beg:end] for beg, end in zip(bounds, bounds[1:])]
+
+
+def _value(strings, value) -> tuple:
+    if value is None:
+        return VALUE_NONE, 0
+    if isinstance(value, str):
+        return VALUE_TEXT, strings(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return VALUE_INT, value
+    raise ValueError(f'value {value!r} ({type(value)}) cannot be stored in the snapshot')
+
+
+def _guid(guid: str) -> bytes:
+    return bytes.fromhex(guid)
+
+
+def write_snapshot(file_name: str, accounting_system, meta: dict = None):
+    '''
+    Write the state of the accounting system (acc_sys.AccountingSystem) to the file.
+    'meta' is a dictionary of texts stored with the snapshot.
+    '''
+    strings = _StringTable()
+    ledger = accounting_system.general_ledger
+    ledger.require_entries()
+    chunks = []
+
+    def section(layout, items):
+        chunks.append(COUNT.pack(len(items)))
+        chunks.extend(layout.pack(*item) for item in items)
+
+    chunks.append(LEDGER.pack(strings(ledger.tag), strings(ledger.name), SIDCounter._sid))
+
+    accounts = list(ledger.accounts)
+    currencies = list(dict.fromkeys([*accounting_system.currencies.values(),
+                                     *(account.currency for account in accounts)]))
+    currency_keys = {currency: key for key, currency in accounting_system.currencies.items()}
+    section(CURRENCY, [(strings(currency_keys.get(currency)), strings(currency.symbol),
+                        strings(currency.numeric_code), strings(currency.name),
+                        strings(currency.national_unit_symbol), strings(currency.national_subunit_symbol),
+                        strings(currency.fraction_char), strings(currency.group_separator_char),
+                        strings(','.join(map(str, currency.separator_positions or ()))),
+                        currency.ratio_of_subunits_to_unit,
+                        # only the two predicates of Currency are stored: the default one or 'always'
+                        bool(currency.separator_predicate(0)))
+                       for currency in currencies])
+
+    currency_index = {currency: index for index, currency in enumerate(currencies)}
+    account_index = {account: index for index, account in enumerate(accounts)}
+    section(ACCOUNT, [(strings(account.tag), strings(account.name), currency_index[account.currency],
+                       _guid(account.guid))
+                      for account in accounts])
+    section(KEY, [(strings(key), account_index[account]) for key, account in accounting_system.accounts.items()])
+
+    journals = list(dict.fromkeys([*ledger.journals, *accounting_system.journals.values()]))
+    chunks.append(COUNT.pack(len(journals)))
+    for journal in journals:
+        layout = journal.layout
+        chunks.append(JOURNAL.pack(strings(journal.tag), strings(journal.name), len(layout.names)))
+        for name, kind, account, side, default in zip(layout.names, layout.kinds, layout.accounts,
+                                                      layout.sides, layout.defaults):
+            if kind == FieldKind.Info:
+                default = _value(strings, default)
+            else:
+                default = VALUE_INT, default or 0
+            chunks.append(FIELD.pack(strings(name), kind, account_index[account] + 1 if account else 0,
+                                     side or 0, *default))
+    journal_index = {journal: index for index, journal in enumerate(journals)}
+    section(KEY, [(strings(key), journal_index[journal]) for key, journal in accounting_system.journals.items()])
+
+    charts = list(accounting_system.charts_of_accounts.items())
+    if not any(chart is accounting_system.coa for _, chart in charts):
+        charts.append((None, accounting_system.coa))
+    chunks.append(COUNT.pack(len(charts)))
+    for name, root in charts:
+        nodes = [root, *root.get_internals_gen()]
+        node_index = {id(node): index for index, node in enumerate(nodes)}
+        chunks.append(CHART.pack(strings(name), root is accounting_system.coa, len(nodes)))
+        for node in nodes:
+            marks = marks_str(node.marker)
+            chunks.append(NODE.pack(account_index[node.account] + 1 if node.account else 0,
+                                    node_index[id(node.parent)] + 1 if node.parent else 0,
+                                    strings(marks)))
+
+    entries, values, records = [], [], []
+    for journal in ledger.journals:
+        for je in journal.journal_entries:
+            if je.layout is not journal.layout:
+                raise ValueError(f'j/e {SID.print_form(je.sid)} has its own fields definition')
+            entries.append((je.sid, journal_index[journal], strings(je.date), strings(je.time),
+                            strings(je.description), strings(je.reference), je.post or 0, _guid(je.guid)))
+            for kind, value in zip(je.layout.kinds, je.values):
+                if kind == FieldKind.Info:
+                    values.append(_value(strings, value))
+                    continue
+                field_records = value if kind == FieldKind.Records else [value] if value else []
+                values.append((VALUE_INT, len(field_records)))
+                records.extend((account_index[record.account] + 1 if record.account else 0, record.side or 0,
+                                record.raw_amount, record.post or 0)
+                               for record in field_records)
+    section(ENTRY, entries)
+    section(VALUE, values)
+    section(RECORD, records)
+
+    posts = list(ledger.posts)
+    section(POST, [(post, len(ledger.entries_by_post.get(post, ()))) for post in posts])
+    chunks.append(array('q', (je.sid for post in posts for je in ledger.entries_by_post.get(post, ()))).tobytes())
+
+    section(PAIR, [(strings(key), strings(str(value))) for key, value in accounting_system.selected.items()])
+    section(PERIOD, [(strings(period.name), strings(period.date_beg), strings(period.date_end), period.closed,
+                      period.opening_sid or 0)
+                     for period in ledger.periods])
+
+    # meta data goes first, with its own string table
+    meta_strings = _StringTable()
+    meta_pairs = [(meta_strings(key), meta_strings(str(value))) for key, value in (meta or {}).items()]
+    meta_block = meta_strings.to_bytes() + COUNT.pack(len(meta_pairs)) + b''.join(PAIR.pack(*pair) for pair in meta_pairs)
+    with open(file_name, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION))
+        file.write(COUNT.pack(len(meta_block)))
+        file.write(meta_block)
+        file.write(strings.to_bytes())
+        file.write(b''.join(chunks))
+
+
+def _read_meta(reader: _Reader, file_name: str) -> dict:
+    magic, version = reader.unpack(HEADER)
+    if magic != MAGIC:
+        raise ValueError(f'{file_name} is not a snapshot file')
+    if version != VERSION:
+        raise ValueError(f'{file_name}: unsupported snapshot version {version}')
+    reader.count()  # size of the meta data
+    strings = reader.strings()
+    return {strings[key]: strings[value] for key, value in reader.items(PAIR)}
+
+
+def read_snapshot_meta(file_name: str) -> dict:
+    ''' The 'meta' dictionary of the snapshot (the state is not read) '''
+    with open(file_name, 'rb') as file:
+        head = file.read(HEADER.size + COUNT.size)
+        if len(head) < HEADER.size + COUNT.size:
+            raise ValueError(f'{file_name} is not a snapshot file')
+        size = COUNT.unpack_from(head, HEADER.size)[0]
+        return _read_meta(_Reader(head + file.read(size)), file_name)
+
+
+def marks_str(marker: Marker) -> str:
+    ''' Marks of the marker as 'Class.NAME' items separated by commas '''
+    return ','.join(sorted(f'{type(mark).__name__}.{mark.name}' for mark in marker.to_list()))
+
+
+def mark_from_str(name: str) -> Mark:
+    ''' Mark of the 'Class.NAME' text (see marks_str) '''
+    class_name, _, member = name.partition('.')
+    for mark_class in Mark.__subclasses__():
+        if mark_class.__name__ == class_name:
+            return mark_class[member]
+    raise ValueError(f'Not recognized mark {name}')
+
+
+class LoadedJournal(Journal):
+    ''' Journal with the fields definition read from a snapshot '''
+
+    def __init__(self, tag: str, name: str, ledger, definition: dict):
+        self._definition = definition
+        super().__init__(tag, name, ledger)
+
+    def initialize_fields(self, journal_entry):
+        return dict(self._definition)
+
+
+def read_snapshot(file_name: str, accounting_system) -> dict:
+    '''
+    Restore the state written by write_snapshot() into a new accounting system
+    (acc_sys.AccountingSystem) with a new ledger. Returns the 'meta' dictionary.
+    '''
+    with open(file_name, 'rb') as file:
+        data = file.read()
+    reader = _Reader(data)
+    meta = _read_meta(reader, file_name)
+    strings = reader.strings()
+
+    def value(kind, payload):
+        return strings[payload] if kind == VALUE_TEXT else payload if kind == VALUE_INT else None
+
+    ledger_tag, ledger_name, sid_counter = reader.unpack(LEDGER)
+    ledger = Ledger(strings[ledger_tag], strings[ledger_name])
+    accounting_system.general_ledger = ledger
+
+    currencies = []
+    accounting_system.currencies = {}
+    for (key, code, numeric_code, name, unit, subunit, fraction_char, group_separator,
+         positions, subunits, always) in reader.items(CURRENCY):
+        positions = tuple(int(position) for position in strings[positions].split(',') if position)
+        options = {} if not always else {'separator_predicate': None}
+        currency = Currency(strings[code], strings[numeric_code], subunits, strings[name],
+                            strings[unit], strings[subunit], fraction_char=strings[fraction_char],
+                            group_separator_char=strings[group_separator], separator_positions=positions,
+                            **options)
+        currencies.append(currency)
+        if key:
+            accounting_system.currencies[strings[key]] = currency
+
+    accounts = []
+    for tag, name, currency, guid in reader.items(ACCOUNT):
+        account = Account(strings[tag], ledger, currencies[currency], strings[name])
+        account.guid = guid.hex()
+        accounts.append(account)
+    accounting_system.accounts = {strings[key]: accounts[index] for key, index in reader.items(KEY)}
+
+    journals = []
+    for _ in range(reader.count()):
+        tag, name, field_count = reader.unpack(JOURNAL)
+        definition = {}
+        for field_name, kind, account, side, default_kind, default in reader.items(FIELD, field_count):
+            if kind == FieldKind.Record:
+                definition[strings[field_name]] = AccountRecord(accounts[account - 1] if account else None, default,
+                                                                AccountSide(side) if side else None, None, None)
+            elif kind == FieldKind.Records:
+                definition[strings[field_name]] = []
+            else:
+                definition[strings[field_name]] = value(default_kind, default)
+        journals.append(LoadedJournal(strings[tag], strings[name], ledger, definition))
+    accounting_system.journals = {strings[key]: journals[index] for key, index in reader.items(KEY)}
+
+    accounting_system.charts_of_accounts = {}
+    for _ in range(reader.count()):
+        name, main, node_count = reader.unpack(CHART)
+        nodes = []
+        for account, parent, marks in reader.items(NODE, node_count):
+            node = AccountTree(accounts[account - 1] if account else None, nodes[parent - 1] if parent else None)
+            if strings[marks]:
+                node.marker = Marker(*map(mark_from_str, strings[marks].split(',')))
+            nodes.append(node)
+        if name:
+            accounting_system.charts_of_accounts[strings[name]] = nodes[0]
+        if main:
+            accounting_system.coa = nodes[0]
+
+    entries = reader.items(ENTRY)
+    values = reader.items(VALUE)
+    records = reader.items(RECORD)
+    sides = (None, AccountSide.Dr, AccountSide.Cr)
+    accounts.insert(0, None)
+    batches = {journal: [] for journal in journals}
+    by_sid = {}
+    new_entry = JournalEntry.__new__
+    next_value = next_record = 0
+    for sid, journal, date, time, description, reference, post, guid in entries:
+        journal = journals[journal]
+        je = new_entry(JournalEntry)
+        je.sid = sid
+        je.date = strings[date]
+        je.time = strings[time]
+        je._description = strings[description]
+        je._reference = strings[reference]
+        je.post = post or None
+        je.guid = guid.hex()
+        je.journal = journal
+        je.layout = journal.layout
+        je.values = entry_values = []
+        debit = credit = 0
+        kinds = je.layout.kinds
+        for kind, (value_kind, payload) in zip(kinds, values[next_value:next_value + len(kinds)]):
+            if kind == FieldKind.Info:
+                entry_values.append(value(value_kind, payload))
+                continue
+            field_records = []
+            for account, side, raw_amount, record_post in records[next_record:next_record + payload]:
+                field_records.append(AccountRecord(accounts[account], raw_amount, sides[side], je,
+                                                   record_post or None))
+                # the totals as counted by JournalEntry._count()
+                if account and side == AccountSide.Dr:
+                    debit += raw_amount
+                elif account and side == AccountSide.Cr:
+                    credit += raw_amount
+            next_record += payload
+            if kind == FieldKind.Records:
+                entry_values.append(field_records)
+            else:
+                entry_values.append(field_records[0] if field_records else None)
+        next_value += len(kinds)
+        je._debit, je._credit = debit, credit
+        batches[journal].append(je)
+        by_sid[sid] = je
+    for journal, batch in batches.items():
+        journal._insert_entries(batch)
+
+    posts = reader.items(POST)
+    sources = iter(reader.array('q', sum(count for _, count in posts)))
+    ledger.posts.bulk_insert([post for post, _ in posts])
+    for post, count in posts:
+        ledger.entries_by_post[post] = [by_sid[next(sources)] for _ in range(count)]
+
+    accounting_system.selected = {strings[key]: strings[value] for key, value in reader.items(PAIR)}
+    # the closing balances are computed again from the entries
+    ledger.restore_periods([Period(strings[name], strings[date_beg], strings[date_end], bool(closed),
+                                   opening_sid or None)
+                            for name, date_beg, date_end, closed, opening_sid in reader.items(PERIOD)])
+    SID()   # the first SID() resets the counter
+    SIDCounter._sid = max(SIDCounter._sid, sid_counter)
+    return meta
@@ -15,17 +15,21 @@ class AccountTree():
         if account is not None and parent is not None:
             if parent.get_root_node().get_node(tag=account.tag, guid=account.guid) is not None:
                 raise ValueError('Error. Account {} already exist in parent tree. '.format(account))
-        # make this instance as parent's child
-        if parent is not None:
-            parent.append_child(self)
         self.account = account
         self.parent = parent
         self.children = None
+        self._sums = None # cached (debit, credit) sums of the subtree, None if not valid
+        if account is not None:
+            account.tree_nodes.add(self)
+        # make this instance as parent's child
+        if parent is not None:
+            parent.append_child(self)
 
     def append_child(self, child):
         if self.children is None:
             self.children = list()
         self.children.append(child)
+        self.invalidate_sums()
 
     def get_node(self, tag=None, name=None, guid=None):
         if self.account is not None:
@@ -232,7 +236,31 @@ class AccountTree():
         else:
             return self.parent.get_root_node()
 
+    def invalidate_sums(self):
+        ''' Drop cached sums of this node and all its ancestors '''
+        node = self
+        while node is not None and node._sums is not None:
+            node._sums = None
+            node = node.parent
+
+    def _get_sums(self):
+        ''' Debit and credit sums of the subtree (cached until invalidate_sums) '''
+        if self._sums is None:
+            debit, credit = 0, 0
+            if self.account:
+                debit += self.account.get_debit()
+                credit += self.account.get_credit()
+            if self.children:
+                for node in self.children:
+                    node_debit, node_credit = node._get_sums()
+                    debit += node_debit
+                    credit += node_credit
+            self._sums = (debit, credit)
+        return self._sums
+
     def get_debit_sum(self, post_predicate=None):
+        if not post_predicate:
+            return self._get_sums()[0]
         result = 0
         if self.account:
             result += self.account.get_debit(post_predicate)
@@ -244,6 +272,8 @@ class AccountTree():
         return result
 
     def get_credit_sum(self, post_predicate=None):
+        if not post_predicate:
+            return self._get_sums()[1]
         result = 0
         if self.account:
             result += self.account.get_credit(post_predicate)
@@ -255,6 +285,9 @@ class AccountTree():
         return result
 
     def get_balance_sum(self, post_predicate=None):
+        if not post_predicate:
+            debit, credit = self._get_sums()
+            return debit - credit
         result = 0
         if self.account:
             result += self.account.get_balance(post_predicate)
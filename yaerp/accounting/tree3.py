@@ -1,4 +1,3 @@
-from functools import reduce
 from itertools import chain
 import operator
 
@@ -19,12 +18,28 @@ class AccountTree():
             if parent.get_root_node().get_node(tag=account.tag, guid=account.guid) is not None:
                 raise ValueError('Error. Account {} already exist in parent tree. '.format(account))
         self.account = account        
-        # make this instance as parent's child
-        if parent is not None:
-            parent.append_child(self)
         self.parent = parent # AccountTree object or None (if "self" is root node)
         self.children = None # collection of AccountTree objects
         self.marker = Marker() # 
+        self._sums = None # cached (debit, credit) sums of the subtree, None if not valid
+        self._nodes_by_tag = {} # tag -> node of the whole tree (maintained in the root node)
+        self._nodes_by_guid = {} # guid -> node of the whole tree (maintained in the root node)
+        self._nodes_by_name = {} # name -> nodes of the whole tree (maintained in the root node)
+        self._version = 0 # structure version of the whole tree (counted in the root node)
+        self._flat = None # nodes of the whole tree in depth-first order (kept in the root node)
+        self._flat_root = None # root node that assigned the interval below
+        self._flat_version = -1 # structure version of the interval below
+        self._enter, self._exit = 0, 0 # subtree interval of this node in the flat order
+        self._marks_version = 0 # marks version of the whole tree (counted in the root node)
+        self._kinds = None # memoized classification of this node (see _get_kinds)
+        self._kinds_root, self._kinds_version = None, None
+        if account is not None:
+            account.tree_nodes.add(self)
+            if parent is None:
+                self._register_node(self)
+        # make this instance as parent's child
+        if parent is not None:
+            parent.append_child(self)
 
     def append_child(self, child: "AccountTree"):
 
@@ -36,6 +51,13 @@ class AccountTree():
         if self.children is None:
             self.children = SortedCollection([], key=sorting_key)
         self.children.insert(child)
+        root = self.get_root_node()
+        for node in child._walk():
+            root._register_node(node)
+        child._nodes_by_tag, child._nodes_by_guid, child._nodes_by_name = {}, {}, {}
+        root._version += 1
+        child._version += 1
+        self.invalidate_sums()
 
     def remove_child(self, child: "AccountTree"):
 
@@ -46,33 +68,139 @@ class AccountTree():
         
         if self.children:
             self.children.remove(child)
-        if len(self.children) == 0:
+        if self.children is not None and len(self.children) == 0:
             self.children = None
+        root = self.get_root_node()
+        for node in child._walk():
+            root._unregister_node(node)
+        root._version += 1
+        self.invalidate_sums()
 
     def refresh_child_tag(self, old_tag: str):
+        ''' Update the tag lookup (in every tree holding the account) after the account of the child was renamed '''
         self.children.refresh_key(old_tag)
+        root = self.get_root_node()
+        root._version += 1
+        node = root._nodes_by_tag.get(old_tag)
+        if node is None or node.account.tag == old_tag:
+            return
+        for account_node in list(node.account.tree_nodes):
+            if account_node.parent is not None and account_node.parent is not self:
+                account_node.parent.children.refresh_key(old_tag)
+            account_root = account_node.get_root_node()
+            if account_root._nodes_by_tag.get(old_tag) is account_node:
+                if account_root is not root:
+                    account_root._version += 1
+                del account_root._nodes_by_tag[old_tag]
+                account_root._nodes_by_tag[account_node.account.tag] = account_node
+
+    def refresh_node_name(self, old_name: str):
+        ''' Update the name lookup (in every tree holding the account) after the account of this node was renamed '''
+        for account_node in list(self.account.tree_nodes):
+            root = account_node.get_root_node()
+            if old_name in root._nodes_by_name and account_node in root._nodes_by_name[old_name]:
+                root._unregister_name(account_node, old_name)
+                if account_node.account.name is not None:
+                    root._nodes_by_name.setdefault(account_node.account.name, []).append(account_node)
+
+    def _register_node(self, node: "AccountTree"):
+        if node.account is None:
+            return
+        self._nodes_by_tag[node.account.tag] = node
+        self._nodes_by_guid[node.account.guid] = node
+        if node.account.name is not None:
+            self._nodes_by_name.setdefault(node.account.name, []).append(node)
+
+    def _unregister_node(self, node: "AccountTree"):
+        if node.account is None:
+            return
+        if self._nodes_by_tag.get(node.account.tag) is node:
+            del self._nodes_by_tag[node.account.tag]
+        if self._nodes_by_guid.get(node.account.guid) is node:
+            del self._nodes_by_guid[node.account.guid]
+        self._unregister_name(node, node.account.name)
+
+    def _unregister_name(self, node: "AccountTree", name: str):
+        nodes = self._nodes_by_name.get(name, [])
+        if node in nodes:
+            nodes.remove(node)
+            if not nodes:
+                del self._nodes_by_name[name]
+
+    def flatten(self) -> list:
+        '''
+        Nodes of the whole tree in depth-first order.
+        Each node gets (enter, exit) interval: its subtree is flatten()[enter:exit].
+        The order is rebuilt only after the structure of the tree has changed.
+        '''
+        root = self.get_root_node()
+        if root._flat is None or root._flat_version != root._version:
+            order = []
+            stack = [(root, False)]
+            while stack:
+                node, leaving = stack.pop()
+                if leaving:
+                    node._exit = len(order)
+                    continue
+                node._enter = len(order)
+                node._flat_root, node._flat_version = root, root._version
+                order.append(node)
+                stack.append((node, True))
+                if node.children:
+                    stack.extend((child, False) for child in reversed(node.children))
+            root._flat = order
+        return root._flat
+
+    def _walk(self):
+        ''' This node and its subtree in depth-first order (without the flat order) '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children:
+                stack.extend(reversed(node.children))
+
+    def _has_interval(self):
+        root = self._flat_root
+        return root is not None and self._flat_version == root._version and root._flat is not None
+
+    def is_descendant_of(self, node: "AccountTree"):
+        ''' Check if this node is the node or lies in its subtree '''
+        if self._has_interval() and node._has_interval() and self._flat_root is node._flat_root:
+            return node._enter <= self._enter < node._exit
+        element = self
+        while element is not None:
+            if element is node:
+                return True
+            element = element.parent
+        return False
 
     def add_marks(self, *marks):
         for mark in marks:
             self.marker.add(mark)
-        for child in self.children:
-            child.add_marks(marks)
+        for child in self.children or []:
+            child.add_marks(*marks)
+        self.get_root_node()._marks_version += 1
 
     def remove_marks(self, *marks):
         for mark in marks:
             self.marker.remove(mark)
-        for child in self.children:
-            child.remove_marks(marks)
+        for child in self.children or []:
+            child.remove_marks(*marks)
+        self.get_root_node()._marks_version += 1
 
     def get_node(self, tag=None, name=None, guid=None) -> 'AccountTree':
-        if self.account is not None:
-            if self.account.tag == tag or self.account.name == name or self.account.guid == guid:
-                return self
-        if self.children is not None:
-            for child in self.children:
-                result = child.get_node(tag, name, guid)
-                if result is not None:
-                    return result
+        root = self.get_root_node()
+        candidates = []
+        if tag is not None:
+            candidates.append(root._nodes_by_tag.get(tag))
+        if guid is not None:
+            candidates.append(root._nodes_by_guid.get(guid))
+        if name is not None:
+            candidates.extend(root._nodes_by_name.get(name, []))
+        for node in candidates:
+            if node is not None and node.is_descendant_of(self):
+                return node
         return None
 
     def get_account(self, tag=None, name=None, guid=None):
@@ -178,10 +306,8 @@ class AccountTree():
             self.get_internals_gen())
 
     def get_internals_gen(self):
-        if self.children is not None:
-            for child in self.children:
-                yield child
-                yield from child.get_internals_gen()
+        flat = self.flatten()
+        yield from flat[self._enter + 1:self._exit]
 
     def has_nodes(self):
         return self.children is not None and len(self.children) > 0
@@ -202,50 +328,58 @@ class AccountTree():
         return posts
 
     def has_analytical_leaf(self):
-        return self.account.analytical and not self.has_analytical_node()
+        return self._get_kinds()['has_analytical_leaf']
 
     def has_ledger_leaf(self):
-        return not self.account.analytical and not self.has_ledger_node()
+        return self._get_kinds()['has_ledger_leaf']
 
     def has_analytical_node(self):
-        if not self.account.analytical:
-            return False
-        if self.children is None or len(self.children) == 0:
-            return False
-        return reduce(lambda t, s: bool(t or s.has_analytical_leaf()), self.children, False)
+        return self._get_kinds()['has_analytical_node']
 
     def has_ledger_node(self):
-        if self.children is None or len(self.children) == 0:
-            return False
-        return reduce(lambda t, s: bool(t or s.has_ledger_leaf()), self.children, False)
+        return self._get_kinds()['has_ledger_node']
 
     def is_group_of_ledger_accounts_node(self):
-        # has any ledger accounts or group accounts as children
-        if self.is_analytical_account_node():
-            return False
-        if not self.children:
-            return False
-        return reduce(
-            lambda prev, curr: prev and (curr.is_ledger_account_node() or curr.is_group_of_ledger_accounts_node()),
-            self.children)
+        return self._get_kinds()['is_group_of_ledger_accounts_node']
 
     def is_group_of_analytical_accounts_node(self):
-        # has any analytical accounts or group accounts as children
-        if not self.children:
-            return False
-        return reduce(
-            lambda prev, curr: prev and (curr.is_analytical_account_node() or curr.is_group_of_analytical_accounts_node()),
-            self.children)
+        return self._get_kinds()['is_group_of_analytical_accounts_node']
 
     def is_ledger_account_node(self):
+        return self._get_kinds()['is_ledger_account_node']
+
+    def _get_kinds(self) -> dict:
+        ''' Node classification, computed for the whole tree once per structure and marks version '''
+        root = self._kinds_root
+        if root is None or self._kinds_version != (root._version, root._marks_version):
+            root = self.get_root_node()
+            version = (root._version, root._marks_version)
+            for node in reversed(self.flatten()):   # children are classified before their parents
+                node._kinds = node._classify()
+                node._kinds_root, node._kinds_version = root, version
+        return self._kinds
+
+    def _classify(self) -> dict:
+        children = [child._kinds for child in self.children] if self.children else []
+        analytical = bool(getattr(self.account, 'analytical', False))
+        analytical_account = self.is_analytical_account_node()
+        kinds = {}
+        # has analytical/ledger accounts without children of the same kind
+        kinds['has_analytical_node'] = analytical and any(child['has_analytical_leaf'] for child in children)
+        kinds['has_ledger_node'] = any(child['has_ledger_leaf'] for child in children)
+        kinds['has_analytical_leaf'] = analytical and not kinds['has_analytical_node']
+        kinds['has_ledger_leaf'] = not analytical and not kinds['has_ledger_node']
+        # has any analytical accounts or group accounts as children
+        kinds['is_group_of_analytical_accounts_node'] = bool(children) and all(
+            child['is_analytical_account_node'] or child['is_group_of_analytical_accounts_node'] for child in children)
+        # has any ledger accounts or group accounts as children
+        kinds['is_group_of_ledger_accounts_node'] = not analytical_account and bool(children) and all(
+            child['is_ledger_account_node'] or child['is_group_of_ledger_accounts_node'] for child in children)
         # all children (if they are exist) are analytical accounts
-        if self.is_analytical_account_node():
-            return False
-        if not self.children:
-            return True
-        return reduce(
-            lambda prev, curr: prev and (curr.is_analytical_account_node() or curr.is_group_of_analytical_accounts_node()),
-            self.children)
+        kinds['is_ledger_account_node'] = not analytical_account and all(
+            child['is_analytical_account_node'] or child['is_group_of_analytical_accounts_node'] for child in children)
+        kinds['is_analytical_account_node'] = analytical_account
+        return kinds
 
     def is_analytical_account_node(self):
         if self.account is None:
@@ -269,7 +403,31 @@ class AccountTree():
         else:
             return self.parent.get_root_node()
 
+    def invalidate_sums(self):
+        ''' Drop cached sums of this node and all its ancestors '''
+        node = self
+        while node is not None and node._sums is not None:
+            node._sums = None
+            node = node.parent
+
+    def _get_sums(self):
+        ''' Debit and credit sums of the subtree (cached until invalidate_sums) '''
+        if self._sums is None:
+            debit, credit = 0, 0
+            if self.account:
+                debit += self.account.get_debit()
+                credit += self.account.get_credit()
+            if self.children:
+                for node in self.children:
+                    node_debit, node_credit = node._get_sums()
+                    debit += node_debit
+                    credit += node_credit
+            self._sums = (debit, credit)
+        return self._sums
+
     def get_debit_sum(self, post_predicate=None):
+        if not post_predicate:
+            return self._get_sums()[0]
         result = 0
         if self.account:
             result += self.account.get_debit(post_predicate)
@@ -281,6 +439,8 @@ class AccountTree():
         return result
 
     def get_credit_sum(self, post_predicate=None):
+        if not post_predicate:
+            return self._get_sums()[1]
         result = 0
         if self.account:
             result += self.account.get_credit(post_predicate)
@@ -292,6 +452,9 @@ class AccountTree():
         return result
 
     def get_balance_sum(self, post_predicate=None):
+        if not post_predicate:
+            debit, credit = self._get_sums()
+            return debit - credit
         result = 0
         if self.account:
             result += self.account.get_balance(post_predicate)
@@ -0,0 +1,6 @@
+from datetime import date
+
+
+def date_ordinal(date_str: str) -> int:
+    ''' Day number of the date string ('RRRR-MM-DD', optionally followed by time) '''
+    return date.fromisoformat(date_str[:10]).toordinal()
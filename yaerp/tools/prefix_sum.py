@@ -0,0 +1,180 @@
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+
+class FenwickTree:
+    '''Binary indexed tree: point update and prefix sum in O(log n).'''
+
+    def __init__(self, values=()):
+        self._tree = [0]
+        self._tree.extend(values)
+        size = len(self._tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def add(self, i, delta):
+        'Add delta to the i-th value (0-based).'
+        i += 1
+        size = len(self._tree)
+        while i < size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i):
+        'Sum of the first i values.'
+        result = 0
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+    def search(self, value):
+        '''Locate a position within non-negative values (e.g. lengths).
+
+        Return (i, offset): the i-th value covers the given position,
+        i.e. prefix(i) <= value < prefix(i + 1) and offset = value - prefix(i).
+        '''
+        i = 0
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            j = i + step
+            if j < len(self._tree) and self._tree[j] <= value:
+                i = j
+                value -= self._tree[j]
+            step >>= 1
+        return i, value
+
+
+class PrefixSums:
+    '''Sorted (key, value) pairs with O(log n) sums of values below a key.
+
+    Pairs are kept in chunks of sorted keys, the chunk totals are kept in
+    a FenwickTree. Adding or removing a pair in any position (not only at
+    the end) updates one chunk and one path of the tree, so out-of-order
+    keys cost the same as appended ones.
+
+    >>> sums = PrefixSums()
+    >>> for key, value in [(3, 30), (1, 10), (2, 20), (2, 5)]:
+    ...     sums.add(key, value)
+    >>> sums.sum_lt(2), sums.sum_le(2), sums.total()
+    (10, 35, 65)
+    >>> sums.remove(2, 20)
+    >>> sums.sum_between(2, 3)
+    35
+    '''
+
+    load = 64
+
+    def __init__(self, pairs=()):
+        self._load(sorted(pairs, key=itemgetter(0)))
+
+    def _load(self, sorted_pairs):
+        keys = [key for key, _ in sorted_pairs]
+        values = [value for _, value in sorted_pairs]
+        load = self.load
+        self._keys = [keys[i:i+load] for i in range(0, len(keys), load)]        # chunks of sorted keys
+        self._values = [values[i:i+load] for i in range(0, len(values), load)]  # chunks of values (parallel to _keys)
+        self._maxes = [chunk[-1] for chunk in self._keys]                       # the last key of each chunk
+        self._len = len(keys)
+        self._rebuild_sums()
+
+    def _rebuild_sums(self):
+        self._sums = FenwickTree(sum(values) for values in self._values)
+
+    def __len__(self):
+        return self._len
+
+    def add(self, key, value):
+        'Add a new pair.  If equal keys are found, add to the right'
+        if not self._keys:
+            self._keys.append([key])
+            self._values.append([value])
+            self._maxes.append(key)
+            self._len = 1
+            self._rebuild_sums()
+            return
+        i = bisect_right(self._maxes, key)
+        if i == len(self._maxes):
+            i -= 1
+        keys = self._keys[i]
+        pos = bisect_right(keys, key)
+        keys.insert(pos, key)
+        self._values[i].insert(pos, value)
+        self._maxes[i] = keys[-1]
+        self._len += 1
+        if len(keys) > 2 * self.load:
+            half = len(keys) // 2
+            values = self._values[i]
+            self._keys[i:i+1] = [keys[:half], keys[half:]]
+            self._values[i:i+1] = [values[:half], values[half:]]
+            self._maxes[i:i+1] = [keys[half-1], keys[-1]]
+            self._rebuild_sums()
+        else:
+            self._sums.add(i, value)
+
+    def update(self, pairs):
+        'Add many pairs.  A large batch is merged with a single rebuild'
+        pairs = list(pairs)
+        if len(pairs) * 8 < self._len:
+            for key, value in pairs:
+                self.add(key, value)
+            return
+        current = [(key, value) for keys, values in zip(self._keys, self._values)
+                   for key, value in zip(keys, values)]
+        # stable sort keeps the current pairs before the new ones with equal keys
+        self._load(sorted(current + pairs, key=itemgetter(0)))
+
+    def remove(self, key, value):
+        'Remove a pair.  Raise ValueError if not found'
+        i = bisect_left(self._maxes, key)
+        while i < len(self._maxes):
+            keys = self._keys[i]
+            values = self._values[i]
+            pos = bisect_left(keys, key)
+            while pos < len(keys) and keys[pos] == key:
+                if values[pos] == value:
+                    del keys[pos]
+                    del values[pos]
+                    self._len -= 1
+                    if keys:
+                        self._maxes[i] = keys[-1]
+                        self._sums.add(i, -value)
+                    else:
+                        del self._keys[i]
+                        del self._values[i]
+                        del self._maxes[i]
+                        self._rebuild_sums()
+                    return
+                pos += 1
+            if pos < len(keys):
+                break
+            i += 1
+        raise ValueError('No pair found: %r, %r' % (key, value))
+
+    def sum_lt(self, key):
+        'Sum of values with a key < key'
+        i = bisect_left(self._maxes, key)
+        if i == len(self._maxes):
+            return self.total()
+        pos = bisect_left(self._keys[i], key)
+        return self._sums.prefix(i) + sum(self._values[i][:pos])
+
+    def sum_le(self, key):
+        'Sum of values with a key <= key'
+        i = bisect_right(self._maxes, key)
+        if i == len(self._maxes):
+            return self.total()
+        pos = bisect_right(self._keys[i], key)
+        return self._sums.prefix(i) + sum(self._values[i][:pos])
+
+    def sum_between(self, key_beg, key_end):
+        'Sum of values with key_beg <= key <= key_end'
+        return self.sum_le(key_end) - self.sum_lt(key_beg)
+
+    def total(self):
+        return self._sums.prefix(len(self._sums))
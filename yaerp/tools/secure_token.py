@@ -14,7 +14,10 @@ class _SecureToken:
         self._token = ''
 
     def update(self, data: str | list | dict | tuple) -> str:
-        self._input_string = container2str(data)
+        return self._feed(container2str(data))
+
+    def _feed(self, input_string: str) -> str:
+        self._input_string = input_string
         self._number += 1
         self._alg.update(self._token.encode())
         self._alg.update(self._input_string.encode())
@@ -30,6 +33,16 @@ class _SecureToken:
     def plain(self) -> str:
         return self._input_string
 
+    def replay(self, script_lines) -> str:
+        ''' Feed the sealed commands of the script lines again (lines without token are skipped), verifying their tokens '''
+        for line in script_lines:
+            command, sep, token = line.rstrip('\n').rpartition(' --token ')
+            if not sep:
+                continue
+            if self._feed(command) != token:
+                raise ValueError(f'token mismatch; stored in file:{token}, calculated from data in file:{self.token()}')
+        return self.token()
+
 
 class secure_token(_SecureToken, metaclass=Singleton):
     def __init__(self, salt: str='', digest_size: int = 12, open_number: bool=False):
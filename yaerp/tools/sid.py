@@ -9,6 +9,12 @@ class SIDCounter:
     def new(self) -> int:
         SIDCounter._sid += 1
         return SIDCounter._sid
+
+    def reserve(self, count: int) -> range:
+        ''' Reserve a block of 'count' sequential identifiers '''
+        first = SIDCounter._sid + 1
+        SIDCounter._sid += count
+        return range(first, first + count)
     
     def print_form(sid: int) -> str:
         return f'{sid:04}'
@@ -1,4 +1,44 @@
 from bisect import bisect_left, bisect_right
+from itertools import chain, islice
+from operator import itemgetter
+
+from yaerp.tools.prefix_sum import FenwickTree
+
+
+class _KeyMax:
+    '''Sentinel comparing greater than any other value.
+
+    Closes a range of tuple keys on a partial key, i.e. every key starting
+    with 'date' (and any time and sid) is below (date, KEY_MAX).
+    '''
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __lt__(self, other):
+        return False
+
+    def __le__(self, other):
+        return self is other
+
+    def __gt__(self, other):
+        return self is not other
+
+    def __ge__(self, other):
+        return True
+
+    def __hash__(self):
+        return id(self)
+
+    def __repr__(self):
+        return 'KEY_MAX'
+
+KEY_MAX = _KeyMax()
+
+class _Keys(list):
+    'Keys of an item stored more than once (see SortedCollection._ids)'
 
 class SortedCollection(object):
     '''Sequence sorted by a key function.
@@ -14,15 +54,25 @@ class SortedCollection(object):
     greater-than-or-equal to a key.
 
     Once found, an item's ordinal position can be located with the index() method.
-    New items can be added with the insert() and insert_right() methods.
+    Items are also indexed by identity: membership of an item stored in the
+    collection is O(1) and an item whose key expired is still found by the key
+    it was inserted with.  Other items are compared by == among items of equal
+    key, without copying them.
+    New items can be added with the insert() and insert_right() methods,
+    batches of items with the extend_sorted(), bulk_insert() and merge() methods.
     Old items can be deleted with the remove() method.
 
+    Ranges of items are generated lazily by the irange() (by keys) and
+    islice() (by positions) methods.
+
     The usual sequence methods are provided to support indexing, slicing,
     length lookup, clearing, copying, forward and reverse iteration, contains
     checking, item counts, item removal, and a nice looking repr.
 
-    Finding and indexing are O(log n) operations while iteration and insertion
-    are O(n).  The initial sort is O(n log n).
+    Items are stored in sorted chunks of about 'load' items (a list of lists)
+    with a FenwickTree over the chunk lengths for positional access.  Finding,
+    indexing, insertion and removal are O(log n) operations (plus a memmove
+    within one chunk) while iteration is O(n).  The initial sort is O(n log n).
 
     The key function is stored in the 'key' attibute for easy introspection or
     so that you can assign a new key function (triggering an automatic re-sort).
@@ -69,13 +119,36 @@ class SortedCollection(object):
 
     '''
 
+    load = 512     # desired chunk size, chunks are split at twice the load
+
     def __init__(self, iterable=(), key=None):
         self._given_key = key
         key = (lambda x: x) if key is None else key
         decorated = sorted((key(item), item) for item in iterable)
-        self._keys = [k for k, item in decorated]
-        self._items = [item for k, item in decorated]
         self._key = key
+        self._build([k for k, item in decorated], [item for k, item in decorated])
+
+    def _build(self, keys, items):
+        load = self.load
+        self._key_chunks = [keys[i:i+load] for i in range(0, len(keys), load)]
+        self._item_chunks = [items[i:i+load] for i in range(0, len(items), load)]
+        self._maxes = [chunk[-1] for chunk in self._key_chunks]
+        self._len = len(items)
+        self._ids = {}
+        for k, item in zip(keys, items):
+            self._add_id(k, item)
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._index = FenwickTree(len(chunk) for chunk in self._key_chunks)
+
+    @property
+    def _keys(self):
+        return list(chain.from_iterable(self._key_chunks))
+
+    @property
+    def _items(self):
+        return list(chain.from_iterable(self._item_chunks))
 
     def _getkey(self):
         return self._key
@@ -89,6 +162,122 @@ class SortedCollection(object):
 
     key = property(_getkey, _setkey, _delkey, 'key function')
 
+    def _bisect_left(self, k):
+        'Return (chunk, position) of the first key >= k'
+        c = bisect_left(self._maxes, k)
+        if c == len(self._maxes):
+            return c, 0
+        return c, bisect_left(self._key_chunks[c], k)
+
+    def _bisect_right(self, k):
+        'Return (chunk, position) of the first key > k'
+        c = bisect_right(self._maxes, k)
+        if c == len(self._maxes):
+            return c, 0
+        return c, bisect_right(self._key_chunks[c], k)
+
+    def _position(self, c, p):
+        if c == len(self._maxes):
+            return self._len
+        return self._index.prefix(c) + p
+
+    def _locate(self, i):
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('SortedCollection index out of range')
+        return self._index.search(i)
+
+    def _item_before(self, c, p):
+        if p:
+            return self._item_chunks[c][p-1]
+        if c:
+            return self._item_chunks[c-1][-1]
+        return None
+
+    def _equal_key_gen(self, k):
+        'Generate (chunk, position) of the items with a key == k'
+        c, p = self._bisect_left(k)
+        while c < len(self._key_chunks):
+            keys = self._key_chunks[c]
+            while p < len(keys):
+                if keys[p] != k:
+                    return
+                yield c, p
+                p += 1
+            c += 1
+            p = 0
+
+    def _add_id(self, k, item):
+        i = id(item)
+        if i not in self._ids:
+            self._ids[i] = k
+        elif isinstance(self._ids[i], _Keys):
+            self._ids[i].append(k)
+        else:
+            self._ids[i] = _Keys([self._ids[i], k])
+
+    def _discard_id(self, k, item):
+        i = id(item)
+        keys = self._ids[i]
+        if not isinstance(keys, _Keys):
+            del self._ids[i]
+            return
+        keys.remove(k)
+        if len(keys) == 1:
+            self._ids[i] = keys[0]
+
+    def _find_item(self, item):
+        for c, p in self._equal_key_gen(self._key(item)):
+            found = self._item_chunks[c][p]
+            if found is item or found == item:
+                return c, p
+        # the item itself is still found by the key it was inserted with (the key expired)
+        keys = self._ids.get(id(item), _Keys())
+        for k in (keys if isinstance(keys, _Keys) else [keys]):
+            for c, p in self._equal_key_gen(k):
+                if self._item_chunks[c][p] is item:
+                    return c, p
+        raise ValueError('%r is not in the collection' % (item,))
+
+    def _insert_at(self, c, p, k, item):
+        if not self._key_chunks:
+            self._build([k], [item])
+            return
+        if c == len(self._key_chunks):
+            c -= 1
+            p = len(self._key_chunks[c])
+        keys = self._key_chunks[c]
+        items = self._item_chunks[c]
+        keys.insert(p, k)
+        items.insert(p, item)
+        self._maxes[c] = keys[-1]
+        self._len += 1
+        self._add_id(k, item)
+        if len(keys) > 2 * self.load:
+            half = len(keys) // 2
+            self._key_chunks[c:c+1] = [keys[:half], keys[half:]]
+            self._item_chunks[c:c+1] = [items[:half], items[half:]]
+            self._maxes[c:c+1] = [keys[half-1], keys[-1]]
+            self._rebuild_index()
+        else:
+            self._index.add(c, 1)
+
+    def _delete_at(self, c, p):
+        keys = self._key_chunks[c]
+        self._discard_id(keys[p], self._item_chunks[c][p])
+        del keys[p]
+        del self._item_chunks[c][p]
+        self._len -= 1
+        if keys:
+            self._maxes[c] = keys[-1]
+            self._index.add(c, -1)
+        else:
+            del self._key_chunks[c]
+            del self._item_chunks[c]
+            del self._maxes[c]
+            self._rebuild_index()
+
     def clear(self):
         self.__init__([], self._key)
 
@@ -96,16 +285,21 @@ class SortedCollection(object):
         return self.__class__(self, self._key)
 
     def __len__(self):
-        return len(self._items)
+        return self._len
 
     def __getitem__(self, i):
-        return self._items[i]
+        if isinstance(i, slice):
+            if i.step is None:
+                return list(self.islice(i.start, i.stop))
+            return self._items[i]
+        c, p = self._locate(i)
+        return self._item_chunks[c][p]
 
     def __iter__(self):
-        return iter(self._items)
+        return chain.from_iterable(self._item_chunks)
 
     def __reversed__(self):
-        return reversed(self._items)
+        return chain.from_iterable(map(reversed, reversed(self._item_chunks)))
 
     def __repr__(self):
         return '%s(%r, key=%s)' % (
@@ -118,86 +312,185 @@ class SortedCollection(object):
         return self.__class__, (self._items, self._given_key)
 
     def __contains__(self, item):
-        k = self._key(item)
-        i = bisect_left(self._keys, k)
-        j = bisect_right(self._keys, k)
-        return item in self._items[i:j]
+        if id(item) in self._ids:
+            return True
+        try:
+            self._find_item(item)
+        except ValueError:
+            return False
+        return True
 
     def index(self, item):
         'Find the position of an item.  Raise ValueError if not found.'
-        k = self._key(item)
-        i = bisect_left(self._keys, k)
-        j = bisect_right(self._keys, k)
-        return self._items[i:j].index(item) + i
+        return self._position(*self._find_item(item))
 
     def count(self, item):
         'Return number of occurrences of item'
-        k = self._key(item)
-        i = bisect_left(self._keys, k)
-        j = bisect_right(self._keys, k)
-        return self._items[i:j].count(item)
+        result = 0
+        for c, p in self._equal_key_gen(self._key(item)):
+            found = self._item_chunks[c][p]
+            if found is item or found == item:
+                result += 1
+        return result
 
     def insert(self, item):
         'Insert a new item.  If equal keys are found, add to the left'
         k = self._key(item)
-        i = bisect_left(self._keys, k)
-        self._keys.insert(i, k)
-        self._items.insert(i, item)
+        self._insert_at(*self._bisect_left(k), k, item)
 
     def insert_right(self, item):
         'Insert a new item.  If equal keys are found, add to the right'
         k = self._key(item)
-        i = bisect_right(self._keys, k)
-        self._keys.insert(i, k)
-        self._items.insert(i, item)
+        self._insert_at(*self._bisect_right(k), k, item)
+
+    def _merge_sorted(self, keys, items):
+        'Merge sorted keys and items.  If equal keys are found, add to the right'
+        if not keys:
+            return
+        if len(keys) * self.load < self._len:
+            # a small batch: bisecting every item is cheaper than a merge
+            for k, item in zip(keys, items):
+                self._insert_at(*self._bisect_right(k), k, item)
+            return
+        # chunks holding keys <= the first new key stay untouched
+        c = bisect_right(self._maxes, keys[0])
+        merged_keys = list(chain.from_iterable(self._key_chunks[c:]))
+        merged_items = list(chain.from_iterable(self._item_chunks[c:]))
+        if merged_keys:
+            # two sorted runs: the stable sort merges them in linear time, old items first
+            merged_keys.extend(keys)
+            merged_items.extend(items)
+            order = sorted(range(len(merged_keys)), key=merged_keys.__getitem__)
+            merged_keys = [merged_keys[i] for i in order]
+            merged_items = [merged_items[i] for i in order]
+        else:
+            merged_keys, merged_items = keys, items
+        load = self.load
+        self._key_chunks[c:] = [merged_keys[i:i+load] for i in range(0, len(merged_keys), load)]
+        self._item_chunks[c:] = [merged_items[i:i+load] for i in range(0, len(merged_items), load)]
+        self._maxes[c:] = [chunk[-1] for chunk in self._key_chunks[c:]]
+        self._len += len(keys)
+        ids = self._ids
+        for k, item in zip(keys, items):
+            if id(item) in ids:
+                self._add_id(k, item)
+            else:
+                ids[id(item)] = k
+        self._rebuild_index()
+
+    def extend_sorted(self, iterable):
+        'Add items given in key order in O(n + m).  Raise ValueError if not ordered'
+        items = list(iterable)
+        keys = [self._key(item) for item in items]
+        for i in range(1, len(keys)):
+            if keys[i] < keys[i-1]:
+                raise ValueError('Items are not sorted by key at: %r' % (keys[i],))
+        self._merge_sorted(keys, items)
+
+    def bulk_insert(self, iterable):
+        'Add a batch of items, sorted once and merged.  If equal keys are found, add to the right'
+        items = list(iterable)
+        pairs = sorted(zip(map(self._key, items), items), key=itemgetter(0))
+        self._merge_sorted([k for k, _ in pairs], [item for _, item in pairs])
+
+    def merge(self, other):
+        'Add all items of an other SortedCollection'
+        if other._given_key is self._given_key:
+            self._merge_sorted(other._keys, other._items)
+        else:
+            self.bulk_insert(other)
 
     def remove(self, item):
         'Remove first occurence of item.  Raise ValueError if not found'
-        i = self.index(item)
-        del self._keys[i]
-        del self._items[i]
+        self._delete_at(*self._find_item(item))
 
     def refresh_key(self, expired_key):
-        i = bisect_left(self._keys, expired_key)
-        if i != len(self) and self._keys[i] == expired_key:
-            item = self._items[i]
-            del self._keys[i]
-            del self._items[i]
+        c, p = self._bisect_left(expired_key)
+        if c != len(self._key_chunks) and self._key_chunks[c][p] == expired_key:
+            item = self._item_chunks[c][p]
+            self._delete_at(c, p)
             self.insert(item)
 
+    def _iter_between(self, beg, end, reverse):
+        'Generate items from position beg (inclusive) to end (exclusive)'
+        (c_beg, p_beg), (c_end, p_end) = beg, end
+        if (c_beg, p_beg) >= (c_end, p_end):
+            return
+        chunks = range(c_beg, min(c_end + 1, len(self._item_chunks)))
+        if reverse:
+            chunks = reversed(chunks)
+        for c in chunks:
+            items = self._item_chunks[c]
+            lo = p_beg if c == c_beg else 0
+            hi = p_end if c == c_end else len(items)
+            if not reverse:
+                yield from islice(items, lo, hi)
+            else:
+                for p in range(hi - 1, lo - 1, -1):
+                    yield items[p]
+
+    def irange(self, min_key=None, max_key=None, inclusive=(True, True), reverse=False):
+        """Generate items with a key between min_key and max_key, lazily.
+
+        None means no bound, inclusive tells if min_key/max_key are included.
+        Only the bounds are bisected, the items are not copied.
+        """
+        if min_key is None:
+            beg = 0, 0
+        elif inclusive[0]:
+            beg = self._bisect_left(min_key)
+        else:
+            beg = self._bisect_right(min_key)
+        if max_key is None:
+            end = len(self._item_chunks), 0
+        elif inclusive[1]:
+            end = self._bisect_right(max_key)
+        else:
+            end = self._bisect_left(max_key)
+        return self._iter_between(beg, end, reverse)
+
+    def islice(self, start=None, stop=None, reverse=False):
+        'Generate items of positions start..stop-1 (as in slicing), lazily'
+        start, stop, _ = slice(start, stop).indices(self._len)
+        if start >= stop:
+            return iter(())
+        beg = self._index.search(start)
+        end = self._index.search(stop) if stop < self._len else (len(self._item_chunks), 0)
+        return self._iter_between(beg, end, reverse)
+
     def find(self, k):
         'Return first item with a key == k.  Raise ValueError if not found.'
-        i = bisect_left(self._keys, k)
-        if i != len(self) and self._keys[i] == k:
-            return self._items[i]
+        c, p = self._bisect_left(k)
+        if c != len(self._key_chunks) and self._key_chunks[c][p] == k:
+            return self._item_chunks[c][p]
         raise ValueError('No item found with key equal to: %r' % (k,))
 
     def find_le(self, k):
         'Return last item with a key <= k.  Raise ValueError if not found.'
-        i = bisect_right(self._keys, k)
-        if i:
-            return self._items[i-1]
+        c, p = self._bisect_right(k)
+        if c or p:
+            return self._item_before(c, p)
         raise ValueError('No item found with key at or below: %r' % (k,))
 
     def find_lt(self, k):
         'Return last item with a key < k.  Raise ValueError if not found.'
-        i = bisect_left(self._keys, k)
-        if i:
-            return self._items[i-1]
+        c, p = self._bisect_left(k)
+        if c or p:
+            return self._item_before(c, p)
         raise ValueError('No item found with key below: %r' % (k,))
 
     def find_ge(self, k):
         'Return first item with a key >= equal to k.  Raise ValueError if not found'
-        i = bisect_left(self._keys, k)
-        if i != len(self):
-            return self._items[i]
+        c, p = self._bisect_left(k)
+        if c != len(self._key_chunks):
+            return self._item_chunks[c][p]
         raise ValueError('No item found with key at or above: %r' % (k,))
 
     def find_gt(self, k):
         'Return first item with a key > k.  Raise ValueError if not found'
-        i = bisect_right(self._keys, k)
-        if i != len(self):
-            return self._items[i]
+        c, p = self._bisect_right(k)
+        if c != len(self._key_chunks):
+            return self._item_chunks[c][p]
         raise ValueError('No item found with key above: %r' % (k,))
 
 # ---------------------------  Simple demo and tests  -------------------------
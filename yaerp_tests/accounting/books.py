@@ -0,0 +1,32 @@
+import unittest
+
+from yaerp.accounting.account3 import Account
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.model.currency import Currency
+
+
+class LedgerTestCase(unittest.TestCase):
+    '''
+    General Ledger in one currency with the journals and accounts of
+    JOURNALS and ACCOUNTS ({tag: name}) for the ledger3 tests
+    '''
+    JOURNALS = {'GJ': 'General Journal'}
+    ACCOUNTS = {}
+
+    def setUp(self) -> None:
+        self.currency = Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr')
+        self.ledger = Ledger('GL', 'General Ledger')
+        self.journals = {tag: Journal(tag, name, self.ledger) for tag, name in self.JOURNALS.items()}
+        self.journal = self.journals['GJ']
+        self.accounts = {tag: Account(tag, self.ledger, self.currency, name) for tag, name in self.ACCOUNTS.items()}
+
+    def new_entry(self, date, raw_amount, dr_account, cr_account, journal=None):
+        ''' Unposted entry moving raw_amount from cr_account to dr_account '''
+        je = JournalEntry(journal or self.journal)
+        je.date = date
+        je.description = 'test'
+        je.debit('Account', raw_amount, dr_account)
+        je.credit('Account', raw_amount, cr_account)
+        je.put_into_journal()
+        return je
@@ -0,0 +1,70 @@
+import unittest
+
+from yaerp.accounting.tree3 import AccountTree
+
+from .books import LedgerTestCase
+
+try:
+    from yaerp.accounting.columnar import PostingColumns
+except ImportError:
+    PostingColumns = None
+
+
+@unittest.skipUnless(PostingColumns, 'numpy is not installed')
+class TestPostingColumns(LedgerTestCase):
+    JOURNALS = {'GJ': 'General Journal', 'SJ': 'Sales Journal'}
+    ACCOUNTS = {'110': 'Cash', '130': 'Bank', '300': 'Capital', '400': 'Sales', '999': 'Unused'}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.general, self.sales_journal = self.journals.values()
+        self.cash, self.bank, self.capital, self.sales, self.unused = self.accounts.values()
+        entries = [(self.general, '2023-01-01', 10_000_000_000_007, self.cash, self.capital),
+                   (self.sales_journal, '2023-01-15 12:00:00', 250, self.bank, self.sales),
+                   (self.sales_journal, '2023-02-01', -40, self.bank, self.sales),
+                   (self.general, '2023-02-28', 99, self.bank, self.cash),
+                   (self.general, '2023-03-01', 5, self.capital, self.cash)]
+        for number, (journal, date, amount, dr_account, cr_account) in enumerate(entries):
+            je = self.new_entry(date, amount, dr_account, cr_account, journal)
+            if number != 4:
+                je.post_this()
+
+    def expected(self, account, date_beg=None, date_end=None, journals=None):
+        def predicate(record):
+            return (record.post
+                    and (not date_beg or record.journal_entry.date[:10] >= date_beg)
+                    and (not date_end or record.journal_entry.date[:10] <= date_end)
+                    and (journals is None or record.journal_entry.journal in journals))
+        debit, credit = account.get_debit(predicate), account.get_credit(predicate)
+        return debit, credit, debit - credit
+
+    def test_trial_balance_matches_records(self):
+        store = PostingColumns.from_ledger(self.ledger)
+        self.assertEqual(len(store), 8)
+        for date_beg, date_end, journals in [(None, None, None), ('2023-01-15', '2023-02-28', None),
+                                             ('2023-02-01', None, [self.sales_journal]), (None, None, [])]:
+            balance = store.trial_balance(date_beg, date_end, journals)
+            for account in self.ledger.accounts:
+                self.assertEqual(balance[account], self.expected(account, date_beg, date_end, journals))
+        self.assertEqual(store.trial_balance()[self.cash], (10_000_000_000_007, 99, 10_000_000_000_007 - 99))
+
+    def test_appended_entries_and_tree_rollup(self):
+        store = PostingColumns.from_ledger(self.ledger)
+        je = next(self.general.entries_gen(posted=False))
+        je.post_this()
+        store.add_journal_entry(je)
+        self.assertEqual(store.trial_balance()[self.capital], self.expected(self.capital))
+        root = AccountTree(None, None)
+        group = AccountTree(self.unused, root)
+        AccountTree(self.cash, group)
+        AccountTree(self.bank, group)
+        AccountTree(self.sales, root)
+        totals = store.tree_totals(root)
+        posted = lambda record: bool(record.post)
+        for node in root.flatten():
+            self.assertEqual(totals[node], (node.get_debit_sum(posted), node.get_credit_sum(posted), node.get_balance_sum(posted)))
+        self.assertEqual(totals[group][0], self.cash.get_debit() + self.bank.get_debit())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import unittest
+
+from acc_sys import AccountingSystem
+from yaerp.accounting.account3 import AccountRecord, AccountSide
+from yaerp.accounting.database import BooksDatabase
+from yaerp.accounting.journal3 import JournalEntry
+
+from . import snapshot_test
+
+
+class TestBooksDatabase(snapshot_test.TestSnapshot):
+    ''' The books of TestSnapshot stored in the database '''
+    test_write_read = None
+    test_periods_write_read = None
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, 'books.db')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def totals(self, accsys):
+        return {account.tag: (account.posted_totals[AccountSide.Dr] + account.unposted_totals[AccountSide.Dr],
+                              account.posted_totals[AccountSide.Cr] + account.unposted_totals[AccountSide.Cr])
+                for account in accsys.general_ledger.accounts if account.has_entries()}
+
+    def test_save_load(self):
+        with BooksDatabase(self.file_name) as db:
+            db.save(self.accsys)
+            self.assertEqual(db.balances(), self.totals(self.accsys))
+        with BooksDatabase(self.file_name) as db:
+            restored = AccountingSystem()
+            db.load(restored)
+            self.assertEqual(self.state(restored), self.state(self.accsys))
+            self.assertIs(restored.general_ledger.database, db)
+
+    def test_changes_are_written(self):
+        ledger = self.accsys.general_ledger
+        with BooksDatabase(self.file_name) as db:
+            db.save(self.accsys)
+            sales = self.accsys.journals['SJ']
+            sales.post_these(list(sales.gen_new())[:2])
+            je = JournalEntry(self.accsys.journals['GJ'])
+            je.date = '2023-04-01'
+            je.debit('Account', 20, self.accsys.accounts['400'])
+            je.credit('Account', 20, self.accsys.accounts['130'])
+            je.post_this()
+            draft = self.accsys.new_journal_entry('SJ')
+            draft.date = '2023-04-02'
+            draft.add_record('Cash', 3)
+            draft.add_record('Sale', 3)
+            draft.put_into_journal()
+            next(sales.gen_new()).del_from_journal()
+            # edits of an entry in the journal are written too
+            draft.description = 'changed'
+            draft.add_record('Cash', 999)
+            draft.add_info('Info', 'edited')
+            self.assertEqual(db.balances(), self.totals(self.accsys))
+            self.assertEqual(db.balances('2023-02-01', '2023-03-31', unposted=False),
+                             {'110': (307, 0), '400': (0, 307)})
+        with BooksDatabase(self.file_name) as db:
+            restored = AccountingSystem()
+            db.load(restored)
+            self.assertEqual(self.state(restored), self.state(self.accsys))
+            reloaded = restored.general_ledger.get_journal_entry(sid=draft.sid)
+            self.assertEqual((reloaded.description, reloaded.get_debit(), reloaded.fields['Info']),
+                             ('changed', 999, 'edited'))
+            self.assertGreaterEqual(restored.new_journal_entry('GJ').sid, max(ledger.posts) + 1)
+
+    def test_entries_on_demand(self):
+        BooksDatabase(self.file_name).save(self.accsys)
+        posted = [je.sid for je in self.accsys.general_ledger.journal_entries_gen(unposted=False)]
+        with BooksDatabase(self.file_name) as db:
+            restored = AccountingSystem()
+            db.load(restored, date_beg='2023-02-01')
+            ledger = restored.general_ledger
+            self.assertEqual(ledger.loaded_from, '2023-02-01')
+            in_memory = [je.sid for journal in ledger.journals for je in journal.journal_entries if je.post]
+            self.assertEqual(len(in_memory), 2)
+            # the older entries count as opening totals
+            self.assertEqual(self.totals(restored), self.totals(self.accsys))
+            cash = restored.accounts['110']
+            self.assertEqual(cash.opening_totals, {AccountSide.Dr: 100, AccountSide.Cr: 7})
+            self.assertEqual(cash.balance_at('2023-03-31', unposted=False), 296)
+            self.assertEqual(db.get_journal_entry(sid=posted[0]).date, '2023-01-05')
+            self.assertIsNone(ledger.get_journal_entry(sid=posted[0]))
+            self.assertEqual([je.sid for je in db.entries_gen(unposted=False)], posted)
+            self.assertEqual(ledger.loaded_from, '2023-02-01')
+            # a query before the loaded entries loads their period
+            self.assertEqual(cash.turnover_between('2023-01-10', '2023-01-31', unposted=False), (100, 0))
+            self.assertEqual(ledger.loaded_from, '2023-01-01')
+            self.assertEqual(cash.opening_totals, {AccountSide.Dr: 0, AccountSide.Cr: 0})
+            self.assertEqual(self.state(restored), self.state(self.accsys))
+
+    def test_load_by_periods(self):
+        je = JournalEntry(self.accsys.journals['GJ'])
+        je.date = '2022-12-31'
+        je.debit('Account', 50, self.accsys.accounts['110'])
+        je.credit('Account', 50, self.accsys.accounts['400'])
+        je.post_this()
+        BooksDatabase(self.file_name).save(self.accsys)
+        with BooksDatabase(self.file_name) as db:
+            restored = AccountingSystem()
+            db.load(restored, date_beg='2023-03-01')
+            ledger = restored.general_ledger
+            journal = restored.journals['SJ']
+            self.assertEqual([je.date for je in journal.entries_gen(date_beg='2023-02-01', unposted=False)],
+                             ['2023-02-11', '2023-03-12'])
+            self.assertEqual(ledger.loaded_from, '2023-01-01')
+            self.assertEqual(restored.accounts['400'].opening_totals[AccountSide.Cr], 50)
+            self.assertEqual(len(list(ledger.journal_entries_gen(unposted=False))), 5)
+            self.assertIsNone(ledger.loaded_from)
+            self.assertEqual(self.totals(restored), self.totals(self.accsys))
+
+    def test_periods(self):
+        with BooksDatabase(self.file_name) as db:
+            db.save(self.accsys)
+            closed = self.close_2023(self.accsys)
+        with BooksDatabase(self.file_name) as db:
+            restored = AccountingSystem()
+            db.load(restored, date_beg='2024-01-01')
+            self.assert_closed_2023(restored, closed)
+            # the closed period is not loaded
+            self.assertEqual(restored.general_ledger.loaded_from, '2024-01-01')
+
+    def test_empty_closed_period(self):
+        ledger = self.accsys.general_ledger
+        ledger.create_period('2022')
+        ledger.close_period('2022', self.accsys.journals['GJ'])
+        BooksDatabase(self.file_name).save(self.accsys)
+        with BooksDatabase(self.file_name) as db:
+            restored = AccountingSystem()
+            db.load(restored, date_beg='2023-03-01')
+            period = restored.general_ledger.get_period('2022')
+            self.assertTrue(period.closed)
+            self.assertEqual(period.closing_balances, {})
+            self.assertEqual(restored.general_ledger.loaded_from, '2023-03-01')
+            self.assertEqual(self.totals(restored), self.totals(self.accsys))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
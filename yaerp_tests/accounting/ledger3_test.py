@@ -0,0 +1,320 @@
+import copy
+import unittest
+
+from yaerp.accounting.account3 import AccountRecord, AccountSide
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import period_dates
+from yaerp.accounting.tree3 import AccountTree
+
+from .books import LedgerTestCase
+
+
+class TestLedger3(LedgerTestCase):
+    ACCOUNTS = {'110': 'Cash', '400': 'Sales', '300': 'Capital'}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.cash, self.sales, self.capital = self.accounts.values()
+
+    def scanned_records(self, account, posted=True, unposted=True, side=None):
+        result = []
+        for je in self.ledger.journal_entries_gen(posted, unposted):
+            result.extend(je.account_records_gen(side, account))
+        return result
+
+    def test_account_index_follows_journal(self):
+        je1 = self.new_entry('2023-02-01', 100, self.cash, self.sales)
+        je2 = self.new_entry('2023-01-01', 50, self.cash, self.capital)
+        self.assertEqual(list(self.cash.records_gen()), self.scanned_records(self.cash))
+        self.assertEqual([r.journal_entry for r in self.cash.records_gen()], [je2, je1])
+        je1.post_this()
+        self.assertEqual(list(self.cash.records_gen(unposted=False)), self.scanned_records(self.cash, unposted=False))
+        self.assertEqual(len(self.cash.posted_records), 1)
+        self.assertTrue(all(r.post for r in self.cash.posted_records))
+        je2.del_from_journal()
+        self.assertEqual(list(self.capital.records_gen()), [])
+        self.assertFalse(self.capital.has_entries())
+        self.assertEqual(self.cash.get_debit(), 100)
+        self.assertEqual(self.sales.get_credit(), 100)
+
+    def test_index_after_post_these_and_record_update(self):
+        je1 = self.new_entry('2023-03-01', 10, self.cash, self.sales)
+        je1.credit('Account', 5, self.capital)
+        je1.debit('Account', 5, self.cash)
+        self.assertEqual(self.cash.get_debit(), 15)
+        self.assertEqual(self.capital.get_credit(), 5)
+        self.journal.post_these([je1])
+        for account in (self.cash, self.sales, self.capital):
+            for side in (None, AccountSide.Dr, AccountSide.Cr):
+                self.assertEqual(list(account.records_gen(side=side)), self.scanned_records(account, side=side))
+        with self.assertRaises(ValueError):
+            self.ledger.unregister_account(self.capital)
+
+    def test_post_these_new_entries(self):
+        entries = []
+        for day in [9, 3, 5, 3]:
+            je = JournalEntry(self.journal)
+            je.date = f'2023-04-{day:02}'
+            je.description = 'batch'
+            je.debit('Account', day, self.cash)
+            je.credit('Account', day, self.sales)
+            entries.append(je)
+        self.new_entry('2023-04-04', 1, self.capital, self.cash)
+        self.journal.post_these(entries)
+        self.assertEqual([je.date for je in self.journal.journal_entries],
+                         ['2023-04-03', '2023-04-03', '2023-04-04', '2023-04-05', '2023-04-09'])
+        self.assertEqual(list(self.cash.records_gen()), self.scanned_records(self.cash))
+        self.assertEqual(self.cash.posted_totals[AccountSide.Dr], 20)
+        self.assertEqual(self.cash.get_balance(), 19)
+
+    def test_date_range_queries(self):
+        dates = ['2023-01-31', '2023-02-01', '2023-02-15 12:00:00', '2023-02-28', '2023-03-01', '2023-02-15']
+        for number, date in enumerate(dates, 1):
+            je = self.new_entry(date, number, self.cash, self.sales)
+            if number % 2:
+                je.post_this()
+        for date_beg, date_end in [('2023-02-01', '2023-02-28'), ('2023-02-15', '2023-02-15'), (None, '2023-02-01'), ('2023-02-02', None)]:
+            expected = [je for je in self.journal.journal_entries
+                        if (not date_beg or je.date >= date_beg) and (not date_end or je.date <= date_end)]
+            self.assertEqual(list(self.journal.entries_gen(date_beg=date_beg, date_end=date_end)), expected)
+            self.assertEqual(list(self.journal.entries_gen(date_beg=date_beg, date_end=date_end, reverse=True)), expected[::-1])
+            self.assertEqual(list(self.journal.entries_gen(unposted=False, date_beg=date_beg, date_end=date_end)),
+                             [je for je in expected if je.post])
+            records = self.ledger.account_records_gen(date_beg=date_beg, date_end=date_end, account=self.cash)
+            self.assertEqual([r.journal_entry for r in records], expected)
+
+    def test_lookup_by_sid_and_guid(self):
+        je1 = self.new_entry('2023-06-02', 10, self.cash, self.sales)
+        je2 = self.new_entry('2023-06-01', 20, self.cash, self.sales)
+        self.assertIs(self.journal.get_by_sid(je1.sid), je1)
+        self.assertIs(self.journal.get_by_sid(str(je2.sid)), je2)
+        self.assertIs(self.journal.get_by_guid(je1.guid), je1)
+        self.assertIs(self.journal.get_by_guid(int(je2.guid, 16)), je2)
+        self.assertIs(self.ledger.get_journal_entry(guid=je2.guid.upper()), je2)
+        self.assertEqual(list(self.journal.gen_by_sid(entry_sids=[je1.sid, je2.sid])), [je2, je1])
+        je1.del_from_journal()
+        self.assertIsNone(self.journal.get_by_sid(je1.sid, not_rise_exception=True))
+        self.assertIsNone(self.ledger.get_journal_entry(sid=je1.sid))
+        with self.assertRaises(ValueError):
+            self.journal.get_by_guid(je1.guid)
+        je3 = JournalEntry(self.journal)
+        je3.date = '2023-06-03'
+        je3.debit('Account', 5, self.cash)
+        je3.credit('Account', 5, self.sales)
+        self.journal.post_these([je3])
+        self.assertIs(self.ledger.get_journal_entry(sid=str(je3.sid)), je3)
+
+    def test_entries_for_post(self):
+        je1 = self.new_entry('2023-07-01', 10, self.cash, self.sales)
+        je2 = self.new_entry('2023-07-02', 20, self.cash, self.sales)
+        je3 = self.new_entry('2023-07-03', 30, self.cash, self.sales)
+        je1.post_this()
+        self.journal.post_these([je3, je2])
+        self.assertEqual(self.ledger.entries_for_post(je1.post), [je1])
+        self.assertEqual(je2.post, je3.post)
+        self.assertEqual(self.ledger.entries_for_post(str(je2.post)), [je3, je2])
+        self.assertEqual(list(self.journal.gen_by_post(je2.post)), [je3, je2])
+        with self.assertRaises(ValueError):
+            self.ledger.entries_for_post(je2.post + 1000)
+
+    def test_running_totals(self):
+        je1 = self.new_entry('2023-01-05', 300, self.cash, self.sales)
+        je2 = self.new_entry('2023-01-06', 120, self.capital, self.cash)
+        self.assertEqual(self.cash.unposted_totals[AccountSide.Dr], 300)
+        self.assertEqual(self.cash.posted_totals[AccountSide.Dr], 0)
+        je1.post_this()
+        self.assertEqual(self.cash.posted_totals[AccountSide.Dr], 300)
+        self.assertEqual(self.cash.unposted_totals[AccountSide.Dr], 0)
+        self.assertEqual(self.cash.get_balance(), 180)
+        je2.del_from_journal()
+        self.assertEqual(self.cash.get_balance(), 300)
+        storno = self.new_entry('2023-01-07', -300, self.cash, self.sales)
+        storno.post_this()
+        for account in (self.cash, self.sales, self.capital):
+            self.assertEqual(account.get_debit(), sum(r.raw_amount for r in self.scanned_records(account, side=AccountSide.Dr)))
+            self.assertEqual(account.get_credit(), sum(r.raw_amount for r in self.scanned_records(account, side=AccountSide.Cr)))
+        self.assertEqual(self.cash.get_balance(), 0)
+        self.assertEqual(self.cash.get_debit(lambda r: r.raw_amount > 0), 300)
+
+    def test_balance_at_with_backdated_entries(self):
+        dates = ['2023-05-01', '2023-01-15', '2023-03-31 10:00:00', '2023-03-31', '2022-12-31']
+        for number, date in enumerate(dates, 1):
+            self.new_entry(date, number * 100, self.cash, self.sales).post_this()
+        self.new_entry('2023-02-01', 7, self.capital, self.cash)
+        for date in ['2022-01-01', '2023-01-15', '2023-03-31', '2023-03-31 23:59:59', '2024-01-01']:
+            self.assertEqual(self.cash.balance_at(date),
+                             self.cash.get_balance(lambda r: r.journal_entry.date <= date))
+        self.assertEqual(self.cash.balance_at('2023-02-01', unposted=False), 700)
+        self.assertEqual(self.cash.turnover_between('2023-01-15', '2023-03-31'), (600, 7))
+        self.assertEqual(self.sales.turnover_between(None, None, posted=True, unposted=False), (0, 1500))
+
+    def test_compact_records(self):
+        je1 = self.new_entry(''.join(['2023-', '08-01']), 10, self.cash, self.sales)
+        je2 = self.new_entry(''.join(['2023-08', '-01']), 20, self.cash, self.sales)
+        self.assertIs(je1.date, je2.date)
+        je1.post_this()
+        for obj in (self.cash, je1, *je1.account_records_gen()):
+            self.assertFalse(hasattr(obj, '__dict__'))
+        with self.assertRaises(AttributeError):
+            je1.undefined_attribute = 1
+
+    def test_posting_keeps_records(self):
+        je1 = self.new_entry('2023-09-01', 10, self.cash, self.sales)
+        je2 = JournalEntry(self.journal)
+        je2.date = '2023-09-02'
+        je2.debit('Account', 20, self.cash)
+        je2.credit('Account', 20, self.capital)
+        records = [*je1.account_records_gen(), *je2.account_records_gen()]
+        self.journal.post_these([je1, je2])
+        self.assertEqual([id(r) for r in records],
+                         [id(r) for je in (je1, je2) for r in je.account_records_gen()])
+        self.assertTrue(all(r.post == je1.post for r in records))
+        self.assertEqual([r for r in self.cash.posted_records], records[0::2])
+        # records compare by identity
+        twin = AccountRecord(self.cash, 10, AccountSide.Dr, je1, je1.post)
+        self.assertNotEqual(twin, records[0])
+        # only the post of a record changes
+        with self.assertRaises(AttributeError):
+            records[0].raw_amount = 0
+        self.assertEqual(records[0].raw_amount, 10)
+
+    def test_post_batch(self):
+        draft = self.new_entry('2023-10-05', 10, self.cash, self.sales)
+        entries = [draft]
+        for day, amount in [(3, 20), (1, 30)]:
+            je = JournalEntry(self.journal)
+            je.date = f'2023-10-{day:02}'
+            je.debit('Account', amount, self.cash)
+            je.credit('Account', amount, self.capital)
+            entries.append(je)
+        unbalanced = JournalEntry(self.journal)
+        unbalanced.date = '2023-10-02'
+        unbalanced.debit('Account', 5, self.cash)
+        with self.assertRaises(RuntimeError):
+            self.ledger.post_batch(entries + [unbalanced])
+        self.assertFalse(any(je.post for je in entries))
+        self.assertEqual(len(self.journal.journal_entries), 1)
+        self.assertEqual(self.cash.posted_totals[AccountSide.Dr], 0)
+        post_ids = self.ledger.post_batch(entries + [draft])
+        self.assertEqual(post_ids, [je.post for je in entries])
+        self.assertEqual(len(set(post_ids)), 3)
+        self.assertEqual([je.date for je in self.journal.journal_entries], ['2023-10-01', '2023-10-03', '2023-10-05'])
+        self.assertEqual(self.ledger.entries_for_post(post_ids[1]), [entries[1]])
+        self.assertEqual(list(self.cash.records_gen(unposted=False)), self.scanned_records(self.cash, unposted=False))
+        self.assertEqual(self.cash.posted_totals[AccountSide.Dr], 60)
+        self.assertEqual(self.cash.unposted_totals[AccountSide.Dr], 0)
+        self.assertEqual(self.cash.turnover_between('2023-10-02', None, unposted=False), (30, 0))
+        with self.assertRaises(ValueError):
+            self.ledger.post_batch([draft])
+
+    def test_cached_entry_totals(self):
+        je = JournalEntry(self.journal)
+        self.assertTrue(je.is_zeroed())
+        je.debit('Account', 70, self.cash)
+        je.credit('Account', 50, self.sales)
+        self.assertEqual((je.get_debit(), je.get_credit()), (70, 50))
+        self.assertFalse(je.is_balanced())
+        je.credit('Account', 20, self.capital)
+        self.assertTrue(je.is_balanced())
+        je_copy = copy.copy(je)
+        self.assertEqual((je_copy.get_debit(), je_copy.get_credit()), (70, 70))
+        je.add_info('Account', [])
+        self.assertTrue(je.is_zeroed())
+        je.fields['Account'].append(AccountRecord(self.cash, 5, AccountSide.Dr, je, None))
+        JournalEntry.check_totals = True
+        try:
+            with self.assertRaises(RuntimeError):
+                je.get_debit()
+            je.refresh_totals()
+            self.assertEqual(je.get_debit(), 5)
+        finally:
+            JournalEntry.check_totals = False
+
+    def test_journal_layout(self):
+        cash, sales = self.cash, self.sales
+
+        class SaleJournal(Journal):
+            def initialize_fields(self, journal_entry):
+                return {
+                    'Info': None,
+                    'Cash': AccountRecord(cash, 0, AccountSide.Dr, journal_entry, None),
+                    'Sale': AccountRecord(sales, 0, AccountSide.Cr, journal_entry, None),
+                    'Other': [],
+                }
+
+        journal = SaleJournal('SJ', 'Sale Journal', self.ledger)
+        je1, je2 = JournalEntry(journal), JournalEntry(journal)
+        self.assertIs(je1.layout, je2.layout)
+        self.assertEqual(list(je1.fields), ['Info', 'Cash', 'Sale', 'Other'])
+        self.assertEqual(je1.values, [None, None, None, []])
+        self.assertIsNot(je1.values[3], je2.values[3])
+        self.assertEqual((je1.fields['Cash'].account, je1.fields['Cash'].raw_amount), (cash, 0))
+        je1.date = '2023-11-01'
+        je1.add_info('Info', 'note')
+        je1.add_record('Cash', 100)
+        je1.add_record('Sale', 100)
+        self.assertEqual([(r.account, r.side) for r in je1.account_records_gen()],
+                         [(cash, AccountSide.Dr), (sales, AccountSide.Cr)])
+        je1.put_into_journal()
+        je1.post_this()
+        self.assertEqual(self.cash.posted_totals[AccountSide.Dr], 100)
+        je3 = copy.copy(je1)
+        self.assertEqual(je3.fields['Info'], 'note')
+        self.assertIs(je3.fields['Cash'].journal_entry, je3)
+        with self.assertRaises(RuntimeError):
+            je2.add_record('Unknown', 1, account=cash, side=AccountSide.Dr)
+        with self.assertRaises(RuntimeError):
+            je2.fields['Unknown'] = 1
+
+    def test_close_period(self):
+        root = AccountTree(None, None)
+        AccountTree(self.cash, root)
+        self.new_entry('2022-03-01', 1000, self.cash, self.capital).post_this()
+        self.new_entry('2022-06-01', 300, self.cash, self.sales).post_this()
+        self.new_entry('2022-06-02 10:00:00', 50, self.sales, self.cash).post_this()
+        draft = self.new_entry('2022-07-01', 5, self.cash, self.sales)
+        self.ledger.create_period('2022')
+        self.assertRaises(ValueError, self.ledger.close_period, '2022', self.journal)   # unposted entry
+        draft.del_from_journal()
+        period = self.ledger.close_period('2022', self.journal)
+        self.assertTrue(period.closed)
+        self.assertEqual(period.closing_balances, {self.cash: 1250, self.capital: -1000, self.sales: -250})
+        self.assertEqual(period.node_balances, {root.children[0]: 1250, root: 1250})
+        opening = self.ledger.get_journal_entry(sid=period.opening_sid)
+        self.assertEqual((opening.date, opening.get_debit()), ('2023-01-01', 1250))
+        self.assertEqual(self.ledger.period_of('2023-05-01').name, '2023')
+        # the balances start from the opening entry
+        self.assertEqual((self.cash.get_debit(), self.cash.get_credit()), (1250, 0))
+        self.assertEqual(root.get_balance_sum(), 1250)
+        self.new_entry('2023-02-01', 100, self.cash, self.sales).post_this()
+        self.assertEqual(self.cash.balance_at('2023-01-31'), 1250)
+        self.assertEqual(self.cash.balance_at('2023-02-01'), 1350)
+        self.assertEqual(root.get_balance_sum(), 1350)
+        # the closed period keeps its own history
+        self.assertEqual(self.cash.balance_at('2022-06-01'), 1300)
+        self.assertEqual(self.cash.turnover_between('2022-01-01', '2022-12-31'), (1300, 50))
+        # its entries are frozen
+        self.assertRaises(ValueError, self.new_entry, '2022-12-31', 1, self.cash, self.sales)
+        late = JournalEntry(self.journal)
+        late.date = '2022-12-31'
+        late.debit('Account', 1, self.cash)
+        late.credit('Account', 1, self.sales)
+        self.assertRaises(ValueError, late.post_this)
+        self.assertRaises(ValueError, self.ledger.post_batch, [late])
+        self.assertRaises(ValueError, self.ledger.create_period, '2022-12')
+        self.assertRaises(ValueError, self.ledger.delete_period, '2022')
+        self.assertRaises(ValueError, self.ledger.close_period, '2022', self.journal)
+        self.ledger.close_period('2023', self.journal)
+        self.assertEqual(self.cash.get_balance(), 1350)
+        self.assertEqual(self.ledger.opening_dates, ['2023-01-01', '2024-01-01'])
+        self.ledger.delete_period('2024')
+        self.assertIsNone(self.ledger.period_of('2024-05-01'))
+
+    def test_period_dates(self):
+        self.assertEqual(period_dates('2024'), ('2024-01-01', '2024-12-31'))
+        self.assertEqual(period_dates('2024-02'), ('2024-02-01', '2024-02-29'))
+        self.assertRaises(ValueError, period_dates, '2024-13')
+
+
+if __name__ == '__main__':
+    unittest.main()
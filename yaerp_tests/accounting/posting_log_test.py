@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from yaerp.accounting.account3 import AccountSide
+from yaerp.accounting.posting_log import PostingLog
+from yaerp.tools.day import date_ordinal
+
+from .books import LedgerTestCase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestPostingLog(LedgerTestCase):
+    ACCOUNTS = {tag: f'Account {tag}' for tag in ['110', '130', '400']}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, 'books.log')
+        self.ledger.posting_log = PostingLog(self.file_name)
+
+    def tearDown(self) -> None:
+        self.ledger.posting_log.close()
+        self.directory.cleanup()
+
+    def new_entry(self, date, raw_amount, dr, cr):
+        accounts = list(self.accounts.values())
+        return super().new_entry(date, raw_amount, accounts[dr], accounts[cr])
+
+    def test_postings_are_logged(self):
+        log = self.ledger.posting_log
+        first = self.new_entry('2023-01-02', 100, 0, 2)
+        first.post_this()
+        draft = self.new_entry('2023-01-03', 5, 1, 0)
+        batch = [self.new_entry(f'2023-02-0{day}', 10 * day, day % 3, (day + 1) % 3) for day in range(1, 4)]
+        self.ledger.post_batch(batch)
+        self.assertEqual(len(log), 8)
+        self.assertEqual(list(log.records_gen())[:2],
+                         [(first.sid, 100, first.post, 0, 0, date_ordinal('2023-01-02'), AccountSide.Dr),
+                          (first.sid, 100, first.post, 0, 1, date_ordinal('2023-01-02'), AccountSide.Cr)])
+        self.assertEqual(log.accounts, ['110', '400', '130'])
+        view = log.view()
+        self.assertEqual(len(view), 8 * 40)
+        draft.post_this()
+        log.close()
+        with PostingLog(self.file_name) as reopened:
+            self.assertEqual(len(reopened), 10)
+            self.assertEqual(reopened.accounts, ['110', '400', '130'])
+            self.assertEqual(reopened.journals, ['GJ'])
+            self.assertEqual([record[0] for record in reopened.records_gen()][-2:], [draft.sid, draft.sid])
+        self.ledger.posting_log = PostingLog(self.file_name)
+
+    @unittest.skipUnless(numpy, 'numpy is not installed')
+    def test_totals(self):
+        for day in range(1, 9):
+            self.new_entry(f'2023-03-0{day}', day, day % 3, (day + 2) % 3).post_this()
+        self.new_entry('2023-03-09', 1000, 0, 1)
+        log = self.ledger.posting_log
+        self.assertEqual(len(log.columns()), 16)
+        expected = {account.tag: (account.posted_totals[AccountSide.Dr], account.posted_totals[AccountSide.Cr])
+                    for account in self.accounts.values()}
+        self.assertEqual(log.totals(), expected)
+        totals = log.totals('2023-03-02', '2023-03-03')
+        self.assertEqual(totals, {'110': (3, 0), '130': (0, 2), '400': (2, 3)})
+
+    @unittest.skipUnless(numpy, 'numpy is not installed')
+    def test_renamed_account(self):
+        cash = self.accounts['110']
+        self.new_entry('2023-03-01', 100, 0, 2).post_this()
+        self.ledger.update_account_tag('111', '110', cash)
+        self.new_entry('2023-03-02', 100, 0, 2).post_this()
+        log = self.ledger.posting_log
+        self.assertEqual(log.totals(), {'111': (200, 0), '400': (0, 200)})
+        self.assertEqual(cash.get_debit(), 200)
+        log.close()
+        with PostingLog(self.file_name) as reopened:
+            self.assertEqual(reopened.accounts, ['111', '400'])
+            self.assertEqual(reopened.totals(), {'111': (200, 0), '400': (0, 200)})
+        self.ledger.posting_log = PostingLog(self.file_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from yaerp.accounting.account3 import Account
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+
+from ..books import LedgerTestCase
+
+try:
+    from yaerp.accounting.columnar import PostingColumns
+    from yaerp.accounting.reports.parallel import ReportExecutor
+except ImportError:
+    ReportExecutor = None
+
+
+@unittest.skipUnless(ReportExecutor, 'numpy is not installed')
+class TestReportExecutor(LedgerTestCase):
+    JOURNALS = {'GJ': 'General Journal', 'SJ': 'Sales Journal', 'PJ': 'Purchase Journal'}
+    ACCOUNTS = {f'{tag}': f'Account {tag}' for tag in range(100, 112)}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.general, self.sales_journal, self.purchase_journal = self.journals.values()
+        accounts = list(self.accounts.values())
+        drafts = []
+        for number in range(60):
+            journal = self.sales_journal if number % 3 else self.general
+            je = self.new_entry(f'2023-{number % 5 + 1:02}-{number % 28 + 1:02}', 10 * number + 1,
+                                accounts[number % 7], accounts[(number * 5 + 1) % 11], journal)
+            if number % 4 == 0:
+                drafts.append(je)
+            elif number % 4 != 3:
+                je.post_this()
+        self.sales_journal.post_these([je for je in drafts if je.journal is self.sales_journal][:3])
+
+    def test_totals_match_single_process(self):
+        columns = PostingColumns.from_ledger(self.ledger)
+        for workers in (1, 2, 3):
+            with ReportExecutor(self.ledger, max_workers=workers) as executor:
+                expected = columns.trial_balance()
+                self.assertEqual(executor.trial_balance(), expected)
+                self.assertEqual(executor.trial_balance(date_end='2023-03-10'),
+                                 columns.trial_balance(date_end='2023-03-10'))
+                turnover = executor.turnover('2023-02-01', '2023-04-30', journals=[self.sales_journal])
+                expected = columns.trial_balance('2023-02-01', '2023-04-30', journals=[self.sales_journal])
+                self.assertEqual(turnover, {account: (dr, cr) for account, (dr, cr, _) in expected.items() if dr or cr})
+        with ReportExecutor(Ledger('EL', 'Empty Ledger'), max_workers=2) as executor:
+            self.assertEqual(executor.trial_balance(), {})
+
+    def test_without_posts(self):
+        ledger = Ledger('DL', 'Draft Ledger')
+        journal = Journal('GJ', 'General Journal', ledger)
+        accounts = [Account(tag, ledger, self.currency, f'Account {tag}') for tag in ('100', '200', '300')]
+        je = JournalEntry(journal)
+        je.date = '2023-01-02'
+        je.debit('Account', 5, accounts[0])
+        je.credit('Account', 5, accounts[1])
+        je.put_into_journal()
+        for workers in (1, 2):
+            with ReportExecutor(ledger, max_workers=workers) as executor:
+                self.assertEqual(executor.trial_balance(), {account: (0, 0, 0) for account in accounts})
+                self.assertEqual(executor.turnover(), {})
+                self.assertEqual(executor.entry_counts(), {'2023-01': (0, {journal: (1, 1)})})
+
+    def test_entry_counts(self):
+        expected = {}
+        for je in self.ledger.journal_entries_gen():
+            posts, by_journal = expected.setdefault(je.date[:7], (set(), {}))
+            entries, unposted = by_journal.get(je.journal, (0, 0))
+            by_journal[je.journal] = (entries + 1, unposted + (not je.post))
+            if je.post:
+                posts.add(je.post)
+        expected = {period: (len(posts), by_journal) for period, (posts, by_journal) in sorted(expected.items())}
+        for workers in (1, 2):
+            with ReportExecutor(self.ledger, max_workers=workers) as executor:
+                self.assertEqual(executor.entry_counts(), expected)
+        self.assertNotIn(self.purchase_journal, expected['2023-01'][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.accounting.reports.status import entry_counts
+
+from ..books import LedgerTestCase
+
+try:
+    from yaerp.accounting.reports.parallel import ReportExecutor
+except ImportError:
+    ReportExecutor = None
+
+
+class TestEntryCounts(LedgerTestCase):
+    JOURNALS = {'GJ': 'General Journal', 'SJ': 'Sales Journal', 'PJ': 'Purchase Journal'}
+    ACCOUNTS = {'110': 'Cash', '400': 'Sales'}
+
+    def setUp(self) -> None:
+        super().setUp()
+        cash, sales = self.accounts.values()
+        general, sales_journal, _ = self.journals.values()
+        for number in range(12):
+            je = self.new_entry(f'2023-{number % 3 + 1:02}-{number + 1:02}', number + 1, cash, sales,
+                                sales_journal if number % 2 else general)
+            if number % 4:
+                je.post_this()
+        sales_journal.post_these(list(sales_journal.gen_new())[:2])
+
+    def test_counts_per_journal(self):
+        # the merged stream gives the counts of every journal on its own
+        expected = {}
+        for journal in self.ledger.journals:
+            for je in journal.journal_entries:
+                posts, by_journal = expected.setdefault(je.date[:7], (set(), {}))
+                entries, unposted = by_journal.get(journal, (0, 0))
+                by_journal[journal] = (entries + 1, unposted + (not je.post))
+                if je.post:
+                    posts.add(je.post)
+        expected = {period: (len(posts), by_journal) for period, (posts, by_journal) in sorted(expected.items())}
+        self.assertEqual(entry_counts(self.ledger), expected)
+        self.assertEqual(entry_counts(self.ledger)['2023-01'][1], {self.journal: (2, 1), self.journals['SJ']: (2, 0)})
+        self.assertNotIn(self.journals['PJ'], expected['2023-01'][1])
+
+    @unittest.skipUnless(ReportExecutor, 'numpy is not installed')
+    def test_same_as_report_executor(self):
+        with ReportExecutor(self.ledger, max_workers=1) as executor:
+            self.assertEqual(entry_counts(self.ledger), executor.entry_counts())
+
+    def test_empty_ledger(self):
+        self.assertEqual(entry_counts(Ledger('EL', 'Empty Ledger')), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
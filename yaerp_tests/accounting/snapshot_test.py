@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+
+from acc_sys import AccountingSystem, load_accounting_system
+from yaerp.accounting.account3 import Account, AccountRecord, AccountSide
+from yaerp.accounting.journal3 import Journal, JournalEntry
+from yaerp.accounting.ledger3 import Ledger
+from yaerp.accounting.marker import Assets, BalanceSheet
+from yaerp.accounting.snapshot import read_snapshot_meta
+from yaerp.accounting.tree3 import AccountTree
+from yaerp.model.currency import Currency
+from yaerp.tools.secure_token import secure_token
+
+
+class SaleJournal(Journal):
+
+    def initialize_fields(self, journal_entry):
+        return {
+            'Info': 'none',
+            'Cash': AccountRecord(self.cash, 0, AccountSide.Dr, journal_entry, None),
+            'Sale': AccountRecord(self.sales, 0, AccountSide.Cr, journal_entry, None),
+            'Other': [],
+        }
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self) -> None:
+        accsys = self.accsys = AccountingSystem()
+        accsys.general_ledger = Ledger('GL', 'General Ledger')
+        accsys.currencies = {'PLN': Currency('PLN', '985', 100, 'Polish Złoty', 'zł', 'gr'),
+                             'INR': Currency('INR', '356', 100, 'Indian Rupee', '₹', 'p',
+                                             separator_positions=(3, 5, 7), separator_predicate=None)}
+        accsys.accounts = {tag: Account(tag, accsys.general_ledger, accsys.currencies['PLN'], f'Account {tag}')
+                           for tag in ['1', '110', '130', '400']}
+        general = Journal('GJ', 'General Journal', accsys.general_ledger)
+        sales = SaleJournal('SJ', 'Sale Journal', accsys.general_ledger)
+        sales.cash, sales.sales = accsys.accounts['110'], accsys.accounts['400']
+        accsys.journals = {'GJ': general, 'SJ': sales}
+        assets = AccountTree(accsys.accounts['1'], accsys.coa)
+        AccountTree(accsys.accounts['110'], assets)
+        assets.add_marks(BalanceSheet.ASSETS, Assets.CASH)
+        accsys.selected = {'journal': 'SJ'}
+        for number in range(6):
+            je = JournalEntry(sales)
+            je.date = f'2023-0{number % 3 + 1}-1{number}'
+            je.description = f'sale {number}'
+            je.add_record('Cash', 100 + number)
+            je.add_record('Sale', 100 + number)
+            je.add_info('Info', number)
+            je.put_into_journal()
+        je = JournalEntry(general)
+        je.date = '2023-01-05'
+        je.debit('Account', 7, accsys.accounts['130'])
+        je.credit('Account', 7, accsys.accounts['110'])
+        je.post_this()
+        sales.post_these(list(sales.gen_by_sid(entry_sids=[je.sid - 6, je.sid - 5])))
+        sales.get_by_sid(je.sid - 4).post_this()
+        sales.get_by_sid(je.sid - 1).reference = 'ref'
+
+    def state(self, accsys):
+        ledger = accsys.general_ledger
+        return ([(je.journal.tag, je.sid, je.guid, je.date, je.time, je.description, je.reference, je.post,
+                  je.get_debit(), je.get_credit(),
+                  [(r.account.tag, r.side, r.raw_amount, r.post) for r in je.account_records_gen()],
+                  [value for value in je.values if not isinstance(value, (AccountRecord, list))])
+                 for je in ledger.journal_entries_gen()],
+                [(tag, account.guid, account.currency.symbol, account.posted_totals, account.unposted_totals)
+                 for tag, account in accsys.accounts.items()],
+                {post: [je.sid for je in entries] for post, entries in ledger.entries_by_post.items()},
+                [(node.account.tag, node.parent.account.tag if node.parent.account else None,
+                  sorted(map(str, node.marker.to_list())))
+                 for node in accsys.coa.get_internals_gen()],
+                {tag: list(journal.layout.names) for tag, journal in accsys.journals.items()},
+                {code: currency.raw2amount(123456789) for code, currency in accsys.currencies.items()},
+                accsys.selected)
+
+    def test_write_read(self):
+        secure_token().update(['create', 'entry'])
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'books.snap')
+            self.accsys.save_snapshot(file_name, {'script_offset': 12})
+            self.assertEqual(read_snapshot_meta(file_name),
+                             {'script_offset': '12', 'token': secure_token().token()})
+            restored, meta = load_accounting_system(file_name)
+        self.assertEqual(meta, {'script_offset': '12'})
+        self.assertEqual(self.state(restored), self.state(self.accsys))
+        self.assertIsNot(restored.general_ledger, self.accsys.general_ledger)
+        # restored books work as usual
+        sales = restored.journals['SJ']
+        draft = next(sales.gen_new())
+        sales.post_these([draft])
+        self.assertTrue(draft.post)
+        je = restored.new_journal_entry('SJ')
+        self.assertGreater(je.sid, max(restored.general_ledger.journal_entries_by_sid))
+        self.assertEqual(list(je.fields), ['Info', 'Cash', 'Sale', 'Other'])
+        self.assertEqual(je.fields['Info'], 'none')
+
+    def close_2023(self, accsys):
+        ledger = accsys.general_ledger
+        for je in list(ledger.journal_entries_gen(posted=False)):
+            je.del_from_journal()
+        ledger.create_period('2023')
+        return ledger.close_period('2023', accsys.journals['GJ'])
+
+    def assert_closed_2023(self, restored, closed):
+        ledger = restored.general_ledger
+        period = ledger.get_period('2023')
+        self.assertTrue(period.closed)
+        self.assertEqual(period.opening_sid, closed.opening_sid)
+        self.assertEqual({account.tag: balance for account, balance in period.closing_balances.items()},
+                         {account.tag: balance for account, balance in closed.closing_balances.items()})
+        self.assertEqual(period.node_balances[restored.coa], closed.node_balances[self.accsys.coa])
+        self.assertEqual(ledger.opening_dates, ['2024-01-01'])
+        self.assertEqual(restored.accounts['110'].get_balance(), self.accsys.accounts['110'].get_balance())
+        self.assertRaises(ValueError, restored.accounts['110'].ledger.check_open, '2023-12-31')
+
+    def test_periods_write_read(self):
+        closed = self.close_2023(self.accsys)
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'books.snap')
+            self.accsys.save_snapshot(file_name)
+            restored, _ = load_accounting_system(file_name)
+        self.assert_closed_2023(restored, closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
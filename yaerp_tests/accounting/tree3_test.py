@@ -0,0 +1,136 @@
+import unittest
+
+from yaerp.accounting.tree3 import AccountTree
+
+from .books import LedgerTestCase
+
+
+class TestAccountTree3(LedgerTestCase):
+    ACCOUNTS = {tag: f'Account {tag}' for tag in ['1', '100', '110', '111', '4', '400', '410']}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.root = AccountTree(None, None)
+        self.nodes = {}
+        for tag, parent_tag in [('1', None), ('100', '1'), ('110', '1'), ('111', '110'),
+                                ('4', None), ('400', '4'), ('410', '4')]:
+            parent = self.nodes[parent_tag] if parent_tag else self.root
+            self.nodes[tag] = AccountTree(self.accounts[tag], parent)
+
+    def new_entry(self, date, raw_amount, dr_tag, cr_tag):
+        return super().new_entry(date, raw_amount, self.accounts[dr_tag], self.accounts[cr_tag])
+
+    def assertSumsUpToDate(self):
+        every_record = lambda record: True
+        for node in [self.root, *self.root.get_internals_gen()]:
+            self.assertEqual(node.get_debit_sum(), node.get_debit_sum(every_record))
+            self.assertEqual(node.get_credit_sum(), node.get_credit_sum(every_record))
+            self.assertEqual(node.get_balance_sum(), node.get_balance_sum(every_record))
+
+    def test_cached_sums_follow_postings_and_structure(self):
+        self.assertSumsUpToDate()
+        self.new_entry('2023-01-01', 100, '111', '400')
+        self.assertSumsUpToDate()
+        self.assertEqual(self.nodes['1'].get_debit_sum(), 100)
+        je = self.new_entry('2023-01-02', 30, '100', '410')
+        je.post_this()
+        self.assertSumsUpToDate()
+        self.assertEqual(self.root.get_debit_sum(), 130)
+        self.assertIsNotNone(self.nodes['4']._sums)
+        self.nodes['110'].remove_child(self.nodes['111'])
+        self.nodes['111'].parent = self.nodes['4']
+        self.nodes['4'].append_child(self.nodes['111'])
+        self.assertSumsUpToDate()
+        self.assertEqual(self.nodes['4'].get_balance_sum(), -30)
+        self.assertEqual(self.nodes['1'].get_debit_sum(), 30)
+        self.new_entry('2023-01-03', 5, '110', '100')
+        self.assertIsNone(self.root._sums)
+        self.assertIsNotNone(self.nodes['4']._sums)
+        self.assertSumsUpToDate()
+
+    def test_node_lookup(self):
+        node_111 = self.nodes['111']
+        self.assertIs(self.root.get_node(tag='111'), node_111)
+        self.assertIs(self.root.get_node(guid=self.accounts['111'].guid), node_111)
+        self.assertIs(self.root.get_node(name='Account 111'), node_111)
+        self.assertIs(self.nodes['1'].get_node(tag='111'), node_111)
+        self.assertIsNone(self.nodes['4'].get_node(tag='111'))
+        self.assertIsNone(self.root.get_node(tag='999'))
+        with self.assertRaises(ValueError):
+            AccountTree(self.accounts['111'], self.nodes['4'])
+        self.nodes['110'].remove_child(node_111)
+        self.assertIsNone(self.root.get_node(tag='111'))
+        node_111.parent = self.nodes['4']
+        self.nodes['4'].append_child(node_111)
+        self.assertIs(self.nodes['4'].get_node(tag='111'), node_111)
+        self.accounts['111'].tag = '420'
+        self.nodes['4'].refresh_child_tag('111')
+        self.assertIsNone(self.root.get_node(tag='111'))
+        self.assertIs(self.root.get_node(tag='420'), node_111)
+        self.assertEqual([node.account.tag for node in self.nodes['4'].children], ['400', '410', '420'])
+        self.accounts['111'].name = 'Renamed'
+        node_111.refresh_node_name('Account 111')
+        self.assertIsNone(self.root.get_node(name='Account 111'))
+        self.assertIs(self.root.get_node(name='Renamed'), node_111)
+
+    def test_refresh_in_all_charts(self):
+        other = AccountTree(None, None)
+        group = AccountTree(self.accounts['4'], other)
+        AccountTree(self.accounts['400'], group)
+        other_110 = AccountTree(self.accounts['110'], group)
+        self.accounts['110'].tag = '420'
+        self.nodes['1'].refresh_child_tag('110')
+        self.assertIs(self.root.get_node(tag='420'), self.nodes['110'])
+        self.assertIs(other.get_node(tag='420'), other_110)
+        self.assertIsNone(other.get_node(tag='110'))
+        self.assertEqual([node.account.tag for node in group.children], ['400', '420'])
+        self.accounts['110'].name = 'Renamed'
+        self.nodes['110'].refresh_node_name('Account 110')
+        for root, node in [(self.root, self.nodes['110']), (other, other_110)]:
+            self.assertIsNone(root.get_node(name='Account 110'))
+            self.assertIs(root.get_node(name='Renamed'), node)
+
+    def test_flat_intervals(self):
+
+        def internals(node):
+            result = []
+            for child in node.children or []:
+                result.append(child)
+                result.extend(internals(child))
+            return result
+
+        def check():
+            nodes = [self.root, *self.nodes.values()]
+            for node in nodes:
+                self.assertEqual(list(node.get_internals_gen()), internals(node))
+                for other in nodes:
+                    self.assertEqual(other.is_descendant_of(node), node in other.get_node_path())
+
+        check()
+        self.assertEqual(len(self.root.flatten()), 8)
+        version = self.root._version
+        self.nodes['4'].remove_child(self.nodes['410'])
+        self.nodes['410'].parent = self.nodes['111']
+        self.nodes['111'].append_child(self.nodes['410'])
+        self.assertNotEqual(self.root._version, version)
+        check()
+        self.assertEqual(self.nodes['1'].get_currencies(), {self.currency})
+
+    def test_node_classification(self):
+        self.assertTrue(self.nodes['110'].is_group_of_ledger_accounts_node())
+        self.assertFalse(self.nodes['110'].is_ledger_account_node())
+        self.assertTrue(self.nodes['110'].has_ledger_node())
+        self.assertTrue(self.nodes['111'].is_ledger_account_node())
+        self.assertTrue(self.nodes['111'].has_ledger_leaf())
+        self.assertTrue(self.root.is_group_of_ledger_accounts_node())
+        self.assertEqual([node.account.tag for node in self.root.find(select_ledger_nodes=False)],
+                         ['100', '111', '400', '410'])
+        self.nodes['110'].remove_child(self.nodes['111'])
+        self.assertTrue(self.nodes['110'].is_ledger_account_node())
+        self.assertFalse(self.nodes['110'].has_ledger_node())
+        self.assertEqual([node.account.tag for node in self.root.find_node_gen(select_nodes=False)],
+                         ['100', '110', '400', '410'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+from yaerp.tools.prefix_sum import FenwickTree, PrefixSums
+
+
+class TestPrefixSums(unittest.TestCase):
+
+    def test_fenwick_tree(self):
+        values = [5, -2, 7, 0, 3, 11]
+        tree = FenwickTree(values)
+        for i in range(len(values) + 1):
+            self.assertEqual(tree.prefix(i), sum(values[:i]))
+        tree.add(2, 10)
+        self.assertEqual(tree.prefix(3), 20)
+
+    def test_fenwick_tree_search(self):
+        lengths = [3, 1, 4, 1, 5]
+        tree = FenwickTree(lengths)
+        positions = [(i, offset) for i, length in enumerate(lengths) for offset in range(length)]
+        for position, expected in enumerate(positions):
+            self.assertEqual(tree.search(position), expected)
+
+    def test_against_plain_list(self):
+        rnd = random.Random(7)
+        load, PrefixSums.load = PrefixSums.load, 4
+        try:
+            sums = PrefixSums()
+            pairs = []
+            for _ in range(600):
+                if pairs and rnd.random() < 0.3:
+                    pair = pairs.pop(rnd.randrange(len(pairs)))
+                    sums.remove(*pair)
+                else:
+                    pair = (rnd.randrange(50), rnd.randrange(-100, 100))
+                    pairs.append(pair)
+                    sums.add(*pair)
+                probe = rnd.randrange(-1, 52)
+                self.assertEqual(sums.sum_lt(probe), sum(v for k, v in pairs if k < probe))
+                self.assertEqual(sums.sum_le(probe), sum(v for k, v in pairs if k <= probe))
+                self.assertEqual(sums.total(), sum(v for _, v in pairs))
+                self.assertEqual(len(sums), len(pairs))
+            self.assertEqual(PrefixSums(pairs).sum_le(25), sum(v for k, v in pairs if k <= 25))
+        finally:
+            PrefixSums.load = load
+
+    def test_update(self):
+        rnd = random.Random(11)
+        sums = PrefixSums()
+        pairs = []
+        for size in [5, 200, 3, 40]:
+            batch = [(rnd.randrange(30), rnd.randrange(100)) for _ in range(size)]
+            sums.update(batch)
+            pairs.extend(batch)
+            for probe in range(-1, 32):
+                self.assertEqual(sums.sum_lt(probe), sum(v for k, v in pairs if k < probe))
+        self.assertEqual(len(sums), len(pairs))
+        sums.remove(*pairs[0])
+        self.assertEqual(sums.total(), sum(v for _, v in pairs[1:]))
+
+    def test_remove_missing_pair(self):
+        sums = PrefixSums([(1, 10)])
+        with self.assertRaises(ValueError):
+            sums.remove(1, 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import unittest
+
+from yaerp.tools.secure_token import _SecureToken
+from yaerp.tools.text import container2str
+
+COMMANDS_FILE = os.path.join(os.path.dirname(__file__), '..', '..', 'commands.txt')
+
+
+class TestSecureToken(unittest.TestCase):
+
+    def test_replay(self):
+        chain = _SecureToken(open_number=True)
+        lines = []
+        for args in [['create', 'account', '--tag', '110'], ['create', 'entry', 'GJ', '2023-12-31 00:00:00', 'Dr/110/100']]:
+            lines.append(container2str(args + ['--token', chain.update(args)]))
+        replayed = _SecureToken(open_number=True)
+        self.assertEqual(replayed.replay(['load journals'] + lines), chain.token())
+        self.assertEqual(replayed.update(['next']), chain.update(['next']))
+        lines[0] = lines[0].replace('110', '111')
+        self.assertRaises(ValueError, _SecureToken(open_number=True).replay, lines)
+
+    def test_sealed_script(self):
+        # tokens stored by the earlier sessions still verify
+        with open(COMMANDS_FILE, encoding='utf-8') as file:
+            lines = file.readlines()[:45]
+        self.assertEqual(_SecureToken(open_number=True).replay(lines), '0045_bf7b17cb285a779fa87a8713')
+
+
+if __name__ == '__main__':
+    unittest.main()
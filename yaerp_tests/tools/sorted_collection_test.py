@@ -0,0 +1,121 @@
+import random
+import unittest
+from operator import itemgetter
+
+from yaerp.tools.sorted_collection import SortedCollection
+
+
+class TestSortedCollection(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.load, SortedCollection.load = SortedCollection.load, 4
+
+    def tearDown(self) -> None:
+        SortedCollection.load = self.load
+
+    def test_against_plain_list(self):
+        rnd = random.Random(11)
+        sc = SortedCollection(key=itemgetter(0))
+        plain = []
+        for serial in range(800):
+            if plain and rnd.random() < 0.3:
+                item = rnd.choice(plain)
+                plain.remove(item)
+                sc.remove(item)
+            else:
+                item = (rnd.randrange(40), serial)
+                if rnd.random() < 0.5:
+                    sc.insert_right(item)
+                    plain.insert(sum(1 for k, _ in plain if k <= item[0]), item)
+                else:
+                    sc.insert(item)
+                    plain.insert(sum(1 for k, _ in plain if k < item[0]), item)
+            self.assertEqual(len(sc), len(plain))
+        self.assertEqual(list(sc), plain)
+        self.assertEqual(list(reversed(sc)), plain[::-1])
+        self.assertEqual(sc[5:17], plain[5:17])
+        for i, item in enumerate(plain):
+            self.assertEqual(sc[i], item)
+            self.assertEqual(sc[i - len(plain)], item)
+            self.assertEqual(sc.index(item), i)
+            self.assertIn(item, sc)
+        for k in range(-1, 42):
+            le = [item for item in plain if item[0] <= k]
+            ge = [item for item in plain if item[0] >= k]
+            self.assertEqual(sc.find_le(k) if le else None, le[-1] if le else None)
+            self.assertEqual(sc.find_ge(k) if ge else None, ge[0] if ge else None)
+        with self.assertRaises(IndexError):
+            sc[len(plain)]
+        self.assertNotIn((1, -1), sc)
+
+    def test_bulk_operations(self):
+        rnd = random.Random(5)
+        for existing, added in [(0, 30), (200, 30), (30, 200), (50, 3)]:
+            base = [(rnd.randrange(20), 'old', n) for n in range(existing)]
+            batch = [(rnd.randrange(20), 'new', n) for n in range(added)]
+            expected = sorted(base + batch, key=lambda item: (item[0], item[1] == 'new'))
+            sc = SortedCollection(base, key=itemgetter(0))
+            sc.bulk_insert(batch)
+            self.assertEqual(list(sc), expected)
+            self.assertEqual([sc[i] for i in range(len(sc))], expected)
+            sc = SortedCollection(base, key=itemgetter(0))
+            sc.extend_sorted(sorted(batch, key=itemgetter(0)))
+            self.assertEqual(list(sc), expected)
+            sc = SortedCollection(base, key=itemgetter(0))
+            sc.merge(SortedCollection(batch, key=itemgetter(0)))
+            self.assertEqual(list(sc), expected)
+        with self.assertRaises(ValueError):
+            SortedCollection().extend_sorted([2, 1])
+
+    def test_identity_index(self):
+        items = [[n // 3] for n in range(30)]
+        sc = SortedCollection(items, key=itemgetter(0))
+        equal_copy = [4]
+        self.assertIn(items[13], sc)
+        self.assertIn(equal_copy, sc)
+        self.assertEqual(sc.index(items[14]), 12)     # the first equal item
+        self.assertEqual(sc.index(equal_copy), 12)
+        items[13][0] = 100      # expired key, the item is still found by identity
+        self.assertIn(items[13], sc)
+        sc.remove(items[13])
+        self.assertNotIn(items[13], sc)
+        self.assertEqual(sc.count([4]), 2)
+        self.assertEqual(len(sc._ids), 29)
+        twice = [50]
+        sc.insert(twice)
+        sc.insert(twice)
+        self.assertEqual(len(sc._ids), 30)
+        sc.remove(twice)
+        self.assertIn(twice, sc)
+        sc.remove(twice)
+        self.assertNotIn(twice, sc)
+        self.assertEqual(len(sc._ids), 29)
+        with self.assertRaises(ValueError):
+            sc.remove(twice)
+
+    def test_irange_and_islice(self):
+        plain = sorted((k, n) for n, k in enumerate(random.Random(3).choices(range(30), k=120)))
+        sc = SortedCollection(plain, key=itemgetter(0))
+        for lo, hi in [(None, None), (5, 12), (12, 5), (-3, 0), (29, 40), (7, 7), (None, 3), (25, None)]:
+            for inclusive in [(True, True), (False, True), (True, False), (False, False)]:
+                expected = [item for item in plain
+                            if (lo is None or item[0] > lo or inclusive[0] and item[0] == lo)
+                            and (hi is None or item[0] < hi or inclusive[1] and item[0] == hi)]
+                self.assertEqual(list(sc.irange(lo, hi, inclusive)), expected)
+                self.assertEqual(list(sc.irange(lo, hi, inclusive, reverse=True)), expected[::-1])
+        for start, stop in [(None, None), (0, 4), (3, 77), (-10, None), (50, 20), (4, 500)]:
+            self.assertEqual(list(sc.islice(start, stop)), plain[start:stop])
+            self.assertEqual(list(sc.islice(start, stop, reverse=True)), plain[start:stop][::-1])
+            self.assertEqual(sc[start:stop], plain[start:stop])
+
+    def test_refresh_key(self):
+        items = [[n] for n in range(20)]
+        sc = SortedCollection(items, key=itemgetter(0))
+        items[3][0] = 100
+        sc.refresh_key(3)
+        self.assertEqual(sc[-1], [100])
+        self.assertEqual(sc._keys, sorted(item[0] for item in items))
+
+
+if __name__ == '__main__':
+    unittest.main()